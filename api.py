@@ -1,9 +1,19 @@
-from fastapi import FastAPI
+import base64
+import io
+import json
+import os
+import re
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from simulation.Network import Network
-from main import calculate_qber, postprocessing
+from typing import Dict, List, Literal, Optional, Union
+import numpy as np
+from main import run_channel_sessions, run_analytic_model
+from jobs import JobStore
+from result_cache import ResultCache
+from key_store import KeyStore
+from sweep import CSVSweepWriter, iter_sweep, make_writer, sweep_columns, validate_grid
 
 app = FastAPI()
 
@@ -14,8 +24,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Accept-Ranges", "Content-Range", "X-Key-Length"],
 )
 
+# Per-channel results of seeded runs, shared by /simulate and /jobs
+result_cache = ResultCache(max_entries=int(os.environ.get("QKD_CACHE_SIZE", 256)),
+                           ttl_s=float(os.environ.get("QKD_CACHE_TTL_S", 3600)))
+
+# Background jobs share one local process pool; QKD_JOB_WORKERS sets its size (default: CPU count)
+job_store = JobStore(max_workers=int(os.environ.get("QKD_JOB_WORKERS", 0)) or None, cache=result_cache)
+
+# Keys of the most recent /simulate runs, downloadable via /runs/{run_id}/channels/{channel_id}/keys/{party}
+key_store = KeyStore(max_runs=int(os.environ.get("QKD_KEY_STORE_RUNS", 32)))
+
+KEY_CHUNK_BYTES = 1 << 16  # Chunk size of streamed key downloads
+
 class NodeModel(BaseModel):
     id: int
     detector_efficiency: float
@@ -43,198 +66,319 @@ class SimParams(BaseModel):
     cow_monitor_pulse_ratio: float
     cow_detection_threshold_photons: float = 1
     cow_extinction_ratio_db: float
+    # Session engine: "loop" (per-pulse), "vectorized" (NumPy pulse trains)
+    # or "auto" (vectorized for large num_pulses)
+    engine: Literal["auto", "loop", "vectorized"] = "auto"
+    # Error correction of Bob's sifted key: "none" (estimated cost only), "cascade" or "ldpc"
+    reconciliation: Literal["none", "cascade", "ldpc"] = "none"
+    # Toeplitz hash the reconciled keys to their secure length (needs a reconciliation method)
+    privacy_amplification: bool = False
+    # Root seed for every node, channel and detector stream; fixed seed -> reproducible results
+    seed: Optional[int] = None
+    # Worker processes for the per-channel sessions (1 = run serially in the request)
+    workers: int = Field(1, ge=1)
+    # Embed alice_key/bob_key as bit lists in the response (large for long runs); otherwise
+    # fetch them from /runs/{run_id}/channels/{channel_id}/keys/{party}
+    include_keys: bool = False
+
+Sweepable = Union[float, List[float]]
+
+class AnalyticParams(BaseModel):
+    """Closed-form model inputs; every list-valued field is an axis of the evaluated grid."""
+    protocol: Literal["dps", "cow", "bb84"]
+    distance_km: Sweepable
+    mu: Sweepable = 0.2
+    detector_efficiency: Sweepable = 0.9
+    dark_count_rate: Sweepable = 1e-7
+    attenuation_db_per_km: Sweepable = 0.2
+    phase_flip_prob: Sweepable = 0.0
+    pulse_repetition_rate_ns: Sweepable = 1
+    # COW-specific
+    bit_flip_error_prob: Sweepable = 0.0
+    monitor_pulse_ratio: Sweepable = 0.1
+    extinction_ratio_db: Sweepable = 20.0
+    # BB84-specific
+    misalignment_error: Sweepable = 0.02
+
+ANALYTIC_PROTOCOL_FIELDS = {
+    "dps": (),
+    "cow": ("bit_flip_error_prob", "monitor_pulse_ratio", "extinction_ratio_db"),
+    "bb84": ("misalignment_error",),
+}
+ANALYTIC_COMMON_FIELDS = ("distance_km", "mu", "detector_efficiency", "dark_count_rate", "attenuation_db_per_km",
+                          "phase_flip_prob", "pulse_repetition_rate_ns")
+
+def analytic_grid(params: AnalyticParams):
+    """
+    The model's parameters as NumPy arrays of one common grid: each list-valued field gets
+    its own axis (in field order) and scalars stay scalars. Returns (grid, axes).
+    """
+    names = ANALYTIC_COMMON_FIELDS + ANALYTIC_PROTOCOL_FIELDS[params.protocol]
+    values = {name: getattr(params, name) for name in names}
+    axes = [name for name in names if isinstance(values[name], list)]
+    grid = {}
+    for name in names:
+        if name in axes:
+            shape = [1] * len(axes)
+            shape[axes.index(name)] = -1
+            grid[name] = np.asarray(values[name], dtype=float).reshape(shape)
+        else:
+            grid[name] = values[name]
+    return grid, axes
+
+class SweepParams(BaseModel):
+    """Parameter sweep: every grid entry is an axis; unlisted parameters keep sweep.SWEEP_DEFAULTS."""
+    protocol: Literal["dps", "cow", "bb84"]
+    grid: Dict[str, List[float]]
+    trials: int = Field(1, ge=1)
+    seed: Optional[int] = None
+    workers: int = Field(1, ge=1)
+    engine: Literal["auto", "loop", "vectorized"] = "vectorized"
+    # "monte_carlo" runs trials per point; "analytic" evaluates the closed-form model
+    mode: Literal["monte_carlo", "analytic"] = "monte_carlo"
+    format: Literal["csv", "parquet"] = "csv"
 
 @app.get("/")
 def read_root():
     return {"message": "QKD Simulation API"}
 
-@app.post("/simulate")
-def simulate(params: SimParams):
-    """
-    Multi-node DPS simulation endpoint.
-    """
-    net = Network()
-    node_map = {}
-    # Add all nodes
-    for n in params.nodes:
-        node = net.add_node(
-            f"Node_{n.id}",
-            avg_photon_number=n.mu,
-            detector_efficiency=n.detector_efficiency,
-            dark_count_rate=n.dark_count_rate
-        )
-        node_map[n.id] = node
-
-    results = []
-    if params.protocol == "dps":
-        # For each channel, run DPS
+def build_channel_tasks(params: SimParams):
+    """Turns a simulation request into one run_channel_session task per usable channel."""
+    if params.privacy_amplification and params.reconciliation == "none":
+        raise HTTPException(status_code=422, detail="privacy_amplification needs a reconciliation method")
+    node_params = {n.id: n for n in params.nodes}
+    cow_params = {
+        "monitor_pulse_ratio": params.cow_monitor_pulse_ratio,
+        "detection_threshold_photons": params.cow_detection_threshold_photons,
+        "extinction_ratio_db": params.cow_extinction_ratio_db
+    }
+
+    tasks = []
+    if params.protocol in ("dps", "cow", "bb84"):
         for ch in params.channels:
-            node_a = node_map.get(ch.from_)
-            node_b = node_map.get(ch.to)
+            node_a = node_params.get(ch.from_)
+            node_b = node_params.get(ch.to)
             if not node_a or not node_b:
                 continue
-            net.connect_nodes(
-                node_a.node_id, node_b.node_id,
-                distance_km=ch.fiber_length_km,
-                attenuation_db_per_km=ch.fiber_attenuation_db_per_km
-            )
-            # Use node-specific and channel-specific params
-            alice_key, bob_key = node_a.generate_and_share_key(
-                node_b,
-                next(n.num_pulses for n in params.nodes if n.id == ch.from_),
-                next(n.pulse_repetition_rate for n in params.nodes if n.id == ch.from_),
-                phase_flip_prob=ch.phase_flip_prob
-            )
-            qber, num_errors = calculate_qber(alice_key, bob_key)
-            final_key_len, postproc = postprocessing(len(alice_key), qber)
-            total_time_s = (next(n.num_pulses for n in params.nodes if n.id == ch.from_) * next(n.pulse_repetition_rate for n in params.nodes if n.id == ch.from_)) / 1e9 if next(n.num_pulses for n in params.nodes if n.id == ch.from_) > 0 else 0
-            # secure_key_rate_bps = final_key_len / total_time_s if total_time_s > 0 else 0
-            secure_key_rate_bps = final_key_len / num_pulses_per_link if num_pulses_per_link > 0 else 0
-            theory_compliance = (0.03 <= qber <= 0.10)
-            theory_message = "QBER is within the practical range (3-10%) for QKD." if theory_compliance else f"WARNING: QBER ({qber:.4f}) is outside the practical range for QKD."
-            
-            # Find the original node and channel data to include in the results
-            node_a_params = next((n for n in params.nodes if n.id == ch.from_), None)
-            node_b_params = next((n for n in params.nodes if n.id == ch.to), None)
-
-            results.append({
-                "channel_id": ch.id,
-                "from": ch.from_,
-                "to": ch.to,
-                "protocol": "dps",
-                "qber": qber,
-                "final_key_length": final_key_len,
-                "secure_key_rate_bps": secure_key_rate_bps,
-                "sifted_key_length": len(alice_key),
-                "num_errors": num_errors,
-                "postprocessing": postproc,
-                "theory_compliance": theory_compliance,
-                "theory_message": theory_message,
-                "alice_key": alice_key,
-                "bob_key": bob_key,
-                "parameters": {
-                    "node_a": node_a_params.dict() if node_a_params else {},
-                    "node_b": node_b_params.dict() if node_b_params else {},
-                    "channel": ch.dict()
-                }
+            tasks.append({
+                "protocol": params.protocol,
+                "channel": ch.dict(),
+                "node_a": node_a.dict(),
+                "node_b": node_b.dict(),
+                "cow_params": cow_params,
+                "engine": params.engine,
+                "seed": params.seed,
+                "reconciliation": params.reconciliation,
+                "privacy_amplification": params.privacy_amplification
             })
+    return tasks
 
-    elif params.protocol == "cow":
-        # Run COW simulation for each channel
-        for ch in params.channels:
-            node_a = node_map.get(ch.from_)
-            node_b = node_map.get(ch.to)
-            if not node_a or not node_b:
-                continue
+def to_response(result, include_keys=False):
+    """Channel result for JSON: metrics only, or with its PackedKeys as plain bit lists."""
+    response = {k: v for k, v in result.items() if k not in ("alice_key", "bob_key")}
+    if include_keys:
+        response["alice_key"] = result["alice_key"].tolist()
+        response["bob_key"] = result["bob_key"].tolist()
+    return response
 
-            net.connect_nodes(
-                node_a.node_id, node_b.node_id,
-                distance_km=ch.fiber_length_km,
-                attenuation_db_per_km=ch.fiber_attenuation_db_per_km
-            )
-
-            # Use only per-channel bit_flip_error_prob (no global fallback)
-            alice_key, bob_key = node_a.generate_and_share_key_cow(
-                node_b,
-                next(n.num_pulses for n in params.nodes if n.id == ch.from_),
-                next(n.pulse_repetition_rate for n in params.nodes if n.id == ch.from_),
-                monitor_pulse_ratio=params.cow_monitor_pulse_ratio,
-                detection_threshold_photons=int(params.cow_detection_threshold_photons),
-                phase_flip_prob=ch.phase_flip_prob,
-                bit_flip_error_prob=ch.bit_flip_error_prob
-            )
-
-            qber, num_errors = calculate_qber(alice_key, bob_key)
-            final_key_len, postproc = postprocessing(len(alice_key), qber)
-            total_time_s = (next(n.num_pulses for n in params.nodes if n.id == ch.from_) * next(n.pulse_repetition_rate for n in params.nodes if n.id == ch.from_)) / 1e9 if next(n.num_pulses for n in params.nodes if n.id == ch.from_) > 0 else 0
-            secure_key_rate_bps = final_key_len / total_time_s if total_time_s > 0 else 0
-            theory_compliance = (0.03 <= qber <= 0.10)
-            theory_message = "QBER is within the practical range (3-10%) for QKD." if theory_compliance else f"WARNING: QBER ({qber:.4f}) is outside the practical range for QKD."
-
-            node_a_params = next((n for n in params.nodes if n.id == ch.from_), None)
-            node_b_params = next((n for n in params.nodes if n.id == ch.to), None)
-
-            results.append({
-                "channel_id": ch.id,
-                "from": ch.from_,
-                "to": ch.to,
-                "protocol": "cow",
-                "qber": qber,
-                "final_key_length": final_key_len,
-                "secure_key_rate_bps": secure_key_rate_bps,
-                "sifted_key_length": len(alice_key),
-                "num_errors": num_errors,
-                "postprocessing": postproc,
-                "theory_compliance": theory_compliance,
-                "theory_message": theory_message,
-                "alice_key": alice_key,
-                "bob_key": bob_key,
-                "parameters": {
-                    "node_a": node_a_params.dict() if node_a_params else {},
-                    "node_b": node_b_params.dict() if node_b_params else {},
-                    "channel": ch.dict(),
-                    "cow_globals": {
-                        "monitor_pulse_ratio": params.cow_monitor_pulse_ratio,
-                        "detection_threshold_photons": params.cow_detection_threshold_photons,
-                        "extinction_ratio_db": params.cow_extinction_ratio_db
-                    }
-                }
-            })
+@app.post("/simulate")
+def simulate(params: SimParams):
+    """
+    Multi-node simulation endpoint (DPS, COW or BB84).
+    Every channel runs its own QKD session; with workers > 1 the sessions are
+    spread over a process pool and results come back in channel order.
+    Seeded channels whose inputs are unchanged since an earlier run come from the result cache.
+    Keys are left out unless include_keys is set; the returned run_id serves them on demand.
+    """
+    results = run_channel_sessions(build_channel_tasks(params), workers=params.workers, cache=result_cache)
+    return {
+        "run_id": key_store.add(results),
+        "results": [to_response(result, params.include_keys) for result in results]
+    }
 
-    elif params.protocol == "bb84":
-        # Run BB84 simulation for each channel
-        for ch in params.channels:
-            node_a = node_map.get(ch.from_)
-            node_b = node_map.get(ch.to)
-            if not node_a or not node_b:
-                continue
+@app.post("/analytic")
+def analytic(params: AnalyticParams):
+    """
+    Closed-form expected sifted rate, QBER and secure key rate (no Monte Carlo).
+    List-valued parameters span a grid; results are flattened in C order over the
+    axes listed in 'axes', one column per parameter and metric.
+    """
+    grid, axes = analytic_grid(params)
+    try:
+        result = run_analytic_model(params.protocol, **grid)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    shape = np.broadcast_shapes(*(np.shape(value) for value in (*grid.values(), *result.values())))
+    return {
+        "protocol": params.protocol,
+        "axes": axes,
+        "shape": list(shape),
+        "parameters": {name: np.broadcast_to(value, shape).ravel().tolist() for name, value in grid.items()
+                       if name in axes},
+        "results": {name: np.broadcast_to(value, shape).ravel().tolist() for name, value in result.items()},
+    }
 
-            net.connect_nodes(
-                node_a.node_id, node_b.node_id,
-                distance_km=ch.fiber_length_km,
-                attenuation_db_per_km=ch.fiber_attenuation_db_per_km
-            )
-
-            alice_key, bob_key = node_a.generate_and_share_key_bb84(
-                node_b,
-                next(n.num_pulses for n in params.nodes if n.id == ch.from_),
-                next(n.pulse_repetition_rate for n in params.nodes if n.id == ch.from_),
-                phase_flip_prob=ch.phase_flip_prob
-            )
-            qber, num_errors = calculate_qber(alice_key, bob_key)
-            final_key_len, postproc = postprocessing(len(alice_key), qber)
-            total_time_s = (next(n.num_pulses for n in params.nodes if n.id == ch.from_) * next(n.pulse_repetition_rate for n in params.nodes if n.id == ch.from_)) / 1e9 if next(n.num_pulses for n in params.nodes if n.id == ch.from_) > 0 else 0
-            print("total time taken : ", total_time_s)
-            secure_key_rate_bps = final_key_len / total_time_s if total_time_s > 0 else 0
-            theory_compliance = (0.03 <= qber <= 0.10)
-            theory_message = "QBER is within the practical range (3-10%) for QKD." if theory_compliance else f"WARNING: QBER ({qber:.4f}) is outside the practical range for QKD."
-
-            node_a_params = next((n for n in params.nodes if n.id == ch.from_), None)
-            node_b_params = next((n for n in params.nodes if n.id == ch.to), None)
-
-            results.append({
-                "channel_id": ch.id,
-                "from": ch.from_,
-                "to": ch.to,
-                "protocol": "bb84",
-                "qber": qber,
-                "final_key_length": final_key_len,
-                "secure_key_rate_bps": secure_key_rate_bps,
-                "sifted_key_length": len(alice_key),
-                "num_errors": num_errors,
-                "postprocessing": postproc,
-                "theory_compliance": theory_compliance,
-                "theory_message": theory_message,
-                "alice_key": alice_key,
-                "bob_key": bob_key,
-                "parameters": {
-                    "node_a": node_a_params.dict() if node_a_params else {},
-                    "node_b": node_b_params.dict() if node_b_params else {},
-                    "channel": ch.dict()
-                }
-            })
+def _csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = CSVSweepWriter(buffer, columns)
+    for row in rows:
+        if buffer.tell():
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        writer.write(row)
+    yield buffer.getvalue()
+
+@app.post("/sweep")
+def sweep(params: SweepParams):
+    """
+    Runs a parameter sweep (see sweep.py). CSV rows stream out as grid points complete
+    (completion order; sort by 'index' for grid order). Parquet is sent once the sweep is done.
+    """
+    try:
+        validate_grid(params.protocol, params.grid)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    rows = iter_sweep(params.protocol, params.grid, trials=params.trials, seed=params.seed, workers=params.workers,
+                      engine=params.engine, mode=params.mode)
+    columns = sweep_columns(params.mode)
+    if params.format == "csv":
+        return StreamingResponse(_csv_lines(rows, columns), media_type="text/csv")
+    body = io.BytesIO()
+    try:
+        writer = make_writer("parquet", body, columns)
+    except ImportError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    for row in rows:
+        writer.write(row)
+    writer.close()
+    return Response(body.getvalue(), media_type="application/vnd.apache.parquet")
+
+def _get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+@app.post("/jobs", status_code=202)
+def submit_job(params: SimParams):
+    """
+    Submits a simulation as a background job and returns its id right away.
+    Takes the same parameters as /simulate; workers caps how many of the job's
+    channels run at once on the shared job pool.
+    """
+    job = job_store.submit(build_channel_tasks(params), max_in_flight=params.workers)
+    return job.summary()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status and progress of a job (completed vs. total channels)."""
+    return _get_job(job_id).summary()
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancels a job; results of channels finished so far stay available."""
+    _get_job(job_id)
+    return job_store.cancel(job_id).summary()
+
+@app.get("/jobs/{job_id}/results")
+def stream_job_results(job_id: str, include_keys: bool = False):
+    """
+    Streams the job's channel results as NDJSON (one result per line) in completion
+    order: results already finished come first, the rest as they complete.
+    The stream ends when the job completes, fails or is cancelled.
+    Keys are left out unless include_keys is set; the job id also works as a run id for key downloads.
+    """
+    job = _get_job(job_id)
+    lines = (json.dumps(to_response(result, include_keys)) + "\n" for result in job.iter_results())
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+def _find_keys(run_id: str, channel_id: int):
+    """(alice_key, bob_key) of a channel of a /simulate run or a job."""
+    keys = key_store.get(run_id, channel_id)
+    if keys is not None:
+        return keys
+    job = job_store.get(run_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Run '{run_id}' not found")
+    for result in list(job.results):
+        if result["channel_id"] == channel_id:
+            return result["alice_key"], result["bob_key"]
+    raise HTTPException(status_code=404, detail=f"Channel {channel_id} not found in run '{run_id}'")
+
+def parse_byte_range(range_header, size):
+    """
+    (start, end) of a single "bytes=" range (end inclusive), or None to serve the whole body.
+    Malformed and multi-range headers are ignored; unsatisfiable ranges raise a 416.
+    """
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header or "")
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    if match.group(1) == "":  # Suffix range: the last n bytes
+        suffix = int(match.group(2))
+        if suffix == 0:
+            raise HTTPException(status_code=416, detail="Unsatisfiable range",
+                                headers={"Content-Range": f"bytes */{size}"})
+        return max(0, size - suffix), size - 1
+    start = int(match.group(1))
+    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Unsatisfiable range",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def _iter_chunks(body, start, end):
+    view = memoryview(body)
+    for offset in range(start, end + 1, KEY_CHUNK_BYTES):
+        yield bytes(view[offset:min(offset + KEY_CHUNK_BYTES, end + 1)])
+
+@app.get("/runs/{run_id}/channels/{channel_id}/keys/{party}")
+def download_key(run_id: str, channel_id: int, party: Literal["alice", "bob"],
+                 format: Literal["binary", "base64"] = "binary", range: Optional[str] = Header(None)):
+    """
+    Streams one party's sifted key of a run (or job) channel.
+    binary: the packed bits (8 per byte, most significant bit first, last byte zero padded);
+    base64: the same bytes base64 encoded as text. X-Key-Length gives the key length in bits.
+    A single "Range: bytes=start-end" request (on the served body) returns 206 with that slice.
+    """
+    alice_key, bob_key = _find_keys(run_id, channel_id)
+    key = alice_key if party == "alice" else bob_key
+    body = key.tobytes()
+    media_type = "application/octet-stream"
+    if format == "base64":
+        body = base64.b64encode(body)
+        media_type = "text/plain"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "X-Key-Length": str(len(key)),
+        "Content-Disposition": f'attachment; filename="{run_id}-{channel_id}-{party}.{"bin" if format == "binary" else "b64"}"'
+    }
+    if not body:
+        return Response(content=b"", media_type=media_type, headers=headers)
+    byte_range = parse_byte_range(range, len(body))
+    status_code = 200
+    start, end = 0, len(body) - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_iter_chunks(body, start, end), status_code=status_code,
+                             media_type=media_type, headers=headers)
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters and occupancy of the per-channel result cache."""
+    return result_cache.stats()
+
+@app.delete("/cache")
+def clear_cache():
+    result_cache.clear()
+    return result_cache.stats()
 
-    return {"results": results}
+@app.on_event("shutdown")
+def shutdown_jobs():
+    job_store.shutdown()
 
 if __name__ == '__main__':
     import uvicorn
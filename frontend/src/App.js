@@ -14,6 +14,7 @@ function App() {
   const [params, setParams] = useState({ protocol: "dps", cow_monitor_pulse_ratio: 0.1, cow_detection_threshold_photons: 1, cow_extinction_ratio_db: 20 });
   const [network, setNetwork] = useState({ nodes: [ { id: 1, detector_efficiency: 0.9, dark_count_rate: 1e-8, mu: 0.2 }, { id: 2, detector_efficiency: 0.9, dark_count_rate: 1e-8, mu: 0.2 } ], channels: [] });
   const [results, setResults] = useState(null);
+  const [runId, setRunId] = useState(null);
   const [networkKey, setNetworkKey] = useState(0); // Key to force network reset
   const [protocolChangeMessage, setProtocolChangeMessage] = useState("");
 
@@ -65,6 +66,7 @@ function App() {
       console.log("Sending to backend:", payload);
       const res = await axios.post("http://localhost:8000/simulate", payload);
       if (res.data && Array.isArray(res.data.results)) {
+        setRunId(res.data.run_id);
         setResults(res.data.results);
       } else {
         setResults([{ error: "Invalid response from server." }]);
@@ -129,7 +131,7 @@ function App() {
         <Button onClick={handleSimulate} variant="contained" color="primary" sx={{ px: 4, py: 1.5, fontWeight: 600, fontSize: 18 }} startIcon={<PlayArrowIcon />}>Run Simulation</Button>
         <Button onClick={handleReset} variant="outlined" color="secondary" sx={{ px: 3, py: 1.5, fontWeight: 600, fontSize: 16 }} startIcon={<RestartAltIcon />}>Reset All</Button>
       </div>
-      {results && <Results results={results} />}
+      {results && <Results results={results} runId={runId} />}
     </div>
   );
 }
@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from "react";
+import axios from "axios";
 import Button from '@mui/material/Button';
 import ListAltIcon from '@mui/icons-material/ListAlt';
 import VpnKeyIcon from '@mui/icons-material/VpnKey';
@@ -16,6 +17,34 @@ const formatKey = (key) => {
   return Array.isArray(key) ? key.slice(0, 100).join("") + (key.length > 100 ? "..." : "") : String(key);
 };
 
+const API_URL = "http://localhost:8000";
+const KEY_PREVIEW_BITS = 100;
+
+// URL of one party's packed key for a channel of a run
+const keyUrl = (runId, channelId, party) => `${API_URL}/runs/${runId}/channels/${channelId}/keys/${party}`;
+
+// Fetches only the bytes holding the first KEY_PREVIEW_BITS bits of a key and unpacks them (MSB first)
+// An empty key has no byte to range over, so the API answers 416: that is an empty preview
+async function fetchKeyPreview(runId, channelId, party) {
+  let res;
+  try {
+    res = await axios.get(keyUrl(runId, channelId, party), {
+      responseType: "arraybuffer",
+      headers: { Range: `bytes=0-${Math.ceil(KEY_PREVIEW_BITS / 8) - 1}` },
+    });
+  } catch (error) {
+    if (error.response && error.response.status === 416) return "";
+    throw error;
+  }
+  const keyLength = Number(res.headers["x-key-length"]);
+  const bytes = new Uint8Array(res.data);
+  const bits = [];
+  for (let i = 0; i < Math.min(keyLength, KEY_PREVIEW_BITS, bytes.length * 8); i++) {
+    bits.push((bytes[i >> 3] >> (7 - (i & 7))) & 1);
+  }
+  return bits.join("") + (keyLength > KEY_PREVIEW_BITS ? "..." : "");
+}
+
 // Helper to format percentage
 const formatPercent = (value) => (value * 100).toFixed(2) + "%";
 
@@ -34,9 +63,10 @@ function formatSKR(value) {
   return value + ' bps';
 }
 
-export default function Results({ results }) {
+export default function Results({ results, runId }) {
   const [tab, setTab] = useState("summary");
   const [selectedChannelId, setSelectedChannelId] = useState(null);
+  const [keyPreview, setKeyPreview] = useState(null);
 
   useEffect(() => {
     if (results && results.length > 0) {
@@ -44,6 +74,26 @@ export default function Results({ results }) {
     }
   }, [results]);
 
+  // Keys are not part of the results; load a preview of the selected channel's keys on demand
+  useEffect(() => {
+    setKeyPreview(null);
+    if (tab !== "keys" || !runId || selectedChannelId === null) return;
+    const selected = results && results.find(r => r.channel_id === selectedChannelId);
+    if (selected && selected.alice_key) return;  // Keys were embedded in the response
+    if (selected && selected.sifted_key_length === 0) {
+      setKeyPreview({ alice: "", bob: "" });
+      return;
+    }
+    let cancelled = false;
+    Promise.all([
+      fetchKeyPreview(runId, selectedChannelId, "alice"),
+      fetchKeyPreview(runId, selectedChannelId, "bob"),
+    ])
+      .then(([alice, bob]) => { if (!cancelled) setKeyPreview({ alice, bob }); })
+      .catch(error => { if (!cancelled) setKeyPreview({ error: error.message }); });
+    return () => { cancelled = true; };
+  }, [tab, runId, selectedChannelId, results]);
+
   if (!results || results.length === 0) {
     return <div style={{ color: "red" }}>No results to display.</div>;
   }
@@ -117,9 +167,18 @@ export default function Results({ results }) {
             Key Comparison for Channel {selectedResult.channel_id} (First 100 bits)
           </Typography>
           <div style={{ display: "grid", gridTemplateColumns: "1fr 1fr", gap: 16 }}>
-            <div><b>Alice's Key:</b><div style={{ wordBreak: "break-all", fontFamily: "monospace" }}>{formatKey(selectedResult.alice_key)}</div></div>
-            <div><b>Bob's Key:</b><div style={{ wordBreak: "break-all", fontFamily: "monospace" }}>{formatKey(selectedResult.bob_key)}</div></div>
+            <div><b>Alice's Key:</b><div style={{ wordBreak: "break-all", fontFamily: "monospace" }}>{selectedResult.alice_key ? formatKey(selectedResult.alice_key) : keyPreview ? (keyPreview.error || keyPreview.alice || "(empty key)") : "Loading..."}</div></div>
+            <div><b>Bob's Key:</b><div style={{ wordBreak: "break-all", fontFamily: "monospace" }}>{selectedResult.bob_key ? formatKey(selectedResult.bob_key) : keyPreview ? (keyPreview.error || keyPreview.bob || "(empty key)") : "Loading..."}</div></div>
           </div>
+          {runId && (
+            <Box mt={2}>
+              <Button href={keyUrl(runId, selectedResult.channel_id, "alice")} variant="outlined" size="small" sx={{ mr: 1 }}>Download Alice's Key</Button>
+              <Button href={keyUrl(runId, selectedResult.channel_id, "bob")} variant="outlined" size="small">Download Bob's Key</Button>
+              <Typography variant="body2" color="text.secondary" mt={1}>
+                {selectedResult.sifted_key_length} bits, packed 8 bits per byte (most significant bit first).
+              </Typography>
+            </Box>
+          )}
         </div>
       )}
 
@@ -0,0 +1,180 @@
+"""
+In-process job store for long /simulate runs.
+
+A job is a list of channel tasks (keyword dicts for main.run_channel_session).
+Submitting returns immediately; a job thread feeds the tasks to a shared local
+process pool and records each channel result as it completes, so HTTP workers
+only ever poll or stream.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from main import _run_channel_task
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class Job:
+    """State of one submitted simulation: progress, per-channel results and cancellation."""
+    def __init__(self, tasks, max_in_flight=1):
+        self.job_id = uuid.uuid4().hex
+        self.tasks = tasks
+        self.max_in_flight = max(1, max_in_flight)  # Channels of this job running at once
+        self.status = QUEUED
+        self.error = None
+        self.results = []  # Channel results in completion order
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def total(self):
+        return len(self.tasks)
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def _update(self, status=None, result=None, error=None):
+        with self._changed:
+            if result is not None:
+                self.results.append(result)
+            if error is not None:
+                self.error = error
+            if status is not None:
+                self.status = status
+                if status in FINISHED_STATES:
+                    self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def summary(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "completed_channels": len(self.results),
+            "total_channels": self.total,
+            "progress": len(self.results) / self.total if self.total else 1.0,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def iter_results(self, poll_interval_s=1.0):
+        """Yields channel results as they complete, until the job finishes."""
+        sent = 0
+        while True:
+            with self._changed:
+                while sent == len(self.results) and not self.finished:
+                    self._changed.wait(poll_interval_s)
+                pending = self.results[sent:]
+                done = self.finished
+            for result in pending:
+                yield result
+            sent += len(pending)
+            if done and sent == len(self.results):
+                return
+
+
+class JobStore:
+    """
+    Keeps jobs in memory and runs them on a shared local process pool.
+    At most max_finished_jobs finished jobs are retained (oldest evicted first).
+    With a result cache, cached channels are reported at once and never hit the pool.
+    """
+    def __init__(self, max_workers=None, max_finished_jobs=100, cache=None):
+        self.cache = cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_finished_jobs = max_finished_jobs
+        self.cancel_poll_interval_s = 0.5
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._job_threads = ThreadPoolExecutor(thread_name_prefix="qkd-job")
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def submit(self, tasks, max_in_flight=1):
+        job = Job(tasks, min(max_in_flight, self.max_workers))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+        self._job_threads.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Requests cancellation; queued channels are dropped, running ones are not interrupted."""
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_requested.set()
+        return job
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        if job.cancel_requested.is_set():
+            job._update(status=CANCELLED)
+            return
+        job._update(status=RUNNING)
+        pool = self._get_pool()
+        queued = iter(job.tasks)
+        in_flight = {}  # future -> task
+        try:
+            while True:
+                # Keep at most max_in_flight channels of this job on the pool
+                while len(in_flight) < job.max_in_flight and not job.cancel_requested.is_set():
+                    task = next(queued, None)
+                    if task is None:
+                        break
+                    cached = self.cache.get(task) if self.cache is not None else None
+                    if cached is not None:
+                        job._update(result=cached)
+                        continue
+                    in_flight[pool.submit(_run_channel_task, task)] = task
+                if job.cancel_requested.is_set():
+                    for future in in_flight:
+                        future.cancel()
+                    job._update(status=CANCELLED)
+                    return
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, timeout=self.cancel_poll_interval_s, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = in_flight.pop(future)
+                    result = future.result()
+                    if self.cache is not None:
+                        self.cache.put(task, result)
+                    job._update(result=result)
+        except Exception as e:
+            for future in in_flight:
+                future.cancel()
+            job._update(status=FAILED, error=f"{type(e).__name__}: {e}")
+            return
+        job._update(status=COMPLETED)
+
+    def shutdown(self):
+        self._job_threads.shutdown(wait=False, cancel_futures=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
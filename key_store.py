@@ -0,0 +1,43 @@
+"""
+Keys of recent /simulate runs, for download after a metrics-only response.
+
+/simulate leaves the sifted keys out of its JSON by default; the run's PackedKeys
+are kept here under a run id so clients can fetch a channel's key on demand.
+Only the max_runs most recent runs are kept (least recently used evicted first).
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class KeyStore:
+    """Thread-safe LRU of run_id -> {channel_id: (alice_key, bob_key)}."""
+    def __init__(self, max_runs=32):
+        self.max_runs = max_runs
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, results):
+        """Stores the keys of a run's channel results; returns the new run id."""
+        run_id = uuid.uuid4().hex
+        if self.max_runs <= 0:
+            return run_id
+        keys = {result["channel_id"]: (result["alice_key"], result["bob_key"]) for result in results}
+        with self._lock:
+            self._runs[run_id] = keys
+            while len(self._runs) > self.max_runs:
+                self._runs.popitem(last=False)
+        return run_id
+
+    def get(self, run_id, channel_id):
+        """(alice_key, bob_key) of a channel of a stored run, or None."""
+        with self._lock:
+            keys = self._runs.get(run_id)
+            if keys is None:
+                return None
+            self._runs.move_to_end(run_id)
+            return keys.get(channel_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._runs)
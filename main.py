@@ -2,14 +2,26 @@
 
 # We only import the Network class, as it manages the Alice/Bob components internally
 from simulation.Network import Network
+from simulation.Reconciliation import binary_entropy, estimate_qber
+from simulation.Diagnostics import get_logger, configure as configure_diagnostics
+from simulation.AnalyticModel import analytic_model
 
+import logging
+import sys
 import math # Still used for QBER calculation, even if not formal post-processing
-import random
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = get_logger('main')
 
 def calculate_qber(alice_sifted_key, bob_sifted_key, dr=0.10, seed=None):
     """
     Calculates the QBER using a random sample (disclose rate, DR) of the sifted key.
     Only a fraction (DR) of the key is publicly compared for QBER estimation.
+    The sample positions are drawn from a private NumPy generator seeded with seed,
+    so the global random state is never touched, and the mismatches are read
+    straight from the packed XOR of the two keys without unpacking them.
     """
     if len(alice_sifted_key) != len(bob_sifted_key):
         raise ValueError("Sifted keys must be of the same length to calculate QBER.")
@@ -19,75 +31,119 @@ def calculate_qber(alice_sifted_key, bob_sifted_key, dr=0.10, seed=None):
         return 0.0, 0
 
     sample_size = max(1, int(dr * key_length))
-    indices = list(range(key_length))
-    if seed is not None:
-        random.seed(seed)
-    sample_indices = random.sample(indices, sample_size)
+    return estimate_qber(alice_sifted_key, bob_sifted_key, sample_size, seed=seed)
+
+def postprocessing_batch(raw_key_length, qber, dr=0.10, error_correction_efficiency=1.2,
+                         privacy_amplification_ratio=0.5, leaked_bits=None):
+    """
+    postprocessing over whole arrays of parameters at once, for parameter sweeps.
+    All arguments broadcast against each other (scalars or NumPy arrays).
 
-    num_errors = 0
-    for idx in sample_indices:
-        # print("sample index")
-        if alice_sifted_key[idx] != bob_sifted_key[idx]:
-            num_errors += 1
+    Args:
+        raw_key_length (array_like): Sifted key lengths.
+        qber (array_like): Estimated QBERs.
+        dr (array_like): Disclose rates used for parameter estimation.
+        error_correction_efficiency (array_like): Error correction efficiencies (>= 1).
+        privacy_amplification_ratio (array_like): Privacy amplification compression ratios.
+        leaked_bits (array_like, optional): Bits actually disclosed by a reconciliation run;
+            replaces the error_correction_efficiency·h(QBER) estimate of the error correction cost.
 
-    qber = num_errors / sample_size
-    return qber, num_errors
+    Returns:
+        dict: Broadcast arrays 'final_key_length', 'after_parameter_estimation',
+        'after_error_correction', 'after_privacy_amplification' (int64) and
+        'ec_fraction' (float).
+    """
+    raw_key_length, qber, dr, error_correction_efficiency, privacy_amplification_ratio = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (raw_key_length, qber, dr, error_correction_efficiency,
+                                                privacy_amplification_ratio)))
+    key_after_dr = raw_key_length * (1 - dr)
+    if leaked_bits is None:
+        ec_fraction = error_correction_efficiency * binary_entropy(qber)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ec_fraction = np.where(key_after_dr > 0, np.asarray(leaked_bits, dtype=float) / key_after_dr, 0.0)
+    key_after_ec = key_after_dr * (1 - ec_fraction)
+    key_after_pa = key_after_ec * (1 - privacy_amplification_ratio)
+    # int() semantics: truncate toward zero; the final length is never negative
+    return {
+        'final_key_length': np.maximum(0, np.trunc(key_after_pa)).astype(np.int64),
+        'after_parameter_estimation': np.trunc(key_after_dr).astype(np.int64),
+        'after_error_correction': np.trunc(key_after_ec).astype(np.int64),
+        'after_privacy_amplification': np.trunc(key_after_pa).astype(np.int64),
+        'ec_fraction': ec_fraction,
+    }
 
-def postprocessing(raw_key_length, qber, dr=0.10, error_correction_efficiency=1.2, privacy_amplification_ratio=0.5):
+def postprocessing(raw_key_length, qber, dr=0.10, error_correction_efficiency=1.2, privacy_amplification_ratio=0.5,
+                   leaked_bits=None):
     """
     Simulates postprocessing as described in QKD theory:
     - Parameter estimation: uses a fraction DR of the key for QBER estimation
     - Error correction: reduces key length based on QBER and error correction efficiency
     - Privacy amplification: further compresses the key using a compression ratio (CR)
     Returns the final key length and a breakdown of each step.
+    With leaked_bits (from a reconciliation run) error correction costs those bits
+    instead of the efficiency·h(QBER) estimate.
+    For many parameter points at once use postprocessing_batch.
     """
-    # Parameter estimation: remove DR fraction for QBER estimation
-    key_after_dr = raw_key_length * (1 - dr)
-    # Error correction: remove fraction based on QBER and efficiency
-    # (Shannon limit: h(QBER), efficiency > 1)
-    from math import log2
-    def binary_entropy(x):
-        if x == 0 or x == 1:
-            return 0.0
-        return -x * log2(x) - (1 - x) * log2(1 - x)
-    ec_fraction = error_correction_efficiency * binary_entropy(qber)
-    key_after_ec = key_after_dr * (1 - ec_fraction)
-    # Privacy amplification: further compress
-    key_after_pa = key_after_ec * (1 - privacy_amplification_ratio)
-    
-    # Ensure final key length is not negative
-    final_key_length = max(0, int(key_after_pa))
+    batch = postprocessing_batch(raw_key_length, qber, dr, error_correction_efficiency, privacy_amplification_ratio,
+                                 leaked_bits)
     
     # Warn if QBER is too high for secure key generation
     if qber > 0.10:  # 10% is now the upper limit for all protocols
-        print(f"WARNING: QBER ({qber:.4f}) is too high for secure key generation!")
+        logger.warning("QBER (%.4f) is too high for secure key generation!", qber)
     
-    return final_key_length, {
-        'after_parameter_estimation': int(key_after_dr),
-        'after_error_correction': int(key_after_ec),
-        'after_privacy_amplification': int(key_after_pa),
+    return int(batch['final_key_length']), {
+        'after_parameter_estimation': int(batch['after_parameter_estimation']),
+        'after_error_correction': int(batch['after_error_correction']),
+        'after_privacy_amplification': int(batch['after_privacy_amplification']),
         'dr': dr,
-        'ec_fraction': ec_fraction,
+        'ec_fraction': float(batch['ec_fraction']),
         'privacy_amplification_ratio': privacy_amplification_ratio
     }
 
+def run_analytic_model(protocol, pulse_repetition_rate_ns=1, dr=0.10, error_correction_efficiency=1.2,
+                       privacy_amplification_ratio=0.5, **params):
+    """
+    Closed-form counterpart of run_channel_session: expected sifted rate, QBER and secure
+    key rate from simulation.AnalyticModel, with postprocessing_batch applied to one second
+    of sifted key. Parameters may be NumPy arrays (they broadcast), so whole sweep grids
+    are evaluated at once.
+
+    Args:
+        protocol (str): 'dps', 'cow' or 'bb84'.
+        pulse_repetition_rate_ns (array_like): Pulse period in ns.
+        dr, error_correction_efficiency, privacy_amplification_ratio: As in postprocessing.
+        **params: Model parameters (distance_km, mu, detector_efficiency, dark_count_rate, ...).
+
+    Returns:
+        dict: The model's arrays plus 'sifted_rate_bps', 'ec_fraction' and 'secure_key_rate_bps'.
+    """
+    result = analytic_model(protocol, **params)
+    sifted_rate_bps = result['sifted_probability'] * (1e9 / np.asarray(pulse_repetition_rate_ns, dtype=float))
+    batch = postprocessing_batch(sifted_rate_bps, result['qber'], dr, error_correction_efficiency,
+                                 privacy_amplification_ratio)
+    result.update(sifted_rate_bps=sifted_rate_bps, ec_fraction=batch['ec_fraction'],
+                  secure_key_rate_bps=batch['final_key_length'])
+    return result
+
 def run_point_to_point_simulation(num_pulses_per_link=10000, distance_km=20, mu=0.2,
                                   detector_efficiency=0.9, dark_count_rate_per_ns=1e-7,
-                                  pulse_repetition_rate_ns=1):
+                                  pulse_repetition_rate_ns=1, seed=None):
     """
     Runs a single point-to-point DPS-QKD simulation and prints key metrics, including theory-relevant postprocessing.
     QBER should be in the range 3-10% for practical QKD. Prints a warning if outside this range.
+    A fixed seed reproduces the run exactly.
     """
-    print("\n--- Running Point-to-Point QKD Simulation ---")
+    logger.info("\n--- Running Point-to-Point QKD Simulation ---")
     
     # Create a temporary network with two nodes for the point-to-point simulation
-    temp_network = Network()
+    temp_network = Network(seed=seed)
     node_alice = temp_network.add_node('Alice', avg_photon_number=mu)
     node_bob = temp_network.add_node('Bob', detector_efficiency=detector_efficiency,
                                         dark_count_rate=dark_count_rate_per_ns)
     temp_network.connect_nodes('Alice', 'Bob', distance_km=distance_km)
     
-    print(f"Simulating point-to-point QKD for {distance_km} km with {num_pulses_per_link} pulses.")
+    logger.info("Simulating point-to-point QKD for %s km with %s pulses.", distance_km, num_pulses_per_link)
     
     # Generate the raw sifted key for this link
     alice_raw_sifted_key, bob_raw_sifted_key = node_alice.generate_and_share_key(
@@ -95,51 +151,54 @@ def run_point_to_point_simulation(num_pulses_per_link=10000, distance_km=20, mu=
     )
     
     # Calculate QBER for this link
-    qber, num_errors = calculate_qber(alice_raw_sifted_key, bob_raw_sifted_key)
+    qber, num_errors = calculate_qber(alice_raw_sifted_key, bob_raw_sifted_key,
+                                      seed=temp_network.rng.child('qber').seed_int())
     if not (0.03 <= qber <= 0.10):
-        print(f"WARNING: QBER ({qber:.4f}) is outside the practical range (3-10%) for QKD!")
+        logger.warning("QBER (%.4f) is outside the practical range (3-10%%) for QKD!", qber)
     else:
-        print(f"QBER ({qber:.4f}) is within the practical range (3-10%) for QKD.")
+        logger.info("QBER (%.4f) is within the practical range (3-10%%) for QKD.", qber)
     # --- Theory-relevant postprocessing ---
     final_key_len, postproc = postprocessing(len(alice_raw_sifted_key), qber)
-    print(f"\n--- Postprocessing (Theory-Relevant) ---")
-    print(f"Key after parameter estimation (DR): {postproc['after_parameter_estimation']}")
-    print(f"Key after error correction: {postproc['after_error_correction']}")
-    print(f"Key after privacy amplification: {postproc['after_privacy_amplification']}")
-    print(f"Final key length: {final_key_len}")
-    print(f"(DR={postproc['dr']}, EC fraction={postproc['ec_fraction']:.4f}, PA ratio={postproc['privacy_amplification_ratio']})")
+    logger.info("\n--- Postprocessing (Theory-Relevant) ---")
+    logger.info("Key after parameter estimation (DR): %s", postproc['after_parameter_estimation'])
+    logger.info("Key after error correction: %s", postproc['after_error_correction'])
+    logger.info("Key after privacy amplification: %s", postproc['after_privacy_amplification'])
+    logger.info("Final key length: %s", final_key_len)
+    logger.info("(DR=%s, EC fraction=%.4f, PA ratio=%s)", postproc['dr'], postproc['ec_fraction'], postproc['privacy_amplification_ratio'])
     
     # Calculate Raw Sifted Key Rate (bits/pulse)
     if num_pulses_per_link > 0:
         raw_key_rate_per_pulse = len(alice_raw_sifted_key) / num_pulses_per_link
-        print(f"Raw Sifted Key Rate (bits/pulse): {raw_key_rate_per_pulse:.4f}")
+        logger.info("Raw Sifted Key Rate (bits/pulse): %.4f", raw_key_rate_per_pulse)
     
     # Calculate Raw Sifted Key Rate (bits/second)
     total_time_s = (num_pulses_per_link * pulse_repetition_rate_ns) / 1e9 # Convert ns to seconds
     if total_time_s > 0:
         raw_key_rate_bps = len(alice_raw_sifted_key) / total_time_s
-        print(f"Raw Sifted Key Rate (bits/second): {raw_key_rate_bps:.2f} bps")
+        logger.info("Raw Sifted Key Rate (bits/second): %.2f bps", raw_key_rate_bps)
     else:
-        print("Raw Sifted Key Rate (bits/second): N/A (too few pulses)")
+        logger.info("Raw Sifted Key Rate (bits/second): N/A (too few pulses)")
         
     # --- Secure Key Rates ---
     if total_time_s > 0:
         secure_key_rate_bps = final_key_len / total_time_s
-        print(f"Secure Key Rate (bits/second): {secure_key_rate_bps:.2f} bps")
+        logger.info("Secure Key Rate (bits/second): %.2f bps", secure_key_rate_bps)
     else:
-        print("Secure Key Rate (bits/second): N/A")
+        logger.info("Secure Key Rate (bits/second): N/A")
   
     return final_key_len, qber
 
 def run_multi_node_trusted_relay_simulation(num_pulses_per_link=10000, link_distance_km=10, num_relays=1,
                                             mu=0.2, detector_efficiency=0.9, dark_count_rate_per_ns=1e-7,
-                                            pulse_repetition_rate_ns=1):
+                                            pulse_repetition_rate_ns=1, seed=None, workers=None):
     """
     Runs a multi-node trusted relay QKD simulation and prints key metrics.
+    A fixed seed reproduces the run exactly; workers threads run the link sessions
+    (default: one per link).
     """
-    print(f"\n--- Running Multi-Node (Trusted Relay) QKD Simulation with {num_relays} relay(s) ---")
+    logger.info("\n--- Running Multi-Node (Trusted Relay) QKD Simulation with %s relay(s) ---", num_relays)
     
-    network = Network()
+    network = Network(seed=seed)
     
     # Define nodes: Alice, Relay1, ..., RelayN, Bob
     sender_id = 'Alice'
@@ -163,31 +222,37 @@ def run_multi_node_trusted_relay_simulation(num_pulses_per_link=10000, link_dist
     
     # Establish the end-to-end raw sifted key via trusted relays
     final_end_to_end_raw_key = network.establish_end_to_end_raw_key(
-        sender_id, receiver_id, path, num_pulses_per_link, pulse_repetition_rate_ns
+        sender_id, receiver_id, path, num_pulses_per_link, pulse_repetition_rate_ns, workers=workers
     )
 
-    print(f"\n--- Multi-Node Results ({num_relays} relays, {link_distance_km}km per link) ---")
+    logger.info("\n--- Multi-Node Results (%s relays, %skm per link) ---", num_relays, link_distance_km)
     if final_end_to_end_raw_key is not None:
-        print(f"End-to-End Raw Sifted Key Length: {len(final_end_to_end_raw_key)}")
+        relay_report = network.relay_log[-1]
+        logger.info("End-to-End Raw Key Length: %s (bottleneck link %s-%s, %s errors at Bob)",
+                    len(final_end_to_end_raw_key), *relay_report['bottleneck_link'], relay_report['errors'])
         
         # Calculate total distance and total pulses
         num_links = len(all_node_ids) - 1
         total_distance_km = num_links * link_distance_km
         total_pulses_generated_across_all_links = num_pulses_per_link * num_links # Sum of pulses for each link
         
-        print(f"Total Network Distance: {total_distance_km} km")
-        print(f"Total Pulses Generated (sum across links): {total_pulses_generated_across_all_links}")
+        logger.info("Total Network Distance: %s km", total_distance_km)
+        logger.info("Total Pulses Generated (sum across links): %s", total_pulses_generated_across_all_links)
         
-        # Total time is the sum of times to generate key on each link (assuming sequential generation)
-        total_time_s = (total_pulses_generated_across_all_links * pulse_repetition_rate_ns) / 1e9
+        # The links run their sessions concurrently, so the chain takes as long as its slowest hop
+        total_time_s = relay_report['simulated_wall_time_s']
+        logger.info("Simulated wall time: %.6f s (%.6f s if the hops ran one after another)",
+                    total_time_s, relay_report['serial_simulated_time_s'])
+        logger.info("Compute time: %.3f s on %d workers (per hop: %s)", relay_report['compute_wall_s'],
+                    relay_report['workers'], ", ".join(f"{hop['compute_s']:.3f} s" for hop in relay_report['hops']))
         
         if total_time_s > 0:
             end_to_end_raw_key_rate_bps = len(final_end_to_end_raw_key) / total_time_s
-            print(f"End-to-End Raw Sifted Key Rate (bits/second): {end_to_end_raw_key_rate_bps:.2f} bps")
+            logger.info("End-to-End Raw Key Rate (bits/second): %.2f bps", end_to_end_raw_key_rate_bps)
         else:
-            print("End-to-End Raw Sifted Key Rate (bits/second): N/A (too few pulses)")
+            logger.info("End-to-End Raw Key Rate (bits/second): N/A (too few pulses)")
     else:
-        print("End-to-End raw sifted key establishment failed.")
+        logger.info("End-to-End raw sifted key establishment failed.")
         
     return final_end_to_end_raw_key
 
@@ -195,14 +260,15 @@ def run_point_to_point_cow_simulation(num_pulses_per_link=10000, distance_km=20,
                                       detector_efficiency=0.9, dark_count_rate_per_ns=1e-7,
                                       pulse_repetition_rate_ns=1, cow_monitor_pulse_ratio=0.1,
                                       cow_detection_threshold_photons=0, cow_extinction_ratio_db=20.0,
-                                      bit_flip_error_prob=0.05):
+                                      bit_flip_error_prob=0.05, seed=None):
     """
     Runs a single point-to-point COW-QKD simulation and prints key metrics, including theory-relevant postprocessing.
     QBER should be in the range 3-10% for practical QKD. Prints a warning if outside this range.
+    A fixed seed reproduces the run exactly.
     """
-    print("\n--- Running Point-to-Point COW QKD Simulation ---")
+    logger.info("\n--- Running Point-to-Point COW QKD Simulation ---")
     
-    temp_network = Network()
+    temp_network = Network(seed=seed)
     # Pass COW specific parameters when adding nodes for COW simulation
     node_alice = temp_network.add_node('Alice', avg_photon_number=mu, 
                                        cow_monitor_pulse_ratio=cow_monitor_pulse_ratio,
@@ -214,7 +280,7 @@ def run_point_to_point_cow_simulation(num_pulses_per_link=10000, distance_km=20,
                                       cow_detection_threshold_photons=cow_detection_threshold_photons)
     temp_network.connect_nodes('Alice', 'Bob', distance_km=distance_km)
     
-    print(f"Simulating COW QKD for {distance_km} km with {num_pulses_per_link} pulses.")
+    logger.info("Simulating COW QKD for %s km with %s pulses.", distance_km, num_pulses_per_link)
     
     alice_sifted_key_cow, bob_sifted_key_cow = node_alice.generate_and_share_key_cow(
         node_bob, num_pulses_per_link, pulse_repetition_rate_ns,
@@ -223,55 +289,182 @@ def run_point_to_point_cow_simulation(num_pulses_per_link=10000, distance_km=20,
         bit_flip_error_prob=bit_flip_error_prob
     )
     
-    qber_cow, num_errors_cow = calculate_qber(alice_sifted_key_cow, bob_sifted_key_cow)
+    qber_cow, num_errors_cow = calculate_qber(alice_sifted_key_cow, bob_sifted_key_cow,
+                                              seed=temp_network.rng.child('qber').seed_int())
     if not (0.03 <= qber_cow <= 0.10):
-        print(f"WARNING: QBER ({qber_cow:.4f}) is outside the practical range (3-10%) for QKD!")
+        logger.warning("QBER (%.4f) is outside the practical range (3-10%%) for QKD!", qber_cow)
     else:
-        print(f"QBER ({qber_cow:.4f}) is within the practical range (3-10%) for QKD.")
+        logger.info("QBER (%.4f) is within the practical range (3-10%%) for QKD.", qber_cow)
     # --- Theory-relevant postprocessing ---
     final_key_len, postproc = postprocessing(len(alice_sifted_key_cow), qber_cow)
-    print(f"\n--- Postprocessing (Theory-Relevant) ---")
-    print(f"Key after parameter estimation (DR): {postproc['after_parameter_estimation']}")
-    print(f"Key after error correction: {postproc['after_error_correction']}")
-    print(f"Key after privacy amplification: {postproc['after_privacy_amplification']}")
-    print(f"Final key length: {final_key_len}")
-    print(f"(DR={postproc['dr']}, EC fraction={postproc['ec_fraction']:.4f}, PA ratio={postproc['privacy_amplification_ratio']})")
+    logger.info("\n--- Postprocessing (Theory-Relevant) ---")
+    logger.info("Key after parameter estimation (DR): %s", postproc['after_parameter_estimation'])
+    logger.info("Key after error correction: %s", postproc['after_error_correction'])
+    logger.info("Key after privacy amplification: %s", postproc['after_privacy_amplification'])
+    logger.info("Final key length: %s", final_key_len)
+    logger.info("(DR=%s, EC fraction=%.4f, PA ratio=%s)", postproc['dr'], postproc['ec_fraction'], postproc['privacy_amplification_ratio'])
     
     if num_pulses_per_link > 0:
         # Effective number of data pulses (approximate, depends on random assignment)
         num_data_pulses_approx = num_pulses_per_link * (1 - cow_monitor_pulse_ratio)
         if num_data_pulses_approx > 0:
             raw_key_rate_per_data_pulse = len(alice_sifted_key_cow) / num_data_pulses_approx
-            print(f"COW Sifted Key Rate (bits/data pulse, approx): {raw_key_rate_per_data_pulse:.4f}")
+            logger.info("COW Sifted Key Rate (bits/data pulse, approx): %.4f", raw_key_rate_per_data_pulse)
     
     total_time_s = (num_pulses_per_link * pulse_repetition_rate_ns) / 1e9
     if total_time_s > 0:
         raw_key_rate_bps = len(alice_sifted_key_cow) / total_time_s
-        print(f"COW Sifted Key Rate (bits/second, total pulses): {raw_key_rate_bps:.2f} bps")
+        logger.info("COW Sifted Key Rate (bits/second, total pulses): %.2f bps", raw_key_rate_bps)
     else:
-        print("COW Sifted Key Rate (bits/second): N/A (too few pulses)")
+        logger.info("COW Sifted Key Rate (bits/second): N/A (too few pulses)")
         
     # --- Secure Key Rates ---
     if total_time_s > 0:
         secure_key_rate_bps = final_key_len / total_time_s
-        print(f"Secure Key Rate (bits/second): {secure_key_rate_bps:.2f} bps")
+        logger.info("Secure Key Rate (bits/second): %.2f bps", secure_key_rate_bps)
     else:
-        print("Secure Key Rate (bits/second): N/A")
+        logger.info("Secure Key Rate (bits/second): N/A")
 
     if num_pulses_per_link > 0:
         secure_key_rate_per_pulse = final_key_len / num_pulses_per_link
-        print(f"Secure Key Rate (bits/pulse): {secure_key_rate_per_pulse:.4f}")
+        logger.info("Secure Key Rate (bits/pulse): %.4f", secure_key_rate_per_pulse)
     else:
-        print("Secure Key Rate (bits/pulse): N/A")
+        logger.info("Secure Key Rate (bits/pulse): N/A")
 
     # TODO: Could add multi-node COW simulation example later
     return final_key_len, qber_cow
 
+def run_channel_session(protocol, channel, node_a, node_b, cow_params=None, engine='auto', seed=None,
+                        reconciliation='none', privacy_amplification=False):
+    """
+    Runs the QKD session of one channel of a /simulate request and returns its result dict.
+    channel, node_a and node_b are the plain dicts of the API models (channel keyed by 'from_').
+    Each channel gets its own two-node network, so with a fixed seed the result depends only
+    on these inputs and channels can run in any order, thread or process.
+    With a reconciliation method ('cascade' or 'ldpc') Bob's key is error corrected and the
+    bits it leaks replace the estimated error correction cost in postprocessing.
+    With privacy_amplification (needs a reconciliation method) both keys are Toeplitz hashed
+    to their secure length, which becomes the final key length.
+    """
+    cow_params = cow_params or {}
+    net = Network(engine=engine, seed=seed)
+    alice = net.add_node(f"Node_{node_a['id']}", avg_photon_number=node_a['mu'],
+                         detector_efficiency=node_a['detector_efficiency'],
+                         dark_count_rate=node_a['dark_count_rate'])
+    if node_b['id'] == node_a['id']:
+        bob = alice
+    else:
+        bob = net.add_node(f"Node_{node_b['id']}", avg_photon_number=node_b['mu'],
+                           detector_efficiency=node_b['detector_efficiency'],
+                           dark_count_rate=node_b['dark_count_rate'])
+    net.connect_nodes(alice.node_id, bob.node_id, distance_km=channel['fiber_length_km'],
+                      attenuation_db_per_km=channel['fiber_attenuation_db_per_km'])
+
+    num_pulses = node_a['num_pulses']
+    pulse_repetition_rate_ns = node_a['pulse_repetition_rate']
+    if protocol == "dps":
+        alice_key, bob_key = alice.generate_and_share_key(
+            bob, num_pulses, pulse_repetition_rate_ns, phase_flip_prob=channel['phase_flip_prob'],
+            reconciliation=reconciliation, privacy_amplification=privacy_amplification
+        )
+    elif protocol == "cow":
+        # Use only per-channel bit_flip_error_prob (no global fallback)
+        alice_key, bob_key = alice.generate_and_share_key_cow(
+            bob, num_pulses, pulse_repetition_rate_ns,
+            monitor_pulse_ratio=cow_params['monitor_pulse_ratio'],
+            detection_threshold_photons=int(cow_params['detection_threshold_photons']),
+            phase_flip_prob=channel['phase_flip_prob'],
+            bit_flip_error_prob=channel['bit_flip_error_prob'],
+            reconciliation=reconciliation, privacy_amplification=privacy_amplification
+        )
+    elif protocol == "bb84":
+        alice_key, bob_key = alice.generate_and_share_key_bb84(
+            bob, num_pulses, pulse_repetition_rate_ns, phase_flip_prob=channel['phase_flip_prob'],
+            reconciliation=reconciliation, privacy_amplification=privacy_amplification
+        )
+    else:
+        raise ValueError(f"Unknown protocol '{protocol}'.")
+
+    session_log = alice.traffic_log[-1]
+    reconciliation_stats = session_log['reconciliation']
+    amplification_stats = session_log['privacy_amplification']
+    sifted_length = session_log['sifted_length']
+    if reconciliation_stats is None:
+        qber, num_errors = calculate_qber(alice_key, bob_key, seed=net.rng.child('qber', channel['id']).seed_int())
+        final_key_len, postproc = postprocessing(len(alice_key), qber)
+    else:
+        # Bob's key is already corrected: use the estimate made before reconciliation
+        qber, num_errors = reconciliation_stats['qber_estimate'], reconciliation_stats['sample_errors']
+        # Frames reconciliation could not correct were dropped: start from the reconciled length
+        final_key_len, postproc = postprocessing(len(alice_key), qber, leaked_bits=reconciliation_stats['leaked_bits'])
+    if amplification_stats is not None:
+        # The keys are already hashed down: report their actual length
+        final_key_len = amplification_stats['output_bits']
+    total_time_s = (num_pulses * pulse_repetition_rate_ns) / 1e9 if num_pulses > 0 else 0
+    secure_key_rate_bps = final_key_len / total_time_s if total_time_s > 0 else 0
+    theory_compliance = (0.03 <= qber <= 0.10)
+    theory_message = "QBER is within the practical range (3-10%) for QKD." if theory_compliance else f"WARNING: QBER ({qber:.4f}) is outside the practical range for QKD."
+
+    parameters = {
+        "node_a": node_a,
+        "node_b": node_b,
+        "channel": channel
+    }
+    if protocol == "cow":
+        parameters["cow_globals"] = cow_params
+    return {
+        "channel_id": channel['id'],
+        "from": channel['from_'],
+        "to": channel['to'],
+        "protocol": protocol,
+        "qber": qber,
+        "final_key_length": final_key_len,
+        "secure_key_rate_bps": secure_key_rate_bps,
+        "sifted_key_length": sifted_length,
+        "num_errors": num_errors,
+        "postprocessing": postproc,
+        "theory_compliance": theory_compliance,
+        "theory_message": theory_message,
+        "alice_key": alice_key,
+        "bob_key": bob_key,
+        "reconciliation": reconciliation_stats,
+        "privacy_amplification": amplification_stats,
+        "parameters": parameters
+    }
+
+def _run_channel_task(task):
+    return run_channel_session(**task)
+
+def run_channel_sessions(tasks, workers=1, cache=None):
+    """
+    Runs a list of channel tasks (keyword dicts for run_channel_session) and returns
+    their results in task order. With workers > 1 the tasks are spread over a process
+    pool; under a fixed seed the results are identical to a serial run.
+    With a cache (get(task)/put(task, result), e.g. result_cache.ResultCache) only
+    the tasks it misses are simulated.
+    """
+    results = [cache.get(task) if cache is not None else None for task in tasks]
+    pending = [i for i, result in enumerate(results) if result is None]
+    pending_tasks = [tasks[i] for i in pending]
+    if not workers or workers <= 1 or len(pending_tasks) <= 1:
+        computed = [_run_channel_task(task) for task in pending_tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending_tasks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            computed = list(pool.map(_run_channel_task, pending_tasks))
+    for i, result in zip(pending, computed):
+        results[i] = result
+        if cache is not None:
+            cache.put(tasks[i], result)
+    return results
+
 def run_network_simulation_from_config(config_path):
     # Implementation of run_network_simulation_from_config function
     pass
 
 if __name__ == "__main__":
+    # The CLI reports at INFO on stdout; QKD_LOG_LEVEL (e.g. "INFO,network=DEBUG") and QKD_DEBUG_KEYS refine it
+    configure_diagnostics(stream=sys.stdout, default_level=logging.INFO)
     # Common simulation parameters
     common_params = {
         'num_pulses_per_link': 5000, # Number of pulses per QKD session (per link)
@@ -282,18 +475,14 @@ if __name__ == "__main__":
     }
 
     # Example 1: Point-to-Point Simulation
-    print("\n" + "="*70)
-    print("        RUNNING POINT-TO-POINT QKD SIMULATION")
-    print("="*70)
+    logger.info("\n%s\n        RUNNING POINT-TO-POINT QKD SIMULATION\n%s", "=" * 70, "=" * 70)
     final_key_len_ptp, qber_ptp = run_point_to_point_simulation(
         distance_km=20, # Alice sends directly to Bob over 20km
         **common_params
     )
 
     # Example 2: Multi-Node Trusted Relay Simulation with 1 Relay
-    print("\n" + "="*70)
-    print("        RUNNING MULTI-NODE (1 RELAY) QKD SIMULATION")
-    print("="*70)
+    logger.info("\n%s\n        RUNNING MULTI-NODE (1 RELAY) QKD SIMULATION\n%s", "=" * 70, "=" * 70)
     final_key_multi_node_1_relay = run_multi_node_trusted_relay_simulation(
         link_distance_km=20, # Each link (Alice-Relay, Relay-Bob) is 20km
         num_relays=1,        # Alice - Relay1 - Bob (Total 40km)
@@ -301,9 +490,7 @@ if __name__ == "__main__":
     )
 
     # Example 3: Multi-Node Trusted Relay Simulation with 2 Relays
-    print("\n" + "="*70)
-    print("        RUNNING MULTI-NODE (2 RELAYS) QKD SIMULATION")
-    print("="*70)
+    logger.info("\n%s\n        RUNNING MULTI-NODE (2 RELAYS) QKD SIMULATION\n%s", "=" * 70, "=" * 70)
     final_key_multi_node_2_relays = run_multi_node_trusted_relay_simulation(
         link_distance_km=20, # Each link is 20km
         num_relays=2,        # Alice - Relay1 - Relay2 - Bob (Total 60km)
@@ -311,9 +498,7 @@ if __name__ == "__main__":
     )
     
     # Example 4: Point-to-Point COW QKD Simulation
-    print("\n" + "="*70)
-    print("        RUNNING POINT-TO-POINT COW QKD SIMULATION")
-    print("="*70)
+    logger.info("\n%s\n        RUNNING POINT-TO-POINT COW QKD SIMULATION\n%s", "=" * 70, "=" * 70)
     cow_params = {
         'num_pulses_per_link': 5000,
         'mu': 0.2,  # COW often uses lower mu for data bits to reduce multi-photon pulses
@@ -330,6 +515,4 @@ if __name__ == "__main__":
         **cow_params
     )
 
-    print("\n" + "="*70)
-    print("SIMULATIONS COMPLETE!")
-    print("="*70)
\ No newline at end of file
+    logger.info("\n%s\nSIMULATIONS COMPLETE!\n%s", "=" * 70, "=" * 70)
\ No newline at end of file
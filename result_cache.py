@@ -0,0 +1,94 @@
+"""
+LRU cache of per-channel simulation results.
+
+Entries are keyed on a canonical hash of a channel task (protocol, both nodes'
+parameters, channel parameters, COW globals, engine and seed), so resubmitting a
+topology only re-simulates the channels whose inputs changed. Tasks without a
+seed are random runs and are never cached.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def task_key(task):
+    """Canonical SHA-256 key of a channel task (keyword dict for main.run_channel_session)."""
+    task = dict(task)
+    if task.get("protocol") != "cow":
+        task.pop("cow_params", None)  # COW globals don't affect DPS/BB84 sessions
+    canonical = json.dumps(task, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a maximum number of entries and a time to live.
+    max_entries <= 0 disables caching; ttl_s=None keeps entries until evicted.
+    """
+    def __init__(self, max_entries=256, ttl_s=3600.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()  # key -> (stored_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def cacheable(task):
+        return task.get("seed") is not None
+
+    def get(self, task):
+        """Returns the cached result of task, or None on a miss."""
+        if not self.cacheable(task) or self.max_entries <= 0:
+            return None
+        key = task_key(task)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_s is not None and time.monotonic() - entry[0] > self.ttl_s:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, task, result):
+        if not self.cacheable(task) or self.max_entries <= 0:
+            return
+        key = task_key(task)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every entry and resets the counters, so stats() describe the cache from now on."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,146 @@
+"""
+Closed-form (asymptotic) expectations of the Monte Carlo QKD sessions.
+
+Each model follows the same physics as the session engines (Engine.py), so its
+sifted probability and QBER are what a long simulated session converges to:
+- a Poissonian pulse of mean mu reaches Bob as Poisson(mu·T), T the OpticalChannel
+  survival probability
+- a SinglePhotonDetector fed Poisson(λ) photons clicks with 1 - exp(-η·λ)·(1 - d),
+  η its quantum efficiency and d its dark count probability per window
+Every parameter may be a scalar or a NumPy array; the outputs broadcast against
+each other, so a grid of thousands of points costs a handful of array operations.
+"""
+import numpy as np
+
+ANALYTIC_PROTOCOLS = ('dps', 'cow', 'bb84')
+
+
+def channel_transmittance(distance_km, attenuation_db_per_km=0.2):
+    """OpticalChannel.survival_probability: 10^(-distance·attenuation/10)."""
+    return 10 ** (-(np.asarray(distance_km, dtype=float) * attenuation_db_per_km) / 10)
+
+
+def dark_count_probability(dark_count_rate, time_window_ns=1):
+    """SinglePhotonDetector.prob_dark_count_per_window."""
+    return np.asarray(dark_count_rate, dtype=float) * time_window_ns
+
+
+def click_probability(incident_mean, detector_efficiency=0.9, dark_count_probability=1e-7):
+    """Click probability of a detector fed a Poissonian pulse of mean incident_mean."""
+    return 1 - np.exp(-np.asarray(incident_mean, dtype=float) * detector_efficiency) * (1 - dark_count_probability)
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, 0.0)
+
+
+def _check_mu(mu):
+    mu = np.asarray(mu, dtype=float)
+    if np.any((mu <= 0) | (mu >= 1)):
+        raise ValueError("Average photon number (mu) for WCP should be between 0 and 1.")
+    return mu
+
+
+def dps_model(distance_km, mu=0.2, detector_efficiency=0.9, dark_count_rate=1e-7, attenuation_db_per_km=0.2,
+              phase_flip_prob=0.0, time_window_ns=1):
+    """
+    DPS (iter_dps_blocks): a pulse pair interferes when both pulses arrive non-empty; the
+    phase difference routes it to the matching detector unless exactly one of the two pulses
+    was phase flipped. The routed detector fires with η (or a dark count), the other with d;
+    exactly one click sifts a bit, and pairs that do not interfere sift dark-count noise.
+
+    Returns:
+        dict: Broadcast arrays 'transmittance', 'click_probability' (pulse pair interferes
+        and the routed detector fires), 'sifted_probability' (sifted bits per pulse) and 'qber'.
+    """
+    mu = _check_mu(mu)
+    transmittance = channel_transmittance(distance_km, attenuation_db_per_km)
+    d = dark_count_probability(dark_count_rate, time_window_ns)
+    nonempty = -np.expm1(-mu * transmittance)
+    interferes = nonempty ** 2
+    # Detection of the routed effective photon, then the independent dark-count check
+    routed = 1 - (1 - detector_efficiency) * (1 - d) ** 2
+    misrouted = 2 * phase_flip_prob * (1 - phase_flip_prob)
+    right_alone = routed * (1 - d)
+    wrong_alone = (1 - routed) * d
+    noise_alone = 2 * d * (1 - d)
+    sifted = interferes * (right_alone + wrong_alone) + (1 - interferes) * noise_alone
+    errors = (interferes * ((1 - misrouted) * wrong_alone + misrouted * right_alone)
+              + (1 - interferes) * noise_alone / 2)
+    return {
+        'transmittance': transmittance,
+        'click_probability': interferes * routed,
+        'sifted_probability': sifted,
+        'qber': _ratio(errors, sifted),
+    }
+
+
+def cow_model(distance_km, mu=0.2, detector_efficiency=0.9, dark_count_rate=1e-7, attenuation_db_per_km=0.2,
+              phase_flip_prob=0.0, bit_flip_error_prob=0.0, monitor_pulse_ratio=0.1, extinction_ratio_db=20.0,
+              time_window_ns=1):
+    """
+    COW (iter_cow_blocks): a data pair holds one 'on' pulse (mu) and one 'off' pulse
+    (mu / extinction ratio, the IntensityModulator), and sifts a bit when exactly one of them
+    clicks. Both sides take the announced click position as the bit, so the only errors are
+    Bob's bit flips. A monitor pair (two 'on' pulses) succeeds when both click with matching
+    phase flips.
+
+    Returns:
+        dict: Broadcast arrays 'transmittance', 'click_probability' (of an 'on' pulse),
+        'sifted_probability' (sifted bits per pulse slot), 'qber' and 'monitor_success_rate'.
+    """
+    mu = _check_mu(mu)
+    extinction_ratio_db = np.asarray(extinction_ratio_db, dtype=float)
+    if np.any(extinction_ratio_db <= 0):
+        raise ValueError("Extinction ratio must be a positive value in dB.")
+    transmittance = channel_transmittance(distance_km, attenuation_db_per_km)
+    d = dark_count_probability(dark_count_rate, time_window_ns)
+    click_on = click_probability(mu * transmittance, detector_efficiency, d)
+    click_off = click_probability(mu * transmittance / 10 ** (extinction_ratio_db / 10), detector_efficiency, d)
+    single_click = click_on * (1 - click_off) + click_off * (1 - click_on)
+    # Two pulse slots per pair
+    sifted = (1 - np.asarray(monitor_pulse_ratio, dtype=float)) * single_click / 2
+    same_flips = phase_flip_prob ** 2 + (1 - phase_flip_prob) ** 2
+    return {
+        'transmittance': transmittance,
+        'click_probability': click_on,
+        'sifted_probability': sifted,
+        'qber': np.broadcast_to(np.asarray(0.0 if bit_flip_error_prob is None else bit_flip_error_prob, dtype=float), sifted.shape),
+        'monitor_success_rate': click_on ** 2 * same_flips,
+    }
+
+
+def bb84_model(distance_km, mu=0.2, detector_efficiency=0.9, dark_count_rate=1e-7, attenuation_db_per_km=0.2,
+               phase_flip_prob=0.0, misalignment_error=0.02, time_window_ns=1):
+    """
+    BB84 (iter_bb84_blocks): a click in the matching basis (probability 1/2) sifts a bit.
+    Bob reads the state bit, which a channel phase flip or the receiver's misalignment
+    error inverts; dark-count clicks read it the same way.
+
+    Returns:
+        dict: Broadcast arrays 'transmittance', 'click_probability', 'sifted_probability'
+        (sifted bits per pulse) and 'qber'.
+    """
+    mu = _check_mu(mu)
+    transmittance = channel_transmittance(distance_km, attenuation_db_per_km)
+    d = dark_count_probability(dark_count_rate, time_window_ns)
+    clicks = click_probability(mu * transmittance, detector_efficiency, d)
+    qber = phase_flip_prob + misalignment_error - 2 * phase_flip_prob * misalignment_error
+    return {
+        'transmittance': transmittance,
+        'click_probability': clicks,
+        'sifted_probability': clicks / 2,
+        'qber': np.broadcast_to(np.asarray(qber, dtype=float), clicks.shape),
+    }
+
+
+ANALYTIC_MODELS = {'dps': dps_model, 'cow': cow_model, 'bb84': bb84_model}
+
+
+def analytic_model(protocol, **params):
+    """Expected click, sifted and error probabilities of a protocol (see dps_model, cow_model, bb84_model)."""
+    model = ANALYTIC_MODELS.get(protocol)
+    if model is None:
+        raise ValueError(f"Unknown protocol '{protocol}'. Expected one of {ANALYTIC_PROTOCOLS}.")
+    return model(**params)
@@ -0,0 +1,112 @@
+"""
+Logging-based diagnostics for the simulator.
+
+Every subsystem logs to a child of the 'qkd' logger ('qkd.network', 'qkd.receiver',
+'qkd.main', ...) with lazy %-style arguments, so disabled messages cost a level check
+and nothing is formatted. The library attaches no handlers of its own: applications
+(or the CLI in main.py) call configure(), or configure the 'qkd' logger themselves.
+
+Keys are never logged in full unless key dumps are enabled (configure(debug_keys=True)
+or QKD_DEBUG_KEYS=1) and the logger is at DEBUG; otherwise log_key only records lengths.
+
+Environment:
+    QKD_LOG_LEVEL: level of all subsystems, optionally followed by per-subsystem
+        overrides, e.g. "WARNING,network=INFO,receiver=DEBUG".
+    QKD_DEBUG_KEYS: "1"/"true" enables key dumps.
+"""
+import logging
+import os
+
+from .PackedKey import PackedKey
+
+ROOT_LOGGER_NAME = 'qkd'
+DEFAULT_FORMAT = '%(message)s'
+
+logging.getLogger(ROOT_LOGGER_NAME).addHandler(logging.NullHandler())
+
+_debug_keys = os.environ.get('QKD_DEBUG_KEYS', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_logger(subsystem):
+    """Logger of a subsystem, e.g. get_logger('network') -> 'qkd.network'."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{subsystem}")
+
+
+def _parse_level(level):
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).strip().upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level '{level}'.")
+    return value
+
+
+def parse_level_spec(spec):
+    """
+    Parses a QKD_LOG_LEVEL style spec ("INFO,network=DEBUG") into (level, {subsystem: level}).
+    The global level is None when the spec only has overrides.
+    """
+    level = None
+    levels = {}
+    for part in filter(None, (part.strip() for part in spec.split(','))):
+        if '=' in part:
+            subsystem, subsystem_level = part.split('=', 1)
+            levels[subsystem.strip()] = _parse_level(subsystem_level)
+        else:
+            level = _parse_level(part)
+    return level, levels
+
+
+def configure(level=None, levels=None, debug_keys=None, stream=None, fmt=DEFAULT_FORMAT, default_level=logging.WARNING):
+    """
+    Sets diagnostic levels and, if the 'qkd' logger has no real handler yet, attaches a stream handler.
+
+    Args:
+        level (int or str, optional): Level of all subsystems (default: QKD_LOG_LEVEL, else default_level).
+        levels (dict, optional): Per-subsystem overrides, e.g. {'network': 'DEBUG'}; merged over QKD_LOG_LEVEL's.
+        debug_keys (bool, optional): Enables full key dumps at DEBUG level.
+        stream (file, optional): Handler stream (default: sys.stderr).
+        fmt (str): Handler format.
+        default_level (int or str): Level when neither level nor QKD_LOG_LEVEL sets one.
+
+    Returns:
+        logging.Logger: The 'qkd' logger.
+    """
+    global _debug_keys
+    env_level, env_levels = parse_level_spec(os.environ.get('QKD_LOG_LEVEL', ''))
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(_parse_level(level if level is not None else env_level if env_level is not None else default_level))
+    for subsystem, subsystem_level in {**env_levels, **(levels or {})}.items():
+        get_logger(subsystem).setLevel(_parse_level(subsystem_level))
+    if debug_keys is not None:
+        _debug_keys = bool(debug_keys)
+    if not any(not isinstance(handler, logging.NullHandler) for handler in root.handlers):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(fmt))
+        root.addHandler(handler)
+    return root
+
+
+def key_dumps_enabled():
+    return _debug_keys
+
+
+def log_key(logger, label, key):
+    """Logs a key at DEBUG: in full when key dumps are enabled, otherwise only its length."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if _debug_keys:
+        logger.debug("%s (%d bits): %s", label, len(key), _KeyDump(key))
+    else:
+        logger.debug("%s: %d bits (set QKD_DEBUG_KEYS=1 to dump)", label, len(key))
+
+
+class _KeyDump:
+    """Formats a key as a 0/1 string only when the record is emitted."""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __str__(self):
+        return (PackedKey.of(self.key).to_bits() + ord('0')).tobytes().decode('ascii')
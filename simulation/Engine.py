@@ -0,0 +1,286 @@
+import numpy as np
+
+from .PackedKey import PackedKey
+from .Sender import BB84_BASES
+
+# Engines a Node can use to run a QKD session:
+# - 'loop': the pulse-by-pulse Sender/Receiver objects (full per-pulse records)
+# - 'vectorized': whole pulse trains as NumPy arrays (sifted keys only)
+# - 'auto': 'vectorized' from VECTORIZED_PULSE_THRESHOLD pulses on, 'loop' below
+ENGINES = ('auto', 'loop', 'vectorized')
+VECTORIZED_PULSE_THRESHOLD = 100_000
+
+
+def validate_engine(engine):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Expected one of {ENGINES}.")
+    return engine
+
+
+def resolve_engine(engine, num_pulses):
+    """Returns the concrete engine ('loop' or 'vectorized') for a session of num_pulses."""
+    validate_engine(engine)
+    if engine == 'auto':
+        return 'vectorized' if num_pulses >= VECTORIZED_PULSE_THRESHOLD else 'loop'
+    return engine
+
+
+# Pulses simulated per array block; bounds memory on long trains whatever num_pulses is.
+STREAM_BLOCK_PULSES = 1 << 21
+
+
+def iter_dps_blocks(sender, receiver, channel, num_pulses, phase_flip_prob=0.0, block_pulses=STREAM_BLOCK_PULSES):
+    """
+    Runs a DPS-QKD session block by block over NumPy arrays, yielding sifted bits as it goes.
+
+    Follows the same model as SenderDPS / OpticalChannel / ReceiverDPS:
+    - the first pulse carries a random phase (0 or π) and no bit
+    - every later pulse carries bit b as a phase shift of b·π on the previous pulse
+    - the channel thins photons binomially and flips a pulse's phase with phase_flip_prob
+    - Bob's MZI only interferes when both pulses of the pair arrive, then the
+      routed detector fires with its quantum efficiency; dark counts on both detectors
+    - sifting keeps every pulse after the first where exactly one detector clicked
+    The last pulse of each block (sent phase, received photons and phase) is carried
+    into the next, so the pair straddling a block boundary interferes as usual.
+    Every draw comes from the random stream of the component that makes it.
+
+    Args:
+        sender (SenderDPS): Alice's sender (light source parameters).
+        receiver (ReceiverDPS): Bob's receiver (MZI and detector parameters).
+        channel (OpticalChannel): Channel between Alice and Bob.
+        num_pulses (int): Number of pulses in the train.
+        phase_flip_prob (float): Probability of a π phase flip per pulse in the channel.
+        block_pulses (int): Pulses simulated per block.
+
+    Yields:
+        tuple: (alice_sifted_bits, bob_sifted_bits) of one block, as PackedKeys.
+    """
+    if block_pulses < 1:
+        raise ValueError(f"block_pulses must be at least 1, got {block_pulses}.")
+    # Alice's phases and the received pulses are kept as multiples of π (0 or 1).
+    # Before the first pulse there is a dummy empty pulse of phase 0.
+    last_sent_phase = 0
+    last_received_photons = 0
+    last_received_phase = 0
+    for start in range(0, max(num_pulses, 0), block_pulses):
+        n = min(block_pulses, num_pulses - start)
+
+        # Alice: each phase step is the bit of its pulse (the very first one is the initial phase).
+        phase_steps = sender.rng.np.integers(0, 2, n, dtype=np.int8)
+        sent_phase = np.bitwise_and(last_sent_phase + np.cumsum(phase_steps, dtype=np.int64), 1).astype(np.int8)
+
+        # Channel: only received photon numbers matter, so lossy Poisson pulses are thinned directly.
+        received_photons = channel.received_photon_counts(n, sender.light_source.mu)
+        phase_flips = channel.rng.np.random(n) < phase_flip_prob
+        received_phase = sent_phase ^ phase_flips.astype(np.int8)
+
+        # Bob: every pulse interferes with the one before it.
+        previous_photons = np.concatenate(([last_received_photons], received_photons[:-1]))
+        previous_phase = np.concatenate(([last_received_phase], received_phase[:-1])).astype(np.int8)
+        interferes = (previous_photons > 0) & (received_photons > 0)
+        prob_dm1, _ = receiver.mzi.interfere_pulse_arrays(previous_phase * np.pi, received_phase * np.pi)
+        routed_to_dm1 = interferes & (receiver.rng.np.random(n) < prob_dm1)
+        routed_to_dm2 = interferes & ~routed_to_dm1
+
+        # The routed detector sees one effective photon (detect(1)); the other is not probed yet.
+        single_photon = np.ones(n, dtype=np.int64)
+        click_dm1 = routed_to_dm1 & receiver.detector_dm1.detect_batch(single_photon)
+        click_dm2 = routed_to_dm2 & receiver.detector_dm2.detect_batch(single_photon)
+        # Independent dark-count check on every detector that has not clicked yet.
+        for detector, clicks in ((receiver.detector_dm1, click_dm1), (receiver.detector_dm2, click_dm2)):
+            clicks |= detector.rng.np.random(n) < detector.prob_dark_count_per_window
+
+        # DM1 alone -> bit 0, DM2 alone -> bit 1, anything else is inconclusive.
+        conclusive = click_dm1 ^ click_dm2
+        if start == 0:
+            conclusive[0] = False  # The first pulse carries no bit
+        yield PackedKey(phase_steps[conclusive]), PackedKey(click_dm2[conclusive])
+
+        last_sent_phase = int(sent_phase[-1])
+        last_received_photons = int(received_photons[-1])
+        last_received_phase = int(received_phase[-1])
+
+
+def run_dps_batch(sender, receiver, channel, num_pulses, phase_flip_prob=0.0, block_pulses=STREAM_BLOCK_PULSES):
+    """
+    Runs a full DPS-QKD session over NumPy arrays instead of per-pulse dicts
+    (the blocks of iter_dps_blocks, concatenated).
+
+    Returns:
+        tuple: (alice_sifted_key, bob_sifted_key) as PackedKeys.
+    """
+    blocks = list(iter_dps_blocks(sender, receiver, channel, num_pulses, phase_flip_prob, block_pulses))
+    return PackedKey.concat(a for a, _ in blocks), PackedKey.concat(b for _, b in blocks)
+
+
+# Pairs processed per array block in the COW engine (one STREAM_BLOCK_PULSES block of slots).
+COW_BLOCK_PAIRS = STREAM_BLOCK_PULSES // 2
+
+
+def iter_cow_blocks(sender, receiver, channel, num_pulses, phase_flip_prob=0.0, bit_flip_error_prob=0.0,
+                    block_pairs=COW_BLOCK_PAIRS):
+    """
+    Runs a COW-QKD session block by block over NumPy arrays, yielding sifted bits as it goes.
+
+    Follows the same model as SenderCOW / OpticalChannel / ReceiverCOW and the
+    sifting and monitoring walk in Node.generate_and_share_key_cow:
+    - each pair is a monitor pair (on, on) with probability monitor_pulse_ratio,
+      otherwise a data pair encoding bit 0 as (off, on) and bit 1 as (on, off)
+    - on/off intensities come from the sender's IntensityModulator
+    - data pairs with exactly one click are sifted; the announced click position
+      (first -> 1, second -> 0) becomes the bit on both sides, then each of Bob's
+      bits is flipped with bit_flip_error_prob
+    - a monitor pair succeeds when both pulses click with matching phases
+    Blocks hold whole pairs, so no pair straddles a block boundary. Every draw comes
+    from the random stream of the component that makes it.
+
+    Args:
+        sender (SenderCOW): Alice's sender (mu, monitor ratio, intensity modulator).
+        receiver (ReceiverCOW): Bob's receiver (data detector parameters).
+        channel (OpticalChannel): Channel between Alice and Bob.
+        num_pulses (int): Number of pulse slots; the last one is unused if odd.
+        phase_flip_prob (float): Probability of a π phase flip per pulse in the channel.
+        bit_flip_error_prob (float): Probability of flipping each of Bob's sifted bits.
+        block_pairs (int): Pairs simulated per block.
+
+    Yields:
+        tuple: (alice_sifted_bits, bob_sifted_bits, stats) of one block, the bits as
+        PackedKeys and stats holding 'attempted_data_bits', 'successful_monitor_pairs'
+        and 'attempted_monitor_pairs'.
+    """
+    if block_pairs < 1:
+        raise ValueError(f"block_pairs must be at least 1, got {block_pairs}.")
+    detector = receiver.data_detector
+    mu = sender.mu
+    num_pairs = max(num_pulses, 0) // 2
+    for start in range(0, num_pairs, block_pairs):
+        m = min(block_pairs, num_pairs - start)
+
+        # Alice: pair types, bits and per-pulse intensities.
+        is_monitor = sender.rng.np.random(m) < sender.monitor_pulse_ratio
+        bits = sender.rng.np.integers(0, 2, m, dtype=np.int8)
+        first_on = is_monitor | (bits == 1)
+        second_on = is_monitor | (bits == 0)
+        mu_first = sender.intensity_modulator.modulate_states(mu, first_on)
+        mu_second = sender.intensity_modulator.modulate_states(mu, second_on)
+
+        # Channel and Bob's detector, one column per pulse of the pair.
+        received_first = channel.received_photon_counts(m, mu_first)
+        received_second = channel.received_photon_counts(m, mu_second)
+        click_first = detector.detect_batch(received_first)
+        click_second = detector.detect_batch(received_second)
+        flip_first = channel.rng.np.random(m) < phase_flip_prob
+        flip_second = channel.rng.np.random(m) < phase_flip_prob
+
+        is_data = ~is_monitor
+        sifted = is_data & (click_first != click_second)
+        alice_bits = click_first[sifted]
+        bit_flips = channel.rng.np.random(alice_bits.size) < (bit_flip_error_prob or 0.0)
+
+        stats = {
+            'attempted_data_bits': int(np.count_nonzero(is_data)),
+            'successful_monitor_pairs': int(np.count_nonzero(
+                is_monitor & click_first & click_second & (flip_first == flip_second)
+            )),
+            'attempted_monitor_pairs': int(np.count_nonzero(is_monitor)),
+        }
+        yield PackedKey(alice_bits), PackedKey(alice_bits ^ bit_flips), stats
+
+
+def run_cow_batch(sender, receiver, channel, num_pulses, phase_flip_prob=0.0, bit_flip_error_prob=0.0,
+                  block_pairs=COW_BLOCK_PAIRS):
+    """
+    Runs a full COW-QKD session over NumPy arrays instead of per-pulse dicts
+    (the blocks of iter_cow_blocks, concatenated and with their stats summed).
+
+    Returns:
+        tuple: (alice_sifted_key, bob_sifted_key, stats) where the keys are
+        PackedKeys and stats holds 'attempted_data_bits', 'successful_monitor_pairs'
+        and 'attempted_monitor_pairs'.
+    """
+    stats = {'attempted_data_bits': 0, 'successful_monitor_pairs': 0, 'attempted_monitor_pairs': 0}
+    alice_blocks, bob_blocks = [], []
+    for alice_bits, bob_bits, block_stats in iter_cow_blocks(sender, receiver, channel, num_pulses,
+                                                             phase_flip_prob, bit_flip_error_prob, block_pairs):
+        alice_blocks.append(alice_bits)
+        bob_blocks.append(bob_bits)
+        for name, count in block_stats.items():
+            stats[name] += count
+    return PackedKey.concat(alice_blocks), PackedKey.concat(bob_blocks), stats
+
+
+def iter_bb84_blocks(sender, receiver, channel, num_pulses, phase_flip_prob=0.0, block_pulses=STREAM_BLOCK_PULSES):
+    """
+    Runs a BB84 session block by block on integer-coded arrays, yielding sifted bits as it goes.
+
+    Bits are 0/1 and bases are indices into BB84_BASES (0 = 'R', 1 = 'D'), so the
+    encoded state is 2 * basis + bit. Follows SenderBB84 / OpticalChannel / ReceiverBB84:
+    - a channel phase flip toggles the bit of the state within its basis
+    - on a click in the matching basis Bob reads the state bit, flipped with the
+      receiver's misalignment error; in the other basis he gets a random bit
+    - sifting keeps clicks where Alice's and Bob's bases agree
+    Pulses are independent, so blocks carry no state. Every draw comes from the
+    random stream of the component that makes it.
+
+    Args:
+        sender (SenderBB84): Alice's sender (light source parameters).
+        receiver (ReceiverBB84): Bob's receiver (detector, misalignment error).
+        channel (OpticalChannel): Channel between Alice and Bob.
+        num_pulses (int): Number of pulses in the train.
+        phase_flip_prob (float): Probability of a phase flip per pulse in the channel.
+        block_pulses (int): Pulses simulated per block.
+
+    Yields:
+        tuple: (alice_sifted_bits, bob_sifted_bits, stats) of one block, the bits as
+        PackedKeys and stats holding 'basis_matches', 'matching_basis_clicks' and the
+        block's first ten bases of each side as 'R'/'D' letters.
+    """
+    if block_pulses < 1:
+        raise ValueError(f"block_pulses must be at least 1, got {block_pulses}.")
+    for start in range(0, max(num_pulses, 0), block_pulses):
+        n = min(block_pulses, num_pulses - start)
+
+        alice_bits = sender.rng.np.integers(0, 2, n, dtype=np.int8)
+        alice_bases = sender.rng.np.integers(0, 2, n, dtype=np.int8)
+        received_photons = channel.received_photon_counts(n, sender.light_source.mu)
+        state_bits = alice_bits ^ (channel.rng.np.random(n) < phase_flip_prob).astype(np.int8)
+
+        bob_bases = receiver.rng.np.integers(0, 2, n, dtype=np.int8)
+        clicks = receiver.detector.detect_batch(received_photons)
+        same_basis = alice_bases == bob_bases
+        misaligned = (receiver.rng.np.random(n) < receiver.misalignment_error).astype(np.int8)
+        random_bits = receiver.rng.np.integers(0, 2, n, dtype=np.int8)
+        measured_bits = np.where(same_basis, state_bits ^ misaligned, random_bits)
+
+        sifted = same_basis & clicks
+        stats = {
+            'basis_matches': int(np.count_nonzero(same_basis)),
+            'matching_basis_clicks': int(np.count_nonzero(sifted)),
+            'alice_bases_preview': [BB84_BASES[b] for b in alice_bases[:10]],
+            'bob_bases_preview': [BB84_BASES[b] for b in bob_bases[:10]],
+        }
+        yield PackedKey(alice_bits[sifted]), PackedKey(measured_bits[sifted]), stats
+
+
+def run_bb84_batch(sender, receiver, channel, num_pulses, phase_flip_prob=0.0, block_pulses=STREAM_BLOCK_PULSES):
+    """
+    Runs a full BB84 session on integer-coded arrays instead of state strings
+    (the blocks of iter_bb84_blocks, concatenated and with their counts summed).
+
+    Returns:
+        tuple: (alice_sifted_key, bob_sifted_key, stats) where the keys are
+        PackedKeys and stats holds 'basis_matches', 'matching_basis_clicks' and the first
+        ten bases of each side as 'R'/'D' letters.
+    """
+    stats = {'basis_matches': 0, 'matching_basis_clicks': 0, 'alice_bases_preview': [], 'bob_bases_preview': []}
+    alice_blocks, bob_blocks = [], []
+    for alice_bits, bob_bits, block_stats in iter_bb84_blocks(sender, receiver, channel, num_pulses,
+                                                              phase_flip_prob, block_pulses):
+        alice_blocks.append(alice_bits)
+        bob_blocks.append(bob_bits)
+        stats['basis_matches'] += block_stats['basis_matches']
+        stats['matching_basis_clicks'] += block_stats['matching_basis_clicks']
+        if not stats['alice_bases_preview']:
+            stats['alice_bases_preview'] = block_stats['alice_bases_preview']
+            stats['bob_bases_preview'] = block_stats['bob_bases_preview']
+    return PackedKey.concat(alice_blocks), PackedKey.concat(bob_blocks), stats
@@ -0,0 +1,293 @@
+"""
+Discrete-event simulation of a Network generating and consuming key over simulated time.
+
+Events sit in a heap ordered by simulated time (seconds):
+- 'block': a link has run another block_s of pulses and adds its key to its buffer
+- 'request': an application asks for num_bits of end-to-end key between two nodes
+- 'forward': a request's one-time-padded key reaches the next node of its route
+- 'sample': the buffer level of every link is recorded
+A request is routed with Network.find_route, waits until every link of its route holds
+num_bits, then debits them all at once (both ends of a link spend the same pad bits) and
+travels hop by hop with the fiber delay of each link plus relay_processing_s per relay.
+Buffers track key bit counts only; the key material itself is what Network's relay chains
+and key pools handle.
+"""
+import heapq
+import itertools
+
+import numpy as np
+
+from .Diagnostics import get_logger
+from .Network import RELAY_SESSION_METHODS
+from .Routing import expected_link_key_rate, validate_metric
+
+logger = get_logger('events')
+
+EVENT_KEY_MODELS = ('analytic', 'monte_carlo')
+
+# Light travels through fiber at about 2e5 km/s
+FIBER_DELAY_S_PER_KM = 5e-6
+
+
+class LinkBuffer:
+    """Key bits buffered on a link, with its time-weighted level since the start of the run."""
+    def __init__(self, link, capacity_bits=None):
+        self.link = link
+        self.capacity_bits = capacity_bits
+        self.level = 0
+        self.generated_bits = 0
+        self.consumed_bits = 0
+        self.overflow_bits = 0
+        self.max_level = 0
+        self._level_integral = 0.0
+        self._last_time = 0.0
+
+    def _advance(self, now):
+        self._level_integral += self.level * (now - self._last_time)
+        self._last_time = now
+
+    def add(self, now, num_bits):
+        self._advance(now)
+        self.generated_bits += num_bits
+        kept = num_bits if self.capacity_bits is None else min(num_bits, self.capacity_bits - self.level)
+        self.overflow_bits += num_bits - kept
+        self.level += kept
+        self.max_level = max(self.max_level, self.level)
+
+    def take(self, now, num_bits):
+        self._advance(now)
+        self.level -= num_bits
+        self.consumed_bits += num_bits
+
+    def stats(self, now):
+        self._advance(now)
+        return {
+            'level_bits': self.level,
+            'mean_level_bits': self._level_integral / now if now > 0 else float(self.level),
+            'max_level_bits': self.max_level,
+            'generated_bits': self.generated_bits,
+            'consumed_bits': self.consumed_bits,
+            'overflow_bits': self.overflow_bits,
+        }
+
+
+class NetworkEventSimulator:
+    """
+    Continuous key generation on every link of network, key requests and their relay forwarding.
+    - each link runs pulses at pulse_repetition_rate_ns and adds a block of key every block_s;
+      key_model 'analytic' draws the block's key length from the link's expected secure key
+      rate (Routing.expected_link_key_rate), 'monte_carlo' runs the protocol session of
+      block_s worth of pulses on the link's nodes (which also deposits into their key pools)
+    - buffer_capacity_bits caps each link buffer; key generated into a full buffer is lost,
+      and requests for more bits than the cap are rejected as they could never be served
+    - routes use metric (see Network.find_route); a request with no route is dropped
+    - sample_interval_s sets how often buffer levels are appended to buffer_log
+    Links are taken from the network when the simulator is created, the first node of each
+    (by node_id) acting as Alice.
+    """
+    def __init__(self, network, protocol='dps', pulse_repetition_rate_ns=1, block_s=0.1, key_model='analytic',
+                 buffer_capacity_bits=None, metric='key_rate', relay_processing_s=0.0, sample_interval_s=None,
+                 **session_params):
+        if protocol not in RELAY_SESSION_METHODS:
+            raise ValueError(f"Unknown protocol '{protocol}'. Expected one of {tuple(RELAY_SESSION_METHODS)}.")
+        if key_model not in EVENT_KEY_MODELS:
+            raise ValueError(f"Unknown key model '{key_model}'. Expected one of {EVENT_KEY_MODELS}.")
+        if block_s <= 0 or pulse_repetition_rate_ns <= 0:
+            raise ValueError("block_s and pulse_repetition_rate_ns must be positive.")
+        self.network = network
+        self.protocol = protocol
+        self.pulse_repetition_rate_ns = pulse_repetition_rate_ns
+        self.block_s = block_s
+        self.block_pulses = int(round(block_s * 1e9 / pulse_repetition_rate_ns))
+        self.key_model = key_model
+        self.metric = validate_metric(metric)
+        self.buffer_capacity_bits = buffer_capacity_bits
+        self.relay_processing_s = relay_processing_s
+        self.sample_interval_s = sample_interval_s
+        self.session_params = session_params
+        self.rng = network.rng.child('event_simulator')
+
+        self.buffers = {}
+        self._link_rates = {}
+        for node_id, node in network.nodes.items():
+            for neighbor_id, channel in node.connected_links.items():
+                link = tuple(sorted((node_id, neighbor_id)))
+                if link in self.buffers:
+                    continue
+                self.buffers[link] = LinkBuffer(link, buffer_capacity_bits)
+                self._link_rates[link] = expected_link_key_rate(network.nodes[link[0]], network.nodes[link[1]],
+                                                                channel, protocol)
+
+        self.now = 0.0
+        self.events_processed = 0
+        self._queue = []
+        self._sequence = itertools.count()  # Breaks time ties in scheduling order
+        self._request_ids = itertools.count()
+        self._source_ids = itertools.count()  # Names each Poisson source's stream
+        # One stream per link for its block key lengths, so they do not depend on event order
+        self._block_streams = {link: self.rng.child('block', *link).np for link in self.buffers}
+        self._route_links = {}  # Links of each routed request's route, by request id
+        self.pending = []  # Requests waiting for key, in arrival order
+        self.requests = []
+        self.buffer_log = []
+
+        for link in self.buffers:
+            self._schedule(self.block_s, 'block', link)
+        if sample_interval_s:
+            self._schedule(0.0, 'sample', None)
+
+    def _schedule(self, time_s, kind, payload):
+        heapq.heappush(self._queue, (time_s, next(self._sequence), kind, payload))
+
+    def add_request(self, time_s, sender_id, receiver_id, num_bits):
+        """Schedules a request for num_bits of end-to-end key at simulated time time_s."""
+        for node_id in (sender_id, receiver_id):
+            if node_id not in self.network.nodes:
+                raise ValueError(f"Node {node_id} does not exist in the network.")
+        if num_bits <= 0:
+            raise ValueError(f"A request must ask for a positive number of bits, got {num_bits}.")
+        if self.buffer_capacity_bits is not None and num_bits > self.buffer_capacity_bits:
+            raise ValueError(f"A request for {num_bits} bits can never be served by link buffers "
+                             f"of {self.buffer_capacity_bits} bits.")
+        request = {
+            'id': next(self._request_ids),
+            'sender': sender_id,
+            'receiver': receiver_id,
+            'num_bits': num_bits,
+            'arrival_s': time_s,
+            'route': None,
+            'served_s': None,
+            'delivered_s': None,
+            'latency_s': None,
+        }
+        self.requests.append(request)
+        self._schedule(time_s, 'request', request)
+        return request
+
+    def add_poisson_requests(self, sender_id, receiver_id, rate_hz, num_bits, start_s=0.0, stop_s=None):
+        """
+        Requests arriving as a Poisson process of rate_hz between start_s and stop_s
+        (until the end of the run if None). Arrivals are drawn one at a time as the run reaches them.
+        """
+        if rate_hz <= 0:
+            raise ValueError(f"Request rate must be positive, got {rate_hz}.")
+        if num_bits <= 0 or (self.buffer_capacity_bits is not None and num_bits > self.buffer_capacity_bits):
+            raise ValueError(f"Requests of {num_bits} bits cannot be served.")
+        stream = self.rng.child('requests', sender_id, receiver_id, next(self._source_ids)).np
+        self._schedule_arrival(start_s + stream.exponential(1 / rate_hz),
+                               (sender_id, receiver_id, rate_hz, num_bits, stop_s, stream))
+
+    def _schedule_arrival(self, time_s, source):
+        stop_s = source[4]
+        if stop_s is None or time_s <= stop_s:
+            self._schedule(time_s, 'arrival', source)
+
+    def _block_bits(self, link):
+        if self.key_model == 'analytic':
+            return int(self._block_streams[link].binomial(self.block_pulses, self._link_rates[link]))
+        node1, node2 = (self.network.nodes[node_id] for node_id in link)
+        alice_key, _ = getattr(node1, RELAY_SESSION_METHODS[self.protocol])(
+            node2, self.block_pulses, self.pulse_repetition_rate_ns, **self.session_params)
+        return len(alice_key) if alice_key is not None else 0
+
+    def _serve_pending(self, refilled_link=None):
+        """
+        Serves waiting requests whose route holds enough key, in arrival order (first fit).
+        After a block only the requests routed over the refilled link can have become servable.
+        """
+        waiting = []
+        for request in self.pending:
+            links = self._route_links[request['id']]
+            if (refilled_link is None or refilled_link in links) and \
+                    all(self.buffers[link].level >= request['num_bits'] for link in links):
+                for link in links:
+                    self.buffers[link].take(self.now, request['num_bits'])
+                del self._route_links[request['id']]
+                request['served_s'] = self.now
+                self._forward(request, 0)
+            else:
+                waiting.append(request)
+        self.pending = waiting
+
+    def _forward(self, request, hop):
+        # The key leaves route[hop] for route[hop + 1]; relays spend relay_processing_s on it
+        route = request['route']
+        channel = self.network.nodes[route[hop]].connected_links[route[hop + 1]]
+        delay = channel.distance_km * FIBER_DELAY_S_PER_KM + (self.relay_processing_s if hop > 0 else 0.0)
+        self._schedule(self.now + delay, 'forward', (request, hop + 1))
+
+    def _handle(self, kind, payload):
+        if kind == 'block':
+            self.buffers[payload].add(self.now, self._block_bits(payload))
+            self._schedule(self.now + self.block_s, 'block', payload)
+            self._serve_pending(payload)
+        elif kind == 'request':
+            route = self.network.find_route(payload['sender'], payload['receiver'], self.metric, self.protocol)
+            if route is None or len(route) < 2:
+                logger.warning("No route from %s to %s; request %d dropped.",
+                               payload['sender'], payload['receiver'], payload['id'])
+                return
+            payload['route'] = route
+            self._route_links[payload['id']] = {tuple(sorted(hop)) for hop in zip(route, route[1:])}
+            self.pending.append(payload)
+            self._serve_pending()
+        elif kind == 'arrival':
+            sender_id, receiver_id, rate_hz, num_bits, _, stream = payload
+            self.add_request(self.now, sender_id, receiver_id, num_bits)
+            self._schedule_arrival(self.now + stream.exponential(1 / rate_hz), payload)
+        elif kind == 'forward':
+            request, hop = payload
+            if hop == len(request['route']) - 1:
+                request['delivered_s'] = self.now
+                request['latency_s'] = self.now - request['arrival_s']
+            else:
+                self._forward(request, hop)
+        elif kind == 'sample':
+            self.buffer_log.append((self.now, {link: buffer.level for link, buffer in self.buffers.items()}))
+            self._schedule(self.now + self.sample_interval_s, 'sample', None)
+
+    def run(self, until_s):
+        """Processes every event up to simulated time until_s and returns report()."""
+        while self._queue and self._queue[0][0] <= until_s:
+            self.now, _, kind, payload = heapq.heappop(self._queue)
+            self._handle(kind, payload)
+            self.events_processed += 1
+        self.now = max(self.now, until_s)
+        logger.info("Simulated %.3f s of %s key traffic: %d events, %d requests delivered, %d waiting.",
+                    self.now, self.protocol.upper(), self.events_processed,
+                    sum(request['delivered_s'] is not None for request in self.requests), len(self.pending))
+        return self.report()
+
+    def report(self):
+        """
+        Returns:
+            dict: 'simulated_s', 'events', 'links' (LinkBuffer.stats per link, plus its
+            expected key rate in bits per second) and 'requests': counts of submitted,
+            delivered, waiting, in flight and unroutable requests, delivered bits and the mean, median,
+            95th percentile and maximum latency of delivered requests (None if there are none).
+        """
+        links = {}
+        for link, buffer in self.buffers.items():
+            links[link] = dict(buffer.stats(self.now),
+                               expected_rate_bps=self._link_rates[link] * 1e9 / self.pulse_repetition_rate_ns)
+        arrived = [request for request in self.requests if request['arrival_s'] <= self.now]
+        delivered = [request for request in arrived if request['delivered_s'] is not None]
+        latencies = np.array([request['latency_s'] for request in delivered])
+        return {
+            'simulated_s': self.now,
+            'events': self.events_processed,
+            'links': links,
+            'requests': {
+                'submitted': len(arrived),
+                'delivered': len(delivered),
+                'waiting': len(self.pending),
+                'in_flight': sum(request['served_s'] is not None and request['delivered_s'] is None
+                                 for request in arrived),
+                'unroutable': sum(request['route'] is None for request in arrived),
+                'delivered_bits': sum(request['num_bits'] for request in delivered),
+                'latency_mean_s': float(latencies.mean()) if latencies.size else None,
+                'latency_p50_s': float(np.percentile(latencies, 50)) if latencies.size else None,
+                'latency_p95_s': float(np.percentile(latencies, 95)) if latencies.size else None,
+                'latency_max_s': float(latencies.max()) if latencies.size else None,
+            },
+        }
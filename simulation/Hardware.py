@@ -1,11 +1,13 @@
-import random
 import math
+import numpy as np
+from .RandomStreams import RandomStream
 
 class LightSource:
-    def __init__(self, average_photon_number=0.2):
+    def __init__(self, average_photon_number=0.2, rng=None):
         if not (0 < average_photon_number < 1):
             raise ValueError("Average photon number (mu) for WCP should be between 0 and 1.")
         self.mu = average_photon_number 
+        self.rng = rng or RandomStream()
     def generate_single_pulse_photon_count(self, mu=None):
         if mu is None:
             mu = self.mu
@@ -15,9 +17,18 @@ class LightSource:
         k = 0
         while p > L:
             k += 1
-            p *= random.random()
+            p *= self.rng.py.random()
         num_photons = k - 1
         return num_photons
+    def generate_photon_counts(self, n, mu=None, rng=None):
+        """
+        Photon numbers for n pulses in one Poisson draw.
+        mu may be a scalar or an array of n per-pulse mean photon numbers.
+        """
+        if mu is None:
+            mu = self.mu
+        rng = self.rng.np if rng is None else rng
+        return rng.poisson(mu, n)
     def get_initial_phase(self):
         return 0.0
 
@@ -43,19 +54,45 @@ class IntensityModulator:
         else:
             raise ValueError("Modulator state must be 'on' or 'off'")
 
+    def modulate_states(self, base_mu, on_mask):
+        """
+        Array version of modulate: base_mu where on_mask is True ('on'),
+        the extinction-limited value where it is False ('off').
+        """
+        return np.where(on_mask, base_mu, base_mu / self.extinction_ratio_linear)
+
 class OpticalChannel:
-    def __init__(self, distance_km, attenuation_db_per_km=0.2):
+    def __init__(self, distance_km, attenuation_db_per_km=0.2, rng=None):
         self.distance_km = distance_km
         self.attenuation_db_per_km = attenuation_db_per_km
         self.survival_probability = 10**(-(self.distance_km * self.attenuation_db_per_km) / 10)
+        # Channel noise (loss, phase flips, bit flips) is drawn from the channel's own stream
+        self.rng = rng or RandomStream()
 
     def transmit_pulse(self, photon_count):
         received_photons = 0
         for _ in range(photon_count):
-            if random.random() < self.survival_probability:
+            if self.rng.py.random() < self.survival_probability:
                 received_photons += 1
         return received_photons
 
+    def transmit_counts(self, photon_counts, rng=None):
+        """
+        Array version of transmit_pulse: each photon survives independently,
+        so the received count of every pulse is one binomial draw.
+        """
+        rng = self.rng.np if rng is None else rng
+        return rng.binomial(photon_counts, self.survival_probability)
+
+    def received_photon_counts(self, n, mu, rng=None):
+        """
+        Received photon numbers for n Poissonian pulses of mean mu (scalar or array of n),
+        without drawing the sent counts: binomial loss of a Poisson(mu) pulse is
+        Poisson(mu * survival_probability).
+        """
+        rng = self.rng.np if rng is None else rng
+        return rng.poisson(np.asarray(mu) * self.survival_probability, n)
+
 class MachZehnderInterferometer:
    
     def __init__(self, ideal_split_ratio=0.5):
@@ -81,15 +118,27 @@ class MachZehnderInterferometer:
         
         return prob_dm1, prob_dm2
 
+    def interfere_pulse_arrays(self, phases_n_minus_1, phases_n):
+        """
+        Array version of interfere_pulses: detection probabilities at DM1 and DM2
+        for each (previous, current) pulse pair.
+        """
+        delta_phi = np.mod(np.asarray(phases_n) - np.asarray(phases_n_minus_1), 2 * math.pi)
+        delta_phi = np.where(delta_phi > math.pi, delta_phi - 2 * math.pi, delta_phi)
+        prob_dm1 = np.cos(delta_phi / 2)**2
+        prob_dm2 = np.sin(delta_phi / 2)**2
+        return prob_dm1, prob_dm2
+
 class SinglePhotonDetector:
     """
     Models a single-photon detector (SPD or SNSPD).
     Accounts for quantum efficiency and dark counts.
     """
-    def __init__(self, quantum_efficiency=0.9, dark_count_rate_per_ns=1e-7, time_window_ns=1):
+    def __init__(self, quantum_efficiency=0.9, dark_count_rate_per_ns=1e-7, time_window_ns=1, rng=None):
         self.quantum_efficiency = quantum_efficiency 
         self.dark_count_rate = dark_count_rate_per_ns
         self.time_window = time_window_ns 
+        self.rng = rng or RandomStream()
         
         # Probability of a dark count occurring within a given time window
         self.prob_dark_count_per_window = self.dark_count_rate * self.time_window
@@ -105,16 +154,27 @@ class SinglePhotonDetector:
         if incident_photons > 0:
             # Probability that at least one photon is detected given multiple incident photons
             prob_actual_detection = 1 - (1 - self.quantum_efficiency)**incident_photons
-            if random.random() < prob_actual_detection:
+            if self.rng.py.random() < prob_actual_detection:
                 click = True
         
         # If no real photon caused a click, check for a dark count
         if not click: 
-             if random.random() < self.prob_dark_count_per_window:
+             if self.rng.py.random() < self.prob_dark_count_per_window:
                  click = True
                  
         return click 
 
+    def detect_batch(self, incident_photons, rng=None):
+        """
+        Array version of detect: one click decision per entry of incident_photons.
+        """
+        rng = self.rng.np if rng is None else rng
+        incident_photons = np.asarray(incident_photons)
+        prob_actual_detection = 1 - (1 - self.quantum_efficiency)**incident_photons
+        clicks = rng.random(incident_photons.shape) < prob_actual_detection
+        clicks |= rng.random(incident_photons.shape) < self.prob_dark_count_per_window
+        return clicks
+
 #writing code for Fiber selction from ui , and provided definit params
 class SMF:
     def __init__(
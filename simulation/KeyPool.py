@@ -0,0 +1,303 @@
+"""
+Per-link key pools of a node.
+
+Every QKD session deposits its key into the pools of both nodes of the link; trusted
+relaying and other consumers debit bits from them. Both ends of a link deposit and
+consume the same amounts in the same order, so their pools stay aligned bit for bit.
+
+KeyPool keeps its bits in memory; MappedKeyPool keeps them in a memory-mapped file, so
+pools can grow to gigabits without growing the heap and survive a restart. A KeyPoolStore
+hands out one MappedKeyPool file per (node, partner, protocol) under a directory, and
+counts the sessions of its nodes across runs so a restarted network never replays them.
+"""
+import json
+import os
+import threading
+from collections import deque
+from urllib.parse import quote
+
+import numpy as np
+
+from .PackedKey import PackedKey
+
+# Default cap of an in-memory KeyPool: 128 Mbit (16 MB packed)
+DEFAULT_KEY_POOL_CAPACITY_BITS = 1 << 27
+
+# MappedKeyPool file layout: a header of little-endian uint64 fields, then the packed bits
+# (MSB first, as PackedKey) of every deposit, the first base_bits of them compacted away.
+POOL_FILE_MAGIC = b'QKDPOOL1'
+_HEADER_FIELDS = ('deposited_bits', 'consumed_bits', 'base_bits')
+_HEADER_BYTES = 64
+# Files grow by doubling, at least this many bytes at a time
+_MIN_GROWTH_BYTES = 1 << 20
+# KeyPoolStore file of the session counts of every node, by stream and partner
+SESSION_COUNTS_FILE = 'sessions.json'
+
+
+class KeyPool:
+    """
+    First-in first-out store of key bits shared with one partner over one protocol.
+    Tracks how many bits were deposited and consumed over its lifetime.
+    Deposits are kept as a queue of chunks, so depositing never copies the pool.
+    capacity_bits caps the bits the pool holds (None: no cap); the part of a deposit that
+    does not fit is dropped and counted in overflow_bits. Both ends of a link overflow alike.
+    """
+    def __init__(self, capacity_bits=None):
+        self.capacity_bits = capacity_bits
+        self._chunks = deque()
+        self._offset = 0  # Bits of the first chunk already consumed
+        self._available = 0
+        self.deposited_bits = 0
+        self.consumed_bits = 0
+        self.overflow_bits = 0
+
+    def __len__(self):
+        return self._available
+
+    @property
+    def available_bits(self):
+        return len(self)
+
+    def deposit(self, key):
+        """Appends a session key to the pool, up to its capacity."""
+        key = PackedKey.of(key)
+        if self.capacity_bits is not None and len(key) > self.capacity_bits - self._available:
+            kept = max(0, self.capacity_bits - self._available)
+            self.overflow_bits += len(key) - kept
+            key = key[:kept]
+        if len(key):
+            self._chunks.append(key)
+            self._available += len(key)
+            self.deposited_bits += len(key)
+
+    def consume(self, num_bits):
+        """Removes and returns the oldest num_bits bits; raises ValueError if the pool holds fewer."""
+        if num_bits < 0:
+            raise ValueError(f"Cannot consume a negative number of bits ({num_bits}).")
+        if num_bits > len(self):
+            raise ValueError(f"Key pool holds {len(self)} bits, {num_bits} requested.")
+        pieces = []
+        remaining = num_bits
+        while remaining:
+            head = self._chunks[0]
+            taken = min(remaining, len(head) - self._offset)
+            pieces.append(head[self._offset:self._offset + taken])
+            self._offset += taken
+            remaining -= taken
+            if self._offset == len(head):
+                self._chunks.popleft()
+                self._offset = 0
+        self._available -= num_bits
+        self.consumed_bits += num_bits
+        return pieces[0] if len(pieces) == 1 else PackedKey.concat(pieces)
+
+    def stats(self):
+        return {
+            'available_bits': len(self),
+            'deposited_bits': self.deposited_bits,
+            'consumed_bits': self.consumed_bits,
+            'overflow_bits': self.overflow_bits,
+        }
+
+    def __repr__(self):
+        return f"KeyPool(available_bits={len(self)}, deposited_bits={self.deposited_bits}, consumed_bits={self.consumed_bits})"
+
+
+class MappedKeyPool:
+    """
+    KeyPool whose bits live in a memory-mapped file at path (created if missing).
+    - deposits append packed bits at the end of the file, which grows by doubling
+    - consuming only advances the consumed offset stored in the header: bits are never moved,
+      and read() returns any bits still in the file by their lifetime offset
+    - the header is updated in the mapping with every call, so reopening the file resumes
+      the pool exactly where it was, without replaying sessions
+    - compact() drops the consumed bytes from the front of the file
+    """
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, 'wb') as f:
+                f.write(POOL_FILE_MAGIC.ljust(_HEADER_BYTES, b'\0'))
+        with open(self.path, 'rb') as f:
+            if f.read(len(POOL_FILE_MAGIC)) != POOL_FILE_MAGIC:
+                raise ValueError(f"{self.path} is not a key pool file.")
+        self._map = None
+        self._remap(os.path.getsize(self.path))
+        if not self.base_bits <= self.consumed_bits <= self.deposited_bits or \
+                _HEADER_BYTES + (self.deposited_bits - self.base_bits + 7) // 8 > self._map.size:
+            message = (f"{self.path} has a corrupt header: deposited {self.deposited_bits}, consumed "
+                       f"{self.consumed_bits} and base {self.base_bits} bits in a file of {self._map.size} bytes.")
+            self.close()
+            raise ValueError(message)
+
+    def _remap(self, size):
+        if self._map is not None:
+            self._map.flush()
+        if os.path.getsize(self.path) < size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(size)
+        self._map = np.memmap(self.path, dtype=np.uint8, mode='r+', shape=(size,))
+        self._header = self._map[len(POOL_FILE_MAGIC):len(POOL_FILE_MAGIC) + 8 * len(_HEADER_FIELDS)].view('<u8')
+
+    def _field(self, name):
+        return int(self._header[_HEADER_FIELDS.index(name)])
+
+    def _set_field(self, name, value):
+        self._header[_HEADER_FIELDS.index(name)] = value
+
+    @property
+    def deposited_bits(self):
+        return self._field('deposited_bits')
+
+    @property
+    def consumed_bits(self):
+        return self._field('consumed_bits')
+
+    @property
+    def base_bits(self):
+        """Lifetime offset of the first bit still in the file."""
+        return self._field('base_bits')
+
+    def __len__(self):
+        return self.deposited_bits - self.consumed_bits
+
+    @property
+    def available_bits(self):
+        return len(self)
+
+    def _read(self, offset, num_bits):
+        # Bits [offset, offset + num_bits) of the pool's lifetime; offset - base_bits is in the file
+        start = offset - self.base_bits
+        first = _HEADER_BYTES + start // 8
+        data = self._map[first:_HEADER_BYTES + (start + num_bits + 7) // 8]
+        key = PackedKey.from_bytes(data, start % 8 + num_bits)
+        return key[start % 8:] if start % 8 else key
+
+    def deposit(self, key):
+        """Appends a session key to the pool."""
+        key = PackedKey.of(key)
+        if not key:
+            return
+        end = self.deposited_bits - self.base_bits
+        partial = end % 8
+        if partial:
+            # Re-pack the bits of the last, partly filled byte in front of the new ones
+            key_bytes = PackedKey.concat((self._read(self.deposited_bits - partial, partial), key)).tobytes()
+        else:
+            key_bytes = key.tobytes()
+        first = _HEADER_BYTES + end // 8
+        if first + len(key_bytes) > self._map.size:
+            self._remap(max(first + len(key_bytes), 2 * self._map.size, _MIN_GROWTH_BYTES))
+        self._map[first:first + len(key_bytes)] = np.frombuffer(key_bytes, dtype=np.uint8)
+        self._set_field('deposited_bits', self.deposited_bits + len(key))
+
+    def consume(self, num_bits):
+        """Removes and returns the oldest num_bits bits; raises ValueError if the pool holds fewer."""
+        if num_bits < 0:
+            raise ValueError(f"Cannot consume a negative number of bits ({num_bits}).")
+        if num_bits > len(self):
+            raise ValueError(f"Key pool holds {len(self)} bits, {num_bits} requested.")
+        key = self._read(self.consumed_bits, num_bits)
+        self._set_field('consumed_bits', self.consumed_bits + num_bits)
+        return key
+
+    def read(self, offset, num_bits):
+        """The num_bits bits at lifetime offset (consumed or not), without consuming them."""
+        if num_bits < 0 or offset < self.base_bits or offset + num_bits > self.deposited_bits:
+            raise ValueError(f"Bits [{offset}, {offset + num_bits}) are not in the pool file "
+                             f"(it holds [{self.base_bits}, {self.deposited_bits})).")
+        return self._read(offset, num_bits)
+
+    def compact(self):
+        """Drops the whole consumed bytes from the front of the file and shrinks it."""
+        drop = (self.consumed_bits - self.base_bits) // 8
+        if drop == 0:
+            return
+        used = (self.deposited_bits - self.base_bits + 7) // 8
+        self._map[_HEADER_BYTES:_HEADER_BYTES + used - drop] = self._map[_HEADER_BYTES + drop:_HEADER_BYTES + used]
+        self._set_field('base_bits', self.base_bits + 8 * drop)
+        self._map.flush()
+        self._map = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(_HEADER_BYTES + used - drop)
+        self._remap(max(_HEADER_BYTES + used - drop, _HEADER_BYTES))
+
+    def flush(self):
+        """Writes the mapped pages to disk (they also reach the file when the process exits)."""
+        self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+            self._header = None
+
+    def stats(self):
+        return {
+            'available_bits': len(self),
+            'deposited_bits': self.deposited_bits,
+            'consumed_bits': self.consumed_bits,
+            'path': self.path,
+            'file_bytes': int(self._map.size),
+        }
+
+    def __repr__(self):
+        return (f"MappedKeyPool(path={self.path!r}, available_bits={len(self)}, "
+                f"deposited_bits={self.deposited_bits}, consumed_bits={self.consumed_bits})")
+
+
+class KeyPoolStore:
+    """
+    Directory of MappedKeyPool files, one per (node, partner, protocol): a node's pool with a
+    partner is its own copy of their shared key. Opening a store on an existing directory
+    resumes every pool in it.
+    """
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._pools = {}
+        self._lock = threading.Lock()  # Hop sessions of a relay chain run in threads
+        self._session_counts = {}
+        if os.path.exists(self.session_counts_path):
+            with open(self.session_counts_path) as f:
+                self._session_counts = json.load(f)
+
+    def pool_path(self, node_id, partner_id, protocol='dps'):
+        name = '__'.join(quote(str(part), safe='') for part in (node_id, partner_id, protocol))
+        return os.path.join(self.directory, f"{name}.pool")
+
+    def pool(self, node_id, partner_id, protocol='dps'):
+        """node_id's pool of protocol key shared with partner_id (opened or created on first use)."""
+        key = (node_id, partner_id, protocol)
+        if key not in self._pools:
+            self._pools[key] = MappedKeyPool(self.pool_path(node_id, partner_id, protocol))
+        return self._pools[key]
+
+    @property
+    def session_counts_path(self):
+        return os.path.join(self.directory, SESSION_COUNTS_FILE)
+
+    def next_session(self, node_id, stream, partner_id):
+        """
+        Index of node_id's next session on stream with partner_id, counted over every run on
+        this store. The count is written before it is returned, so a network restarted with
+        the same seed continues the numbering instead of replaying the key of earlier sessions.
+        """
+        name = '__'.join(quote(str(part), safe='') for part in (node_id, stream, partner_id))
+        with self._lock:
+            index = self._session_counts.get(name, 0)
+            self._session_counts[name] = index + 1
+            temporary = self.session_counts_path + '.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(self._session_counts, f)
+            os.replace(temporary, self.session_counts_path)
+        return index
+
+    def flush(self):
+        for pool in self._pools.values():
+            pool.flush()
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
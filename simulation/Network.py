@@ -1,9 +1,61 @@
 from simulation.Receiver import ReceiverDPS, ReceiverCOW, ReceiverBB84
 from simulation.Hardware import OpticalChannel
-from simulation.Sender import SenderDPS, SenderCOW, SenderBB84
+from simulation.Sender import SenderDPS, SenderCOW, SenderBB84, BB84_STATES
+from simulation.Engine import (run_dps_batch, run_cow_batch, run_bb84_batch, iter_dps_blocks, iter_cow_blocks,
+                               iter_bb84_blocks, resolve_engine, validate_engine, STREAM_BLOCK_PULSES)
+from simulation.RandomStreams import RandomStream
+from simulation.PackedKey import PackedKey
+from simulation.PulseLog import PulseType, PULSE_TYPE
+from simulation.Diagnostics import get_logger, log_key
+from simulation.Reconciliation import make_reconciler, estimate_qber
+from simulation.PrivacyAmplification import ToeplitzPrivacyAmplifier
+from simulation.KeyPool import DEFAULT_KEY_POOL_CAPACITY_BITS, KeyPool, KeyPoolStore
+from simulation.Routing import (validate_metric, link_weight, better, extend, shortest_path_tree, path_from_tree,
+                                path_value, disjoint_paths, split_demand)
 
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import logging
 import math 
-import random
+import time
+import numpy as np
+
+logger = get_logger('network')
+
+DATA_PULSE_TYPES = (PulseType.DATA_FIRST, PulseType.DATA_SECOND)
+
+# Suffix of a partner's entry in a node's shared_keys and key_pools, per protocol
+PROTOCOL_KEY_SUFFIXES = {'dps': '', 'cow': '_cow', 'bb84': '_bb84'}
+
+# Session method of each protocol, for the hops of a trusted relay chain
+RELAY_SESSION_METHODS = {
+    'dps': 'generate_and_share_key',
+    'cow': 'generate_and_share_key_cow',
+    'bb84': 'generate_and_share_key_bb84',
+}
+
+# Fraction of the sifted key disclosed to estimate the QBER that sizes reconciliation
+RECONCILIATION_SAMPLE_RATE = 0.10
+
+
+def align_by_time_slot(reference_slots, record_slots):
+    """
+    For each of reference_slots, the position in record_slots of the same time slot (-1 if none).
+    - positional join when both cover the same slots in the same order (the usual case)
+    - otherwise a sorted index on record_slots (non-uniform or missing slots; first record wins)
+    Either way it is a vectorized pass instead of a scan per pulse.
+    """
+    reference_slots = np.asarray(reference_slots)
+    record_slots = np.asarray(record_slots)
+    if reference_slots.shape == record_slots.shape and np.array_equal(reference_slots, record_slots):
+        return np.arange(reference_slots.size)
+    if record_slots.size == 0:
+        return np.full(reference_slots.size, -1)
+    order = np.argsort(record_slots, kind='stable')  # Stable: the first record of a repeated slot sorts first
+    sorted_slots = record_slots[order]
+    found = np.minimum(np.searchsorted(sorted_slots, reference_slots), sorted_slots.size - 1)
+    return np.where(sorted_slots[found] == reference_slots, order[found], -1)
+
 
 class Node:
     """
@@ -13,15 +65,27 @@ class Node:
     def __init__(self, node_id, avg_photon_number=0.2, detector_efficiency=0.9, dark_count_rate=1e-7, 
                  # COW specific params, can be None if not used for COW
                  cow_monitor_pulse_ratio=0.1, cow_detection_threshold_photons=0,
-                 cow_extinction_ratio_db=20.0):
+                 cow_extinction_ratio_db=20.0, engine='auto', rng=None, reconciliation=None,
+                 privacy_amplification=False, key_store=None, key_pool_capacity_bits=DEFAULT_KEY_POOL_CAPACITY_BITS):
         self.node_id = node_id
+        # Node-owned random stream; every QKD session draws from its own child stream
+        self.rng = rng or RandomStream()
+        self._session_counts = {}
+        # Session engine: 'loop' (per-pulse objects), 'vectorized' (NumPy arrays)
+        # or 'auto' (vectorized for large num_pulses)
+        self.engine = validate_engine(engine)
+        # Error correction after sifting: None/'none', 'cascade', 'ldpc' or a reconciler object
+        self.reconciliation = reconciliation
+        # Toeplitz hashing of the reconciled key: False, True or an amplifier object
+        self.privacy_amplification = privacy_amplification
         # Initialize DPS components. These will be reset at the start of a new QKD session
         # via the generate_and_share_key methods to ensure fresh state.
         self.avg_photon_number = avg_photon_number
         self.detector_efficiency = detector_efficiency
         self.dark_count_rate = dark_count_rate
-        self.qkd_sender = SenderDPS(self.avg_photon_number)
-        self.qkd_receiver = ReceiverDPS(self.detector_efficiency, self.dark_count_rate)
+        self.qkd_sender = SenderDPS(self.avg_photon_number, rng=self.rng.child('dps_sender'))
+        self.qkd_receiver = ReceiverDPS(self.detector_efficiency, self.dark_count_rate,
+                                        rng=self.rng.child('dps_receiver'))
         
         # Initialize COW components
         self.cow_monitor_pulse_ratio = cow_monitor_pulse_ratio
@@ -29,243 +93,358 @@ class Node:
         self.cow_extinction_ratio_db = cow_extinction_ratio_db
         self.cow_sender = SenderCOW(self.avg_photon_number, 
                                     monitor_pulse_ratio=self.cow_monitor_pulse_ratio,
-                                    extinction_ratio_db=self.cow_extinction_ratio_db)
+                                    extinction_ratio_db=self.cow_extinction_ratio_db,
+                                    rng=self.rng.child('cow_sender'))
         self.cow_receiver = ReceiverCOW(self.detector_efficiency, self.dark_count_rate, 
-                                        detection_threshold_photons=self.cow_detection_threshold_photons)
+                                        detection_threshold_photons=self.cow_detection_threshold_photons,
+                                        rng=self.rng.child('cow_receiver'))
         
         # Initialize BB84 components
-        self.bb84_sender = SenderBB84(self.avg_photon_number)
-        self.bb84_receiver = ReceiverBB84(self.detector_efficiency, self.dark_count_rate)
+        self.bb84_sender = SenderBB84(self.avg_photon_number, rng=self.rng.child('bb84_sender'))
+        self.bb84_receiver = ReceiverBB84(self.detector_efficiency, self.dark_count_rate,
+                                          rng=self.rng.child('bb84_receiver'))
         
         self.connected_links = {}
         self.shared_keys = {}     
+        # Keys of every session with a partner, debited as relaying consumes them (see key_pool);
+        # in memory (holding at most key_pool_capacity_bits each, None for no cap),
+        # or in the memory-mapped files of a KeyPoolStore
+        self.key_store = key_store
+        self.key_pool_capacity_bits = key_pool_capacity_bits
+        self.key_pools = {}
         self.traffic_log = []    
 
     def add_link(self, neighbor_node_id, channel_instance):
         """Adds an optical channel link to a neighbor."""
         self.connected_links[neighbor_node_id] = channel_instance
 
-    def generate_and_share_key(self, target_node, num_pulses, pulse_repetition_rate_ns, phase_flip_prob=0.0):
+    def key_pool(self, partner_id, protocol='dps'):
+        """
+        This node's KeyPool for protocol sessions with partner_id (created empty on first use).
+        With a key_store, the pool is the store's MappedKeyPool file, resumed if it exists.
+        """
+        name = partner_id + PROTOCOL_KEY_SUFFIXES[protocol]
+        if name not in self.key_pools:
+            self.key_pools[name] = (KeyPool(self.key_pool_capacity_bits) if self.key_store is None
+                                    else self.key_store.pool(self.node_id, partner_id, protocol))
+        return self.key_pools[name]
+
+    def _deposit_session_keys(self, target_node, protocol, alice_key, bob_key):
+        self.key_pool(target_node.node_id, protocol).deposit(alice_key)
+        target_node.key_pool(self.node_id, protocol).deposit(bob_key)
+
+    def session_stream(self, protocol, partner_id):
+        """
+        Returns this node's random stream for its next `protocol` session with partner_id.
+        Streams are numbered per (protocol, partner), so they depend only on the root seed
+        and the node's own session history. With a key_store the numbering is persisted
+        in the store and carries on across runs, so resumed pools never receive replayed key.
+        """
+        if self.key_store is not None:
+            index = self.key_store.next_session(self.node_id, protocol, partner_id)
+        else:
+            key = (protocol, partner_id)
+            index = self._session_counts.get(key, 0)
+            self._session_counts[key] = index + 1
+        return self.rng.child('session', protocol, partner_id, index)
+
+    def generate_and_share_key(self, target_node, num_pulses, pulse_repetition_rate_ns, phase_flip_prob=0.0,
+                               engine=None, reconciliation=None, privacy_amplification=None):
         """
         Implements DPS QKD as per theory:
         - Encoding: phase difference between consecutive pulses (0, π)
         - Sifting: based on detector clicks and phase difference
         - 2 detectors, Mach-Zehnder interferometer
         - phase_flip_prob: probability of phase flip noise in the channel
+        - engine: 'auto', 'loop' or 'vectorized' (defaults to the node's engine)
+        - reconciliation: error correction of Bob's sifted key (defaults to the node's; see _reconcile)
+        - privacy_amplification: hashing of the reconciled keys (defaults to the node's; see _amplify)
         """
-        print(f"--- Node {self.node_id} initiating DPS-QKD with Node {target_node.node_id} ---")
+        engine = resolve_engine(engine or self.engine, num_pulses)
+        logger.info("--- Node %s initiating DPS-QKD with Node %s ---", self.node_id, target_node.node_id)
         
-        # Re-initialize sender and receiver for a new QKD session to ensure clean state (e.g., last_sent_phase)
-        #for DPS
-        self.qkd_sender = SenderDPS(self.avg_photon_number)
-        target_node.qkd_receiver = ReceiverDPS(target_node.detector_efficiency, target_node.dark_count_rate)
+        channel = self._start_dps_session(target_node)
 
-        alice_pulses_sent_info = [] 
-        
-        for i in range(num_pulses):
-            time_slot = i * pulse_repetition_rate_ns
-            # Sender.prepare_and_send_pulse now manages previous_pulse_phase internally
-            modulated_phase, photon_count = self.qkd_sender.prepare_and_send_pulse(time_slot) 
-            alice_pulses_sent_info.append(self.qkd_sender.get_pulse_info(time_slot)) 
-            
+        if engine == 'vectorized':
+            alice_sifted_key, bob_sifted_key = run_dps_batch(
+                self.qkd_sender, target_node.qkd_receiver, channel, num_pulses, phase_flip_prob
+            )
+        else:
+            alice_sifted_key, bob_sifted_key = self._dps_session_loop(
+                target_node, channel, num_pulses, pulse_repetition_rate_ns, phase_flip_prob
+            )
 
+        logger.info("DPS Sifting complete. Raw key length: %d", len(alice_sifted_key))
+        log_key(logger, "DPS sifted key (Bob)", bob_sifted_key)
+        sifted_length = len(alice_sifted_key)
+        alice_sifted_key, bob_sifted_key, reconciliation_stats = self._reconcile(
+            target_node, 'dps', alice_sifted_key, bob_sifted_key, reconciliation
+        )
+        alice_sifted_key, bob_sifted_key, amplification_stats = self._amplify(
+            target_node, 'dps', alice_sifted_key, bob_sifted_key, reconciliation_stats, privacy_amplification
+        )
+        self.shared_keys[target_node.node_id] = alice_sifted_key
+        target_node.shared_keys[self.node_id] = bob_sifted_key
+        self._deposit_session_keys(target_node, 'dps', alice_sifted_key, bob_sifted_key)
+        self.traffic_log.append({
+            'type': 'key_generation',
+            'partner': target_node.node_id,
+            'initial_pulses': num_pulses,
+            'sifted_length': sifted_length,
+            'reconciliation': reconciliation_stats,
+            'privacy_amplification': amplification_stats,
+        })
+        logger.debug("[DPS QKD] Sifting and measurement complete. Theory-compliant implementation.")
+        return alice_sifted_key, bob_sifted_key
+
+    def _start_dps_session(self, target_node):
+        """Fresh DPS sender/receiver pair for a new session; returns the channel to target_node."""
+        # Re-initialize sender and receiver for a new QKD session to ensure clean state (e.g., last_sent_phase)
+        self.qkd_sender = SenderDPS(self.avg_photon_number, rng=self.session_stream('dps', target_node.node_id))
+        target_node.qkd_receiver = ReceiverDPS(target_node.detector_efficiency, target_node.dark_count_rate,
+                                               rng=target_node.session_stream('dps', self.node_id))
+        return self._channel_to(target_node)
+
+    def _channel_to(self, target_node):
         channel = self.connected_links.get(target_node.node_id)
         if not channel:
             raise ValueError(f"No channel defined between {self.node_id} and {target_node.node_id}")
+        return channel
+
+    def _reconcile(self, target_node, protocol, alice_key, bob_key, reconciliation=None):
+        """
+        Reconciliation stage of a session: corrects Bob's sifted key towards Alice's.
+        - reconciliation: None (the node's default), 'none', 'cascade', 'ldpc' or a reconciler object
+        - the reconciler is sized by a QBER estimate from a disclosed sample (RECONCILIATION_SAMPLE_RATE)
+        - public randomness (permutations, parity check matrix) comes from a per-session stream
+        Returns both reconciled keys (parts that could not be corrected are dropped from both)
+        and the stage's stats (None when there is no reconciliation).
+        """
+        if reconciliation is None:
+            reconciliation = self.reconciliation
+        if reconciliation is None or reconciliation == 'none':
+            return alice_key, bob_key, None
+        stream = self.session_stream(f'{protocol}_reconciliation', target_node.node_id)
+        reconciler = make_reconciler(reconciliation, rng=stream.child('reconciler'))
+        sample_size = max(1, int(RECONCILIATION_SAMPLE_RATE * len(alice_key))) if len(alice_key) else 0
+        qber_estimate, sample_errors = estimate_qber(alice_key, bob_key, sample_size, seed=stream.seed_int())
+        alice_key, bob_key, stats = reconciler.reconcile(alice_key, bob_key, qber_estimate)
+        stats.update(qber_estimate=qber_estimate, sample_size=sample_size, sample_errors=sample_errors)
+        logger.info("%s reconciliation (%s): %d bits leaked, %d residual errors, %.2f Mbit/s",
+                    protocol.upper(), stats['method'], stats['leaked_bits'],
+                    stats['residual_errors'], stats['throughput_mbps'])
+        return alice_key, bob_key, stats
 
-        channel_processed_pulses = []
-        for pulse in alice_pulses_sent_info:
-            received_photons = channel.transmit_pulse(pulse['photon_count'])
+    def _amplify(self, target_node, protocol, alice_key, bob_key, reconciliation_stats, privacy_amplification=None):
+        """
+        Privacy amplification stage of a session: Toeplitz hashing of both reconciled keys.
+        - privacy_amplification: None (the node's default), False, True or an amplifier object
+        - the output length comes from the reconciliation's QBER estimate, leaked bits and disclosed sample
+        - the public Toeplitz seed comes from a per-session stream
+        Returns the final keys and the stage's stats (None when there is no privacy amplification).
+        """
+        if privacy_amplification is None:
+            privacy_amplification = self.privacy_amplification
+        if not privacy_amplification:
+            return alice_key, bob_key, None
+        if reconciliation_stats is None:
+            raise ValueError("Privacy amplification needs a reconciliation method ('cascade' or 'ldpc').")
+        stream = self.session_stream(f'{protocol}_privacy_amplification', target_node.node_id)
+        if privacy_amplification is True:
+            amplifier = ToeplitzPrivacyAmplifier(rng=stream.child('toeplitz'))
+        else:
+            amplifier = privacy_amplification
+        alice_key, bob_key, stats = amplifier.amplify(alice_key, bob_key, reconciliation_stats['qber_estimate'],
+                                                      reconciliation_stats['leaked_bits'],
+                                                      disclosed_bits=reconciliation_stats['sample_size'])
+        if not stats['verified']:
+            logger.warning("%s reconciled keys with Node %s differ; privacy amplification discarded them.",
+                           protocol.upper(), target_node.node_id)
+        logger.info("%s privacy amplification: %d -> %d bits, %.2f Mbit/s",
+                    protocol.upper(), stats['input_bits'], stats['output_bits'], stats['throughput_mbps'])
+        return alice_key, bob_key, stats
+
+    def _dps_session_loop(self, target_node, channel, num_pulses, pulse_repetition_rate_ns, phase_flip_prob):
+        """Pulse-by-pulse DPS session through SenderDPS/ReceiverDPS. Returns the sifted keys."""
+        for i in range(num_pulses):
+            time_slot = i * pulse_repetition_rate_ns
+            # Sender.prepare_and_send_pulse now manages previous_pulse_phase internally
+            self.qkd_sender.prepare_and_send_pulse(time_slot)
+        alice_pulses_sent_info = self.qkd_sender.sent_pulses_info
+
+        # Channel output, one column per field
+        received_photon_counts = array('q')
+        received_phases = array('d')
+        for photon_count, modulated_phase in zip(alice_pulses_sent_info.column('photon_count').tolist(),
+                                                 alice_pulses_sent_info.column('modulated_phase').tolist()):
+            received_photon_counts.append(channel.transmit_pulse(photon_count))
             # Apply phase flip noise
-            modulated_phase = pulse['modulated_phase']
-            if random.random() < phase_flip_prob:
+            if channel.rng.py.random() < phase_flip_prob:
                 modulated_phase = (modulated_phase + math.pi) % (2 * math.pi)
-            channel_processed_pulses.append({
-                'time_slot': pulse['time_slot'],
-                'received_photon_count': received_photons,
-                'modulated_phase': modulated_phase 
-            })
+            received_phases.append(modulated_phase)
 
-        bob_clicks_and_inferred_bits = []
-        
         # Bob needs information about the previous pulse to measure phase difference
-        # The first pulse cannot encode a bit, so its 'previous' is a dummy.
-        dummy_prev_received_pulse_info = {'received_photon_count': 0, 'modulated_phase': 0.0}
-
-        for i in range(len(channel_processed_pulses)):
-            current_received_pulse = channel_processed_pulses[i]
-            
+        # The first pulse cannot encode a bit, so its 'previous' is a dummy (no photons, phase 0).
+        previous_photons, previous_phase = 0, 0.0
+        time_slots = alice_pulses_sent_info.column('time_slot').tolist()
+        for time_slot, photons, phase in zip(time_slots, received_photon_counts, received_phases):
             # Bob's MZI measures the difference between the current and previous pulse.
-            # For the very first pulse, there is no 'previous' signal pulse.
-            previous_received_pulse_for_mzi = dummy_prev_received_pulse_info if i == 0 else channel_processed_pulses[i-1]
-
-            click_dm1, click_dm2, measured_phase_diff, bob_bit = target_node.qkd_receiver.receive_and_measure(
-                current_received_pulse['time_slot'],
-                current_received_pulse['received_photon_count'],
-                current_received_pulse['modulated_phase'],
-                previous_received_pulse_for_mzi['received_photon_count'], # Pass received photon count of previous
-                previous_received_pulse_for_mzi['modulated_phase'] # Pass phase of previous
-            )
-            bob_clicks_and_inferred_bits.append({
-                'time_slot': current_received_pulse['time_slot'],
-                'click_dm1': click_dm1,
-                'click_dm2': click_dm2,
-                'measured_phase_diff': measured_phase_diff,
-                'bob_inferred_bit': bob_bit 
-            })
-
-        alice_sifted_key = []
-        bob_sifted_key = []
-        
+            target_node.qkd_receiver.receive_and_measure(time_slot, photons, phase, previous_photons, previous_phase)
+            previous_photons, previous_phase = photons, phase
+        bob_clicks_and_inferred_bits = target_node.qkd_receiver.raw_clicks_info
+
         # Sifting process: Alice and Bob publicly compare and agree on bits.
         # For DPS, they discard the first pulse and only consider pairs where Bob made a conclusive measurement.
-        for i in range(1, len(alice_pulses_sent_info)): # Start from 1 because the first pulse doesn't encode a bit
-            alice_pn_minus_1_info = alice_pulses_sent_info[i-1]
-            alice_pn_info = alice_pulses_sent_info[i]
-            
-            bob_measurement_info_for_pn = None
-            for click_info in bob_clicks_and_inferred_bits:
-                if click_info['time_slot'] == alice_pn_info['time_slot']:
-                    bob_measurement_info_for_pn = click_info
-                    break
-            
-            # Only proceed if Bob has measurement info for the current pulse (pn)
-            # And Bob's measurement for this pair was conclusive (not None)
-            if bob_measurement_info_for_pn and bob_measurement_info_for_pn['bob_inferred_bit'] is not None:
-                # Calculate Alice's intended bit for this pair (pn-1, pn)
-                alice_intended_delta_phi = (alice_pn_info['modulated_phase'] - alice_pn_minus_1_info['modulated_phase']) % (2 * math.pi)
-                # Normalize delta_phi to be in [-pi, pi]
-                if alice_intended_delta_phi > math.pi: alice_intended_delta_phi -= 2 * math.pi
-                if alice_intended_delta_phi < -math.pi: alice_intended_delta_phi += 2 * math.pi
-                
-                # Alice's bit is 0 if phase difference is 0, 1 if phase difference is pi
-                alice_intended_bit = 0 if math.isclose(alice_intended_delta_phi, 0.0, abs_tol=1e-9) else 1
-                
-                # Both Alice and Bob add the bit to their sifted key if they agree on the time slot
-                # and Bob had a conclusive measurement.
-                alice_sifted_key.append(alice_intended_bit)
-                bob_sifted_key.append(bob_measurement_info_for_pn['bob_inferred_bit'])
-                
-        print(f"DPS Sifting complete. Raw key length: {len(alice_sifted_key)}")
-        print(f"sifted key are: {bob_sifted_key}")
-        self.shared_keys[target_node.node_id] = alice_sifted_key
-        target_node.shared_keys[self.node_id] = bob_sifted_key
-        self.traffic_log.append({
-            'type': 'key_generation',
-            'partner': target_node.node_id,
-            'initial_pulses': num_pulses,
-            'sifted_length': len(alice_sifted_key),
-        })
-        print("[DPS QKD] Sifting and measurement complete. Theory-compliant implementation.")
-        return alice_sifted_key, bob_sifted_key
+        # Bob's record for each of Alice's pulses, matched by time slot
+        positions = align_by_time_slot(alice_pulses_sent_info.column('time_slot'),
+                                       bob_clicks_and_inferred_bits.column('time_slot'))
+        bob_bits = np.full(len(positions), -1, dtype=np.int8)  # -1: no record or inconclusive
+        matched = positions >= 0
+        bob_bits[matched] = bob_clicks_and_inferred_bits.column('bob_inferred_bit')[positions[matched]]
+
+        # Alice's intended bit for each pair (pn-1, pn): 0 if the phase difference is 0, 1 if it is π
+        phases = alice_pulses_sent_info.column('modulated_phase')
+        delta_phi = np.mod(phases[1:] - phases[:-1], 2 * math.pi)
+        delta_phi = np.where(delta_phi > math.pi, delta_phi - 2 * math.pi, delta_phi)  # Normalize to [-π, π]
+        alice_bits = (np.abs(delta_phi) > 1e-9).astype(np.int8)
+
+        # Both keep the bit if Bob had a conclusive measurement in that time slot
+        conclusive = bob_bits[1:] >= 0
+        return PackedKey(alice_bits[conclusive]), PackedKey(bob_bits[1:][conclusive])
 
     def generate_and_share_key_cow(self, target_node, num_pulses, pulse_repetition_rate_ns,
-                                   monitor_pulse_ratio=0.1, detection_threshold_photons=0, phase_flip_prob=0.0, bit_flip_error_prob=0.0):
+                                   monitor_pulse_ratio=0.1, detection_threshold_photons=0, phase_flip_prob=0.0, bit_flip_error_prob=0.0,
+                                   engine=None, reconciliation=None, privacy_amplification=None):
         """
         Implements COW QKD as per theory:
         - Encoding: vacuum + coherent pulse, intensity modulated
         - Sifting: keep bits where Alice and Bob agree on data pulses (using correct pulse in each pair)
         - Monitoring: pairs of monitoring pulses to detect eavesdropping
+        - engine: 'auto', 'loop' or 'vectorized' (defaults to the node's engine)
+        - reconciliation: error correction of Bob's sifted key (defaults to the node's; see _reconcile)
+        - privacy_amplification: hashing of the reconciled keys (defaults to the node's; see _amplify)
         """
-        print(f"--- Node {self.node_id} initiating COW-QKD with Node {target_node.node_id} ---")
+        engine = resolve_engine(engine or self.engine, num_pulses)
+        bit_flip_error_prob = bit_flip_error_prob or 0.0
+        logger.info("--- Node %s initiating COW-QKD with Node %s ---", self.node_id, target_node.node_id)
+
+        channel = self._start_cow_session(target_node, monitor_pulse_ratio, detection_threshold_photons)
+
+        if engine == 'vectorized':
+            alice_sifted_key_cow, bob_sifted_key_cow, stats = run_cow_batch(
+                self.cow_sender, target_node.cow_receiver, channel, num_pulses,
+                phase_flip_prob, bit_flip_error_prob
+            )
+        else:
+            alice_sifted_key_cow, bob_sifted_key_cow, stats = self._cow_session_loop(
+                target_node, channel, num_pulses, phase_flip_prob, bit_flip_error_prob
+            )
+        successful_monitor_pairs = stats['successful_monitor_pairs']
+        attempted_monitor_pairs = stats['attempted_monitor_pairs']
+
+        logger.info("COW Sifting: Attempted data bits: %d, Sifted Key Length: %d",
+                    stats['attempted_data_bits'], len(alice_sifted_key_cow))
+        if attempted_monitor_pairs > 0:
+            monitoring_success_rate = successful_monitor_pairs / attempted_monitor_pairs
+            logger.info("COW Monitoring: %d/%d pairs successfully detected (Rate: %.2f)",
+                        successful_monitor_pairs, attempted_monitor_pairs, monitoring_success_rate)
+            if monitoring_success_rate < 0.9:
+                logger.warning("Monitoring success rate is low (%.2f). Possible eavesdropping or high channel loss!",
+                               monitoring_success_rate)
+            else:
+                logger.info("Monitoring success rate is high. No significant eavesdropping detected based on monitor pulses.")
+        else:
+            logger.info("COW Monitoring: No monitoring pairs attempted or detected.")
+
+        sifted_length = len(alice_sifted_key_cow)
+        alice_sifted_key_cow, bob_sifted_key_cow, reconciliation_stats = self._reconcile(
+            target_node, 'cow', alice_sifted_key_cow, bob_sifted_key_cow, reconciliation
+        )
+        alice_sifted_key_cow, bob_sifted_key_cow, amplification_stats = self._amplify(
+            target_node, 'cow', alice_sifted_key_cow, bob_sifted_key_cow, reconciliation_stats, privacy_amplification
+        )
+        self.shared_keys[target_node.node_id + "_cow"] = alice_sifted_key_cow
+        target_node.shared_keys[self.node_id + "_cow"] = bob_sifted_key_cow
+        self._deposit_session_keys(target_node, 'cow', alice_sifted_key_cow, bob_sifted_key_cow)
+
+        self.traffic_log.append({
+            'type': 'key_generation_cow',
+            'partner': target_node.node_id,
+            'initial_pulses': num_pulses,
+            'sifted_length': sifted_length,
+            'successful_monitor_pairs': successful_monitor_pairs,
+            'attempted_monitor_pairs': attempted_monitor_pairs,
+            'reconciliation': reconciliation_stats,
+            'privacy_amplification': amplification_stats,
+        })
+        log_key(logger, "COW sifted key (Bob)", bob_sifted_key_cow)
+        logger.debug("[COW QKD] Sifting, decoy, and monitoring complete. Theory-compliant implementation.")
+        
+        return alice_sifted_key_cow, bob_sifted_key_cow
 
-        # Re-initialize COW sender and receiver for a new QKD session
+    def _start_cow_session(self, target_node, monitor_pulse_ratio, detection_threshold_photons):
+        """Fresh COW sender/receiver pair for a new session; returns the channel to target_node."""
         self.cow_sender = SenderCOW(self.avg_photon_number, 
                                     monitor_pulse_ratio=monitor_pulse_ratio,
-                                    extinction_ratio_db=self.cow_extinction_ratio_db)
+                                    extinction_ratio_db=self.cow_extinction_ratio_db,
+                                    rng=self.session_stream('cow', target_node.node_id))
         target_node.cow_receiver = ReceiverCOW(
             target_node.detector_efficiency,
             target_node.dark_count_rate,
-            detection_threshold_photons=detection_threshold_photons
+            detection_threshold_photons=detection_threshold_photons,
+            rng=target_node.session_stream('cow', self.node_id)
         )
+        return self._channel_to(target_node)
 
+    def _cow_session_loop(self, target_node, channel, num_pulses, phase_flip_prob, bit_flip_error_prob):
+        """
+        Pulse-by-pulse COW session through SenderCOW/ReceiverCOW.
+        Returns the sifted keys (bit flip errors applied to Bob's) and the monitoring statistics.
+        """
         # 1. Alice prepares her pulse train (data and monitoring)
         alice_sent_pulses_info = self.cow_sender.prepare_pulse_train(num_pulses)
-        
-        # 2. Transmit pulses over the optical channel
-        channel = self.connected_links.get(target_node.node_id)
-        if not channel:
-            raise ValueError(f"No channel defined between {self.node_id} and {target_node.node_id}")
-
-        bob_received_signals = []
-        for i, sent_pulse in enumerate(alice_sent_pulses_info):
-            time_slot = i
-            photons_sent = sent_pulse['photon_count']
-            pulse_type = sent_pulse['pulse_type']
-            original_phase = sent_pulse['phase']
+        pulse_types = alice_sent_pulses_info.column('pulse_type').tolist()
 
+        # 2. Transmit pulses over the optical channel and let Bob measure them
+        final_phases = array('d')
+        for time_slot, (photons_sent, original_phase, pulse_type) in enumerate(zip(
+                alice_sent_pulses_info.column('photon_count').tolist(),
+                alice_sent_pulses_info.column('phase').tolist(),
+                pulse_types)):
             received_photons_at_bob = channel.transmit_pulse(photons_sent)
 
             # Apply phase flip noise to the transmitted pulse
             final_phase = original_phase
-            if random.random() < phase_flip_prob:
+            if channel.rng.py.random() < phase_flip_prob:
                 final_phase = (original_phase + math.pi) % (2 * math.pi)
+            final_phases.append(final_phase)
 
             # Bob measures the pulse
-            click, bob_inferred_bit, is_monitoring_click = target_node.cow_receiver.measure_pulse(
-                time_slot, 
-                received_photons_at_bob, 
-                pulse_type
-            )
-            bob_received_signals.append({
-                'time_slot': time_slot,
-                'alice_pulse_type': pulse_type,
-                'alice_intended_bit': sent_pulse['intended_bit'],
-                'received_photons': received_photons_at_bob,
-                'click': click,
-                'bob_inferred_bit': bob_inferred_bit,
-                'is_monitoring_click': is_monitoring_click,
-                'final_phase': final_phase
-            })
+            target_node.cow_receiver.measure_pulse(time_slot, received_photons_at_bob, PULSE_TYPE.decode(pulse_type))
+        bob_received_signals = target_node.cow_receiver.received_pulses_info
+        clicks = bob_received_signals.column('click').tolist()
+        monitoring_clicks = bob_received_signals.column('is_monitoring_click').tolist()
 
         # 3. Sifting Process (Classical communication between Alice and Bob)
-        print(f"bob received key pulse types: {[signal['alice_pulse_type'] for signal in bob_received_signals]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("COW pulse type counts: %s",
+                         {str(PulseType(code)): int(count) for code, count in enumerate(np.bincount(pulse_types, minlength=len(PulseType)))})
         alice_sifted_key_cow = []
         bob_sifted_key_cow = []
-        # debug_pairs_printed = 0
         i = 0
-        while i < len(alice_sent_pulses_info) - 1:
-            p1_alice = alice_sent_pulses_info[i]
-            p2_alice = alice_sent_pulses_info[i+1]
-            p1_bob = bob_received_signals[i]
-            p2_bob = bob_received_signals[i+1]
-
+        while i < len(pulse_types) - 1:
             # Monitor pair: both monitor_first and monitor_second
-            if p1_alice['pulse_type'] == 'monitor_first' and p2_alice['pulse_type'] == 'monitor_second':
+            if pulse_types[i] == PulseType.MONITOR_FIRST and pulse_types[i+1] == PulseType.MONITOR_SECOND:
                 i += 2
                 continue
             # Data pair: data_first and data_second
-            if p1_alice['pulse_type'].startswith('data') and p2_alice['pulse_type'].startswith('data'):
+            if pulse_types[i] in DATA_PULSE_TYPES and pulse_types[i+1] in DATA_PULSE_TYPES:
                 # Only keep if exactly one click in the pair
-                if p1_bob['click'] != p2_bob['click']:
-                    if p1_bob['click']:
-                        # Click in first pulse: infer bit 1
-                        alice_sifted_key_cow.append(1)
-                        bob_sifted_key_cow.append(1)
-                        # debug_info = {
-                        #     'pair_index': i//2,
-                        #     'alice_bit': 1,
-                        #     'pulse_used': 'first',
-                        #     'photon_count': p1_alice['photon_count'],
-                        #     'bob_inferred_bit': 1,
-                        #     'bob_click': True
-                        # }
-                    elif p2_bob['click']:
-                        # Click in second pulse: infer bit 0
-                        alice_sifted_key_cow.append(0)
-                        bob_sifted_key_cow.append(0)
-                        # debug_info = {
-                        #     'pair_index': i//2,
-                        #     'alice_bit': 0,
-                        #     'pulse_used': 'second',
-                        #     'photon_count': p2_alice['photon_count'],
-                        #     'bob_inferred_bit': 0,
-                        #     'bob_click': True
-                        # }
-                    # if debug_pairs_printed < 10:
-                    #     print(f"[DEBUG COW PAIR {debug_info['pair_index']}] Alice bit: {debug_info['alice_bit']}, Pulse used: {debug_info['pulse_used']}, "
-                    #           f"Photon count: {debug_info['photon_count']}, Bob inferred: {debug_info['bob_inferred_bit']}, Bob click: {debug_info['bob_click']}", flush=True)
-                    #     debug_pairs_printed += 1
+                if clicks[i] != clicks[i+1]:
+                    # Click in first pulse: infer bit 1, click in second pulse: infer bit 0
+                    bit = 1 if clicks[i] else 0
+                    alice_sifted_key_cow.append(bit)
+                    bob_sifted_key_cow.append(bit)
                 i += 2
                 continue
             i += 1
@@ -274,203 +453,257 @@ class Node:
         successful_monitor_pairs = 0
         attempted_monitor_pairs = 0
         i = 0
-        while i < len(alice_sent_pulses_info) - 1:
-            p1_alice = alice_sent_pulses_info[i]
-            p2_alice = alice_sent_pulses_info[i+1]
-            p1_bob = bob_received_signals[i]
-            p2_bob = bob_received_signals[i+1]
-            if p1_alice['pulse_type'] == 'monitor_first' and p2_alice['pulse_type'] == 'monitor_second':
+        while i < len(pulse_types) - 1:
+            if pulse_types[i] == PulseType.MONITOR_FIRST and pulse_types[i+1] == PulseType.MONITOR_SECOND:
                 attempted_monitor_pairs += 1
-                phases_match = math.isclose(p1_bob['final_phase'], p2_bob['final_phase'], abs_tol=1e-9)
-                if p1_bob['is_monitoring_click'] and p2_bob['is_monitoring_click'] and phases_match:
+                phases_match = math.isclose(final_phases[i], final_phases[i+1], abs_tol=1e-9)
+                if monitoring_clicks[i] and monitoring_clicks[i+1] and phases_match:
                     successful_monitor_pairs += 1
                 i += 2
             else:
                 i += 1
 
-        print(f"COW Sifting: Attempted data bits: {len(self.cow_sender.get_intended_key_bits())}, Sifted Key Length: {len(alice_sifted_key_cow)}")
-        if attempted_monitor_pairs > 0:
-            monitoring_success_rate = successful_monitor_pairs / attempted_monitor_pairs
-            print(f"COW Monitoring: {successful_monitor_pairs}/{attempted_monitor_pairs} pairs successfully detected (Rate: {monitoring_success_rate:.2f})")
-            if monitoring_success_rate < 0.9:
-                print("WARNING: Monitoring success rate is low. Possible eavesdropping or high channel loss!")
-            else:
-                print("Monitoring success rate is high. No significant eavesdropping detected based on monitor pulses.")
-        else:
-            print("COW Monitoring: No monitoring pairs attempted or detected.")
-
-        self.shared_keys[target_node.node_id + "_cow"] = alice_sifted_key_cow
-        target_node.shared_keys[self.node_id + "_cow"] = bob_sifted_key_cow
-
-        self.traffic_log.append({
-            'type': 'key_generation_cow',
-            'partner': target_node.node_id,
-            'initial_pulses': num_pulses,
-            'sifted_length': len(alice_sifted_key_cow),
-            'successful_monitor_pairs': successful_monitor_pairs,
-            'attempted_monitor_pairs': attempted_monitor_pairs
-        })
-        print(f"sifted key : {bob_sifted_key_cow}")
-        print("[COW QKD] Sifting, decoy, and monitoring complete. Theory-compliant implementation.")
-        
         # After sifting, apply bit flip error to Bob's sifted key
         for idx in range(len(bob_sifted_key_cow)):
-            if random.random() < bit_flip_error_prob:
+            if channel.rng.py.random() < bit_flip_error_prob:
                 bob_sifted_key_cow[idx] = 1 - bob_sifted_key_cow[idx]
-        
-        return alice_sifted_key_cow, bob_sifted_key_cow
 
-    def generate_and_share_key_bb84(self, target_node, num_pulses, pulse_repetition_rate_ns, phase_flip_prob=0.0):
+        return PackedKey(alice_sifted_key_cow), PackedKey(bob_sifted_key_cow), {
+            'attempted_data_bits': len(self.cow_sender.get_intended_key_bits()),
+            'successful_monitor_pairs': successful_monitor_pairs,
+            'attempted_monitor_pairs': attempted_monitor_pairs
+        }
+
+    def generate_and_share_key_bb84(self, target_node, num_pulses, pulse_repetition_rate_ns, phase_flip_prob=0.0,
+                                    engine=None, reconciliation=None, privacy_amplification=None):
         """
         Implements BB84 QKD as per theory:
         - Encoding: four quantum states in two bases (rectilinear and diagonal)
         - Sifting: keep bits where Alice and Bob used the same basis
         - Classical communication for basis comparison
+        - engine: 'auto', 'loop' or 'vectorized' (defaults to the node's engine)
+        - reconciliation: error correction of Bob's sifted key (defaults to the node's; see _reconcile)
+        - privacy_amplification: hashing of the reconciled keys (defaults to the node's; see _amplify)
         """
-        print(f"--- Node {self.node_id} initiating BB84-QKD with Node {target_node.node_id} ---")
+        engine = resolve_engine(engine or self.engine, num_pulses)
+        logger.info("--- Node %s initiating BB84-QKD with Node %s ---", self.node_id, target_node.node_id)
+
+        channel = self._start_bb84_session(target_node)
 
-        # Re-initialize BB84 sender and receiver for a new QKD session
-        self.bb84_sender = SenderBB84(self.avg_photon_number)
+        if engine == 'vectorized':
+            alice_sifted_key, bob_sifted_key, stats = run_bb84_batch(
+                self.bb84_sender, target_node.bb84_receiver, channel, num_pulses, phase_flip_prob
+            )
+        else:
+            alice_sifted_key, bob_sifted_key, stats = self._bb84_session_loop(
+                target_node, channel, num_pulses, pulse_repetition_rate_ns, phase_flip_prob
+            )
+
+        logger.info("BB84 Sifting complete. Raw key length: %d", len(alice_sifted_key))
+        logger.debug("Alice bases: %s...", stats['alice_bases_preview'])  # Show first 10 bases
+        logger.debug("Bob bases: %s...", stats['bob_bases_preview'])      # Show first 10 bases
+        log_key(logger, "BB84 sifted key (Bob)", bob_sifted_key)
+        
+        # Debug information
+        if logger.isEnabledFor(logging.DEBUG):
+            basis_matches = stats['basis_matches']
+            total_pulses = num_pulses
+            if total_pulses > 0:
+                logger.debug("BB84 Debug: %d/%d basis matches (%.1f%%)",
+                             basis_matches, total_pulses, basis_matches / total_pulses * 100)
+            logger.debug("BB84 Debug: %d clicks in matching basis cases", stats['matching_basis_clicks'])
+
+            # Check for errors in matching basis cases
+            if len(alice_sifted_key) > 0:
+                errors = (alice_sifted_key ^ bob_sifted_key).popcount()
+                logger.debug("BB84 Debug: QBER in sifted key: %.4f (%d/%d errors)",
+                             errors / len(alice_sifted_key), errors, len(alice_sifted_key))
+
+        sifted_length = len(alice_sifted_key)
+        alice_sifted_key, bob_sifted_key, reconciliation_stats = self._reconcile(
+            target_node, 'bb84', alice_sifted_key, bob_sifted_key, reconciliation
+        )
+        alice_sifted_key, bob_sifted_key, amplification_stats = self._amplify(
+            target_node, 'bb84', alice_sifted_key, bob_sifted_key, reconciliation_stats, privacy_amplification
+        )
+        self.shared_keys[target_node.node_id + "_bb84"] = alice_sifted_key
+        target_node.shared_keys[self.node_id + "_bb84"] = bob_sifted_key
+        self._deposit_session_keys(target_node, 'bb84', alice_sifted_key, bob_sifted_key)
+
+        self.traffic_log.append({
+            'type': 'key_generation_bb84',
+            'partner': target_node.node_id,
+            'initial_pulses': num_pulses,
+            'sifted_length': sifted_length,
+            'reconciliation': reconciliation_stats,
+            'privacy_amplification': amplification_stats,
+        })
+        
+        logger.debug("[BB84 QKD] Sifting complete. Theory-compliant implementation.")
+        return alice_sifted_key, bob_sifted_key
+
+    def _start_bb84_session(self, target_node):
+        """Fresh BB84 sender/receiver pair for a new session; returns the channel to target_node."""
+        self.bb84_sender = SenderBB84(self.avg_photon_number, rng=self.session_stream('bb84', target_node.node_id))
         target_node.bb84_receiver = ReceiverBB84(
             target_node.detector_efficiency,
-            target_node.dark_count_rate
+            target_node.dark_count_rate,
+            rng=target_node.session_stream('bb84', self.node_id)
         )
+        return self._channel_to(target_node)
 
+    def _bb84_session_loop(self, target_node, channel, num_pulses, pulse_repetition_rate_ns, phase_flip_prob):
+        """
+        Pulse-by-pulse BB84 session through SenderBB84/ReceiverBB84.
+        Returns the sifted keys and the basis statistics used for diagnostics.
+        """
         # Step 1: Alice generates random bits and encodes them in randomly chosen bases
-        alice_sent_pulses_info = []
         for i in range(num_pulses):
             time_slot = i * pulse_repetition_rate_ns
-            encoded_state, photon_count, chosen_bit, chosen_basis = self.bb84_sender.prepare_and_send_pulse(time_slot)
-            alice_sent_pulses_info.append(self.bb84_sender.get_pulse_info(time_slot))
+            self.bb84_sender.prepare_and_send_pulse(time_slot)
+        alice_sent_pulses_info = self.bb84_sender.sent_pulses_info
 
         # Step 2: Transmit pulses over the optical channel
-        channel = self.connected_links.get(target_node.node_id)
-        if not channel:
-            raise ValueError(f"No channel defined between {self.node_id} and {target_node.node_id}")
+        received_photon_counts = array('q')
+        received_state_codes = array('b')
+        for photon_count, state_code in zip(alice_sent_pulses_info.column('photon_count').tolist(),
+                                            alice_sent_pulses_info.column('encoded_state').tolist()):
+            received_photon_counts.append(channel.transmit_pulse(photon_count))
 
-        bob_received_signals = []
-        for sent_pulse in alice_sent_pulses_info:
-            received_photons = channel.transmit_pulse(sent_pulse['photon_count'])
-            
             # Apply phase flip noise (affects the encoded state)
-            encoded_state = sent_pulse['encoded_state']
-            if random.random() < phase_flip_prob:
-                # Phase flip changes the state: |0⟩ ↔ |1⟩, |+⟩ ↔ |-⟩
-                if encoded_state == '|0⟩':
-                    encoded_state = '|1⟩'
-                elif encoded_state == '|1⟩':
-                    encoded_state = '|0⟩'
-                elif encoded_state == '|+⟩':
-                    encoded_state = '|-⟩'
-                elif encoded_state == '|-⟩':
-                    encoded_state = '|+⟩'
-            
-            # Add additional channel noise (photon loss, etc.)
-            # This is already handled by the channel.transmit_pulse() function
-
-            bob_received_signals.append({
-                'time_slot': sent_pulse['time_slot'],
-                'received_photons': received_photons,
-                'encoded_state': encoded_state
-            })
+            if channel.rng.py.random() < phase_flip_prob:
+                # Phase flip changes the state: |0⟩ ↔ |1⟩, |+⟩ ↔ |-⟩ (toggles the bit of its code)
+                state_code ^= 1
+            received_state_codes.append(state_code)
 
         # Step 3: Bob measures each photon in a randomly chosen basis
-        bob_measurements = []
-        for received_signal in bob_received_signals:
-            measured_bit, chosen_basis, click_occurred = target_node.bb84_receiver.receive_and_measure(
-                received_signal['time_slot'],
-                received_signal['received_photons'],
-                received_signal['encoded_state']
-            )
-            bob_measurements.append({
-                'time_slot': received_signal['time_slot'],
-                'measured_bit': measured_bit,
-                'chosen_basis': chosen_basis,
-                'click_occurred': click_occurred
-            })
+        for time_slot, received_photons, state_code in zip(alice_sent_pulses_info.column('time_slot').tolist(),
+                                                            received_photon_counts, received_state_codes):
+            target_node.bb84_receiver.receive_and_measure(time_slot, received_photons, BB84_STATES[state_code])
+        bob_measurements = target_node.bb84_receiver.received_pulses_info
 
         # Step 4: Alice and Bob publicly disclose their bases (classical communication)
-        alice_bases = self.bb84_sender.get_chosen_bases()
-        bob_bases = target_node.bb84_receiver.get_chosen_bases()
+        n = min(len(alice_sent_pulses_info), len(bob_measurements))
+        same_basis = (alice_sent_pulses_info.column('chosen_basis')[:n] == bob_measurements.column('chosen_basis')[:n])
+        clicked = bob_measurements.column('click_occurred')[:n]
+        measured_bits = bob_measurements.column('measured_bit')[:n]
 
-        # Step 5: Sifting process - keep bits where bases match
-        alice_sifted_key = []
-        bob_sifted_key = []
-        
-        for i in range(len(alice_sent_pulses_info)):
-            if i < len(bob_measurements) and i < len(alice_bases) and i < len(bob_bases):
-                alice_basis = alice_bases[i]
-                bob_basis = bob_bases[i]
-                alice_bit = alice_sent_pulses_info[i]['chosen_bit']
-                bob_measurement = bob_measurements[i]
-                
-                # Only keep bits where Alice and Bob used the same basis AND Bob got a click
-                if (alice_basis == bob_basis and 
-                    bob_measurement['measured_bit'] is not None and 
-                    bob_measurement['click_occurred']):
-                    alice_sifted_key.append(alice_bit)
-                    bob_sifted_key.append(bob_measurement['measured_bit'])
-
-        print(f"BB84 Sifting complete. Raw key length: {len(alice_sifted_key)}")
-        print(f"Alice bases: {alice_bases[:10]}...")  # Show first 10 bases
-        print(f"Bob bases: {bob_bases[:10]}...")      # Show first 10 bases
-        print(f"Sifted key: {bob_sifted_key}")
-        
-        # Debug information
-        basis_matches = sum(1 for a, b in zip(alice_bases, bob_bases) if a == b)
-        total_pulses = len(alice_bases)
-        print(f"BB84 Debug: {basis_matches}/{total_pulses} basis matches ({basis_matches/total_pulses*100:.1f}%)")
-        
-        # Check for clicks in matching basis cases
-        matching_basis_clicks = 0
-        for i in range(len(alice_sent_pulses_info)):
-            if i < len(bob_measurements) and i < len(alice_bases) and i < len(bob_bases):
-                if alice_bases[i] == bob_bases[i] and bob_measurements[i]['click_occurred']:
-                    matching_basis_clicks += 1
-        
-        print(f"BB84 Debug: {matching_basis_clicks} clicks in matching basis cases")
-        
-        # Check for errors in matching basis cases
-        if len(alice_sifted_key) > 0:
-            errors = sum(1 for a, b in zip(alice_sifted_key, bob_sifted_key) if a != b)
-            qber_debug = errors / len(alice_sifted_key)
-            print(f"BB84 Debug: QBER in sifted key: {qber_debug:.4f} ({errors}/{len(alice_sifted_key)} errors)")
+        # Step 5: Sifting process - keep bits where Alice and Bob used the same basis AND Bob got a click
+        sifted = same_basis & clicked & (measured_bits >= 0)
+        alice_sifted_key = PackedKey(alice_sent_pulses_info.column('chosen_bit')[:n][sifted])
+        bob_sifted_key = PackedKey(measured_bits[sifted])
 
-        self.shared_keys[target_node.node_id + "_bb84"] = alice_sifted_key
-        target_node.shared_keys[self.node_id + "_bb84"] = bob_sifted_key
+        return alice_sifted_key, bob_sifted_key, {
+            'basis_matches': int(np.count_nonzero(same_basis)),
+            'matching_basis_clicks': int(np.count_nonzero(same_basis & clicked)),
+            'alice_bases_preview': self.bb84_sender.get_chosen_bases()[:10],
+            'bob_bases_preview': target_node.bb84_receiver.get_chosen_bases()[:10]
+        }
+
+    def stream_and_share_key(self, target_node, num_pulses, phase_flip_prob=0.0, block_pulses=STREAM_BLOCK_PULSES):
+        """
+        Chunked DPS session: returns a generator of (alice_bits, bob_bits) PackedKeys, one per
+        block of block_pulses pulses, so memory stays bounded however long the run is.
+        - the last pulse's phase and photons carry over, so no bit is lost at block boundaries
+        - blocks are not stored in shared_keys; a traffic_log entry is added once the stream ends
+        """
+        channel = self._start_dps_session(target_node)
+        blocks = iter_dps_blocks(self.qkd_sender, target_node.qkd_receiver, channel, num_pulses,
+                                 phase_flip_prob, block_pulses)
+        return self._logged_stream(blocks, target_node, 'key_generation', num_pulses)
+
+    def stream_and_share_key_cow(self, target_node, num_pulses, monitor_pulse_ratio=0.1, detection_threshold_photons=0,
+                                 phase_flip_prob=0.0, bit_flip_error_prob=0.0, block_pulses=STREAM_BLOCK_PULSES):
+        """
+        Chunked COW session: returns a generator of (alice_bits, bob_bits) PackedKeys, one per
+        block of block_pulses pulse slots (rounded down to whole pairs).
+        - pairs never straddle a block boundary
+        - blocks are not stored in shared_keys; a traffic_log entry with the monitoring
+          counts is added once the stream ends
+        """
+        channel = self._start_cow_session(target_node, monitor_pulse_ratio, detection_threshold_photons)
+        blocks = iter_cow_blocks(self.cow_sender, target_node.cow_receiver, channel, num_pulses,
+                                 phase_flip_prob, bit_flip_error_prob, max(block_pulses // 2, 1))
+        return self._logged_stream(blocks, target_node, 'key_generation_cow', num_pulses,
+                                   ('successful_monitor_pairs', 'attempted_monitor_pairs'))
 
+    def stream_and_share_key_bb84(self, target_node, num_pulses, phase_flip_prob=0.0, block_pulses=STREAM_BLOCK_PULSES):
+        """
+        Chunked BB84 session: returns a generator of (alice_bits, bob_bits) PackedKeys, one per
+        block of block_pulses pulses.
+        - blocks are not stored in shared_keys; a traffic_log entry is added once the stream ends
+        """
+        channel = self._start_bb84_session(target_node)
+        blocks = iter_bb84_blocks(self.bb84_sender, target_node.bb84_receiver, channel, num_pulses,
+                                  phase_flip_prob, block_pulses)
+        return self._logged_stream(blocks, target_node, 'key_generation_bb84', num_pulses)
+
+    def _logged_stream(self, blocks, target_node, log_type, num_pulses, logged_stats=()):
+        # Yields the sifted bits of each block and logs the session totals at the end
+        sifted_length = 0
+        totals = dict.fromkeys(logged_stats, 0)
+        for alice_bits, bob_bits, *stats in blocks:
+            sifted_length += len(alice_bits)
+            for name in logged_stats:
+                totals[name] += stats[0][name]
+            yield alice_bits, bob_bits
         self.traffic_log.append({
-            'type': 'key_generation_bb84',
+            'type': log_type,
             'partner': target_node.node_id,
             'initial_pulses': num_pulses,
-            'sifted_length': len(alice_sifted_key),
+            'sifted_length': sifted_length,
+            **totals
         })
-        
-        print("[BB84 QKD] Sifting complete. Theory-compliant implementation.")
-        return alice_sifted_key, bob_sifted_key
 
     def get_raw_sifted_key_with_neighbor(self, neighbor_id):
         """Retrieves the raw sifted key shared with a direct neighbor."""
         return self.shared_keys.get(neighbor_id)
 
-    def relay_key_classically(self, sender_node_id, receiver_node_id, key_to_relay):
-        # This function is not directly used in the current end-to-end key establishment logic
-        # but could be part of a more explicit classical relay process.
-        key_with_sender = self.shared_keys.get(sender_node_id)
-        key_with_receiver = self.shared_keys.get(receiver_node_id)
-
-        if not key_with_sender:
-            print(f"Error: Node {self.node_id} does not have a key with {sender_node_id} to relay.")
-            return None
-        if not key_with_receiver:
-            print(f"Error: Node {self.node_id} does not have a key with {receiver_node_id} to relay.")
-            return None
-        print(f"Node {self.node_id} (relay) is holding the end-to-end key segment. Ready to extend to {receiver_node_id}.")
-        return key_to_relay # The relay just passes the key content to the next segment's context.
+    def relay_key_classically(self, sender_node_id, receiver_node_id, key_to_relay, protocol='dps'):
+        """
+        Trusted relay step of one-time-pad key forwarding.
+        - key_to_relay: the key as received from sender_node_id, XOR-encrypted with the
+          next bits of the pool this node shares with it
+        - decrypts it with those bits and re-encrypts it with the next bits of the pool
+          shared with receiver_node_id; both pools are debited len(key_to_relay) bits
+        Returns the ciphertext for receiver_node_id, or None if a pool holds too few bits.
+        """
+        pool_with_sender = self.key_pools.get(sender_node_id + PROTOCOL_KEY_SUFFIXES[protocol])
+        pool_with_receiver = self.key_pools.get(receiver_node_id + PROTOCOL_KEY_SUFFIXES[protocol])
+        num_bits = len(key_to_relay)
+        for partner_id, pool in ((sender_node_id, pool_with_sender), (receiver_node_id, pool_with_receiver)):
+            if pool is None or len(pool) < num_bits:
+                logger.error("Node %s does not have %d key bits with %s to relay (has %d).",
+                             self.node_id, num_bits, partner_id, len(pool) if pool is not None else 0)
+                return None
+        end_to_end_key = key_to_relay ^ pool_with_sender.consume(num_bits)
+        logger.debug("Node %s (relay) forwarding %d key bits from %s to %s.",
+                     self.node_id, num_bits, sender_node_id, receiver_node_id)
+        return end_to_end_key ^ pool_with_receiver.consume(num_bits)
 
 class Network:
-    def __init__(self):
+    def __init__(self, engine='auto', seed=None, key_store_dir=None,
+                 key_pool_capacity_bits=DEFAULT_KEY_POOL_CAPACITY_BITS):
         self.nodes = {} # {node_id: Node_instance}
+        self.engine = validate_engine(engine) # Default session engine for nodes added to this network
+        # Root random stream: nodes and channels get named child streams, so a fixed seed
+        # reproduces a run bit for bit regardless of how it is scheduled.
+        self.seed = seed
+        self.rng = RandomStream(seed)
+        # Persistent key pools of all nodes (see KeyPoolStore); None keeps pools in memory
+        self.key_store = None if key_store_dir is None else KeyPoolStore(key_store_dir)
+        # Cap of each in-memory key pool, so long runs of sessions do not grow without bound
+        self.key_pool_capacity_bits = key_pool_capacity_bits
+        # Timing reports of end-to-end relay chains (see _establish_relay_chain)
+        self.relay_log = []
+        # Reports of keys delivered over several disjoint paths (see establish_multipath_key)
+        self.multipath_log = []
+        # Routing state, kept current by connect_nodes (see _update_routes):
+        # link weights per (metric, protocol), shortest path trees per (source, metric, protocol)
+        # and disjoint routes per (source, target, k, metric, protocol)
+        self._route_graphs = {}
+        self._route_trees = {}
+        self._disjoint_routes = {}
 
     def add_node(self, node_id, avg_photon_number=0.2, detector_efficiency=0.9, dark_count_rate=1e-7,
                  # COW specific params
@@ -486,9 +719,11 @@ class Network:
         
         new_node = Node(node_id, avg_photon_number, detector_efficiency, dark_count_rate,
                         cow_monitor_pulse_ratio, cow_detection_threshold_photons,
-                        cow_extinction_ratio_db)
+                        cow_extinction_ratio_db, engine=self.engine,
+                        rng=self.rng.child('node', node_id), key_store=self.key_store,
+                        key_pool_capacity_bits=self.key_pool_capacity_bits)
         self.nodes[node_id] = new_node
-        print(f"Node {node_id} added to the network.")
+        logger.debug("Node %s added to the network.", node_id)
         return new_node
 
     def connect_nodes(self, node1_id, node2_id, distance_km, attenuation_db_per_km=0.2):
@@ -498,113 +733,327 @@ class Network:
         if not node1 or not node2:
             raise ValueError("Both nodes must exist in the network to create a connection.")
 
-        channel = OpticalChannel(distance_km, attenuation_db_per_km)
+        channel = OpticalChannel(distance_km, attenuation_db_per_km,
+                                 rng=self.rng.child('channel', *sorted((str(node1_id), str(node2_id)))))
+        replaced = node2_id in node1.connected_links
         node1.add_link(node2_id, channel)
         node2.add_link(node1_id, channel) # Channel is bidirectional in this model
-        print(f"Connected Node {node1_id} and Node {node2_id} with a {distance_km} km link.")
+        logger.debug("Connected Node %s and Node %s with a %s km link.", node1_id, node2_id, distance_km)
+        self._update_routes(node1, node2, channel, replaced)
 
-    def establish_end_to_end_raw_key(self, sender_id, receiver_id, path_nodes, num_pulses, pulse_repetition_rate_ns):
-        if path_nodes[0] != sender_id or path_nodes[-1] != receiver_id:
-            raise ValueError("Path must start with sender_id and end with receiver_id.")
+    def _route_key(self, metric, protocol):
+        # Loss does not depend on the protocol, so all protocols share its routes
+        return (validate_metric(metric), None if metric == 'loss' else protocol)
 
-        print(f"\n--- Establishing end-to-end RAW key (DPS) from {sender_id} to {receiver_id} via path: {path_nodes} ---")
-        
-        # In a trusted relay network, each link independently establishes a raw key.
-        # The relay node then classically "stitches" these keys together.
-        # For a raw key demonstration, we concatenate the individual link keys.
-        current_end_to_end_key_segment = [] 
-        
-        for i in range(len(path_nodes) - 1):
-            node1_id = path_nodes[i]
-            node2_id = path_nodes[i+1]
-            
-            node1 = self.nodes[node1_id] # Acts as Alice for this link
-            node2 = self.nodes[node2_id] # Acts as Bob for this link
-            
-            print(f"Attempting DPS-QKD link: {node1_id} <-> {node2_id}")
-            
-            # Generate the raw sifted key for this direct link
-            alice_raw_sifted, bob_raw_sifted = node1.generate_and_share_key(
-                node2, num_pulses, pulse_repetition_rate_ns
-            )
-            
-            # For trusted relay, the raw sifted key from Alice's side of the current link
-            # is effectively available to the next segment after relay processing.
-            current_end_to_end_key_segment.extend(alice_raw_sifted) # Concatenate for total raw key length
+    def _route_graph(self, metric, protocol):
+        """Adjacency {node_id: {neighbor_id: weight}} of the links under metric (see Routing.link_weight)."""
+        key = self._route_key(metric, protocol)
+        if key not in self._route_graphs:
+            if protocol not in PROTOCOL_KEY_SUFFIXES:
+                raise ValueError(f"Unknown protocol '{protocol}'. Expected one of {tuple(PROTOCOL_KEY_SUFFIXES)}.")
+            self._route_graphs[key] = {
+                node_id: {neighbor_id: link_weight(node, self.nodes[neighbor_id], channel, metric, protocol)
+                          for neighbor_id, channel in node.connected_links.items()}
+                for node_id, node in self.nodes.items()
+            }
+        return self._route_graphs[key]
 
-            if not alice_raw_sifted:
-                print(f"Failed to establish raw sifted key for link {node1_id}-{node2_id}. Aborting end-to-end key establishment.")
-                return None
-            print(f"Raw sifted key established for link {node1_id} and {node2_id} with length {len(alice_raw_sifted)}")
+    def _route_tree(self, source_id, metric, protocol):
+        key = (source_id,) + self._route_key(metric, protocol)
+        if key not in self._route_trees:
+            self._route_trees[key] = shortest_path_tree(self._route_graph(metric, protocol), source_id, metric)
+        return self._route_trees[key]
+
+    def _update_routes(self, node1, node2, channel, replaced):
+        """
+        Brings the routing state up to date with a new link node1-node2.
+        - link weight graphs gain the link in both directions
+        - a cached shortest path tree stays valid unless the link improves the path to one of
+          its ends, or gives it an equally good path with fewer hops (the tie-break of
+          shortest_path_tree); a new link can only make paths better, and those trees are dropped
+        - cached disjoint routes are dropped when the link touches their source's component,
+          where it may open a new disjoint path
+        Replacing an existing link may make paths worse, so it drops all cached routes.
+        """
+        if replaced:
+            self._route_graphs.clear()
+            self._route_trees.clear()
+            self._disjoint_routes.clear()
+            return
+        links = ((node1.node_id, node2.node_id), (node2.node_id, node1.node_id))
+        for (metric, protocol), graph in self._route_graphs.items():
+            for sender_id, receiver_id in links:
+                graph.setdefault(sender_id, {})[receiver_id] = link_weight(
+                    self.nodes[sender_id], self.nodes[receiver_id], channel, metric, protocol)
+
+        stale_trees = set()
+        reached = set()
+        for key, (values, previous) in self._route_trees.items():
+            source_id, metric, protocol = key
+            graph = self._route_graphs[(metric, protocol)]
+            if node1.node_id in values or node2.node_id in values:
+                reached.add(key)
+            for sender_id, receiver_id in links:
+                weight = graph[sender_id][receiver_id]
+                if sender_id not in values or (metric == 'key_rate' and weight <= 0):
+                    continue
+                value = extend(metric, values[sender_id], weight)
+                if better(metric, value, values.get(receiver_id)) or (
+                        value == values[receiver_id] and
+                        len(path_from_tree(previous, sender_id)) < len(path_from_tree(previous, receiver_id)) - 1):
+                    stale_trees.add(key)
+        stale_routes = [key for key in self._disjoint_routes
+                        if (key[0],) + key[3:] in reached or (key[0],) + key[3:] not in self._route_trees]
+        for key in stale_trees:
+            del self._route_trees[key]
+        for key in stale_routes:
+            del self._disjoint_routes[key]
+        if stale_trees or stale_routes:
+            logger.debug("Link %s-%s invalidated %d shortest path trees and %d disjoint routes.",
+                         node1.node_id, node2.node_id, len(stale_trees), len(stale_routes))
+
+    def find_route(self, sender_id, receiver_id, metric='loss', protocol='dps'):
+        """
+        Best trusted relay path from sender_id to receiver_id, or None if there is none.
+        - metric 'loss' minimizes the summed channel loss (dB), 'key_rate' maximizes the expected
+          secure key rate of the path's slowest link for protocol (see Routing)
+        - shortest path trees are cached per source and kept across calls until a new link
+          could improve them
+        """
+        for node_id in (sender_id, receiver_id):
+            if node_id not in self.nodes:
+                raise ValueError(f"Node {node_id} does not exist in the network.")
+        _, previous = self._route_tree(sender_id, metric, protocol)
+        return path_from_tree(previous, receiver_id)
+
+    def find_disjoint_routes(self, sender_id, receiver_id, k=2, metric='key_rate', protocol='dps'):
+        """
+        Up to k node-disjoint trusted relay paths from sender_id to receiver_id, best first
+        (see Routing.disjoint_paths). Cached until a new link reaches the sender's component.
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}.")
+        first_path = self.find_route(sender_id, receiver_id, metric, protocol)
+        key = (sender_id, receiver_id, k) + self._route_key(metric, protocol)
+        if key not in self._disjoint_routes:
+            if first_path is None or k == 1:
+                paths = [first_path] if first_path else []
+            else:
+                paths = disjoint_paths(self._route_graph(metric, protocol), sender_id, receiver_id, k, metric)
+            self._disjoint_routes[key] = paths
+        return [list(path) for path in self._disjoint_routes[key]]
 
-        print(f"End-to-end RAW sifted key (DPS) established between {sender_id} and {receiver_id}.")
-        return current_end_to_end_key_segment # This is the final end-to-end raw key
+    def route_value(self, path_nodes, metric='loss', protocol='dps'):
+        """Loss (dB) or expected secure key rate (bits per pulse, slowest link) of a path."""
+        return path_value(self._route_graph(metric, protocol), path_nodes, metric)
+
+    def establish_end_to_end_raw_key(self, sender_id, receiver_id, path_nodes, num_pulses, pulse_repetition_rate_ns,
+                                     workers=None):
+        """
+        DPS end-to-end raw key over a trusted relay path; see _establish_relay_chain.
+        """
+        return self._establish_relay_chain('dps', sender_id, receiver_id, path_nodes, num_pulses,
+                                           pulse_repetition_rate_ns, workers)
 
     def establish_end_to_end_raw_key_cow(self, sender_id, receiver_id, path_nodes, num_pulses, 
                                          pulse_repetition_rate_ns, monitor_pulse_ratio=0.1, 
-                                         detection_threshold_photons=0):
+                                         detection_threshold_photons=0, workers=None):
+        """
+        COW end-to-end raw key over a trusted relay path; see _establish_relay_chain.
+        """
+        return self._establish_relay_chain('cow', sender_id, receiver_id, path_nodes, num_pulses,
+                                           pulse_repetition_rate_ns, workers,
+                                           monitor_pulse_ratio=monitor_pulse_ratio,
+                                           detection_threshold_photons=detection_threshold_photons)
+
+    def establish_end_to_end_raw_key_bb84(self, sender_id, receiver_id, path_nodes, num_pulses, pulse_repetition_rate_ns,
+                                          workers=None):
+        """
+        BB84 end-to-end raw key over a trusted relay path; see _establish_relay_chain.
+        """
+        return self._establish_relay_chain('bb84', sender_id, receiver_id, path_nodes, num_pulses,
+                                           pulse_repetition_rate_ns, workers)
+
+    def _establish_relay_chain(self, protocol, sender_id, receiver_id, path_nodes, num_pulses,
+                               pulse_repetition_rate_ns, workers=None, key_length=None, **session_params):
+        """
+        Runs the QKD session of every hop of path_nodes, then forwards an end-to-end key over them.
+        - hops are independent links, so their sessions run concurrently on a thread pool
+          (workers threads, default one per hop; workers=1 runs them in order in this thread).
+          Hops whose engine is 'auto' run the vectorized engine whatever num_pulses: it spends
+          its time in NumPy, which releases the GIL, where the loop engine would serialize them.
+          Each hop's compute time is its thread's CPU time, so it excludes waits for the GIL.
+        - every session draws from its own per-session streams, so a fixed seed gives the
+          same keys whatever the number of workers
+        - the sender draws a random key as long as the smallest hop key pool (the bottleneck),
+          or key_length bits if that is less, and one-time-pads it hop by hop: every relay decrypts and re-encrypts it with its
+          pools (relay_key_classically), and every pool on the path is debited its length
+        - the report is appended to relay_log: the simulated wall time is the slowest hop's
+          session time (hops transmit in parallel), next to each hop's compute time, the
+          key length, its bottleneck link and its errors (raw hop keys carry their QBER).
+          The key rate counts only this session's key: the shortest hop key over the
+          session time (the pools may also hold key left over from earlier sessions)
+        The receiver's copy goes to its shared_keys under '<sender_id>_e2e' (plus the
+        protocol suffix, as for direct keys), the sender's under '<receiver_id>_e2e'.
+        Returns the sender's end-to-end raw key, or None if a hop produced no key.
+        """
         if path_nodes[0] != sender_id or path_nodes[-1] != receiver_id:
             raise ValueError("Path must start with sender_id and end with receiver_id.")
+        if len(path_nodes) < 2:
+            raise ValueError("Path must have at least one hop.")
+        label = protocol.upper()
+        logger.info("--- Establishing end-to-end RAW key (%s) from %s to %s via path: %s ---",
+                    label, sender_id, receiver_id, path_nodes)
 
-        print(f"\n--- Establishing end-to-end RAW key (COW) from {sender_id} to {receiver_id} via path: {path_nodes} ---")
-        
-        current_end_to_end_key_segment_cow = []
-        
-        for i in range(len(path_nodes) - 1):
-            node1_id = path_nodes[i]
-            node2_id = path_nodes[i+1]
-            
-            node1 = self.nodes[node1_id]
-            node2 = self.nodes[node2_id]
-            
-            print(f"Attempting COW-QKD link: {node1_id} <-> {node2_id}")
-            
-            alice_sifted_cow, bob_sifted_cow = node1.generate_and_share_key_cow(
-                node2, num_pulses, pulse_repetition_rate_ns, 
-                monitor_pulse_ratio, detection_threshold_photons
-            )
-            
-            # For trusted relay in COW (as with DPS), the raw sifted key from Alice's side
-            # of the current link is concatenated to form the end-to-end raw key.
-            current_end_to_end_key_segment_cow.extend(alice_sifted_cow)
+        hops = [(self.nodes[node1_id], self.nodes[node2_id]) for node1_id, node2_id in zip(path_nodes, path_nodes[1:])]
+        session = RELAY_SESSION_METHODS[protocol]
 
-            if not alice_sifted_cow:
-                print(f"Failed to establish COW sifted key for link {node1_id}-{node2_id}. Aborting.")
-                return None
-            print(f"COW sifted key established for link {node1_id} and {node2_id} with length {len(alice_sifted_cow)}")
+        def run_hop(hop):
+            node1, node2 = hop  # node1 acts as Alice for this link, node2 as Bob
+            logger.info("Attempting %s-QKD link: %s <-> %s", label, node1.node_id, node2.node_id)
+            engine = session_params.get('engine') or node1.engine
+            params = dict(session_params, engine='vectorized' if engine == 'auto' else engine)
+            started = time.thread_time()
+            alice_key, _ = getattr(node1, session)(node2, num_pulses, pulse_repetition_rate_ns, **params)
+            return alice_key, time.thread_time() - started
 
-        print(f"End-to-end COW RAW sifted key established between {sender_id} and {receiver_id}.")
-        return current_end_to_end_key_segment_cow
+        started = time.perf_counter()
+        workers = min(workers or len(hops), len(hops))
+        if workers <= 1:
+            outcomes = [run_hop(hop) for hop in hops]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"qkd-{protocol}-hop") as pool:
+                outcomes = list(pool.map(run_hop, hops))
+        compute_wall_s = time.perf_counter() - started
 
-    def establish_end_to_end_raw_key_bb84(self, sender_id, receiver_id, path_nodes, num_pulses, pulse_repetition_rate_ns):
-        if path_nodes[0] != sender_id or path_nodes[-1] != receiver_id:
-            raise ValueError("Path must start with sender_id and end with receiver_id.")
+        session_time_s = num_pulses * pulse_repetition_rate_ns / 1e9 if num_pulses > 0 else 0.0
+        report = {
+            'protocol': protocol,
+            'path': list(path_nodes),
+            'workers': workers,
+            'hops': [{
+                'link': (node1.node_id, node2.node_id),
+                'sifted_length': len(alice_key),
+                'compute_s': compute_s,
+                'session_time_s': session_time_s,
+            } for (node1, node2), (alice_key, compute_s) in zip(hops, outcomes)],
+            'simulated_wall_time_s': session_time_s,
+            'serial_simulated_time_s': session_time_s * len(hops),
+            'compute_wall_s': compute_wall_s,
+            'compute_total_s': sum(compute_s for _, compute_s in outcomes),
+            'key_length': 0,
+            'session_key_bits': min(len(alice_key) for alice_key, _ in outcomes),
+            'bottleneck_link': None,
+            'errors': None,
+            'key_rate_bps': 0.0,
+        }
+        self.relay_log.append(report)
+        logger.info("%s relay chain: %d hops on %d workers, %.3f s compute (%.3f s summed over hops), "
+                    "%.6f s simulated", label, len(hops), workers, compute_wall_s, report['compute_total_s'],
+                    report['simulated_wall_time_s'])
 
-        print(f"\n--- Establishing end-to-end RAW key (BB84) from {sender_id} to {receiver_id} via path: {path_nodes} ---")
-        
-        current_end_to_end_key_segment_bb84 = []
-        
-        for i in range(len(path_nodes) - 1):
-            node1_id = path_nodes[i]
-            node2_id = path_nodes[i+1]
-            
-            node1 = self.nodes[node1_id]
-            node2 = self.nodes[node2_id]
-            
-            print(f"Attempting BB84-QKD link: {node1_id} <-> {node2_id}")
-            
-            alice_sifted_bb84, bob_sifted_bb84 = node1.generate_and_share_key_bb84(
-                node2, num_pulses, pulse_repetition_rate_ns
-            )
-            
-            # For trusted relay in BB84, the raw sifted key from Alice's side
-            # of the current link is concatenated to form the end-to-end raw key.
-            current_end_to_end_key_segment_bb84.extend(alice_sifted_bb84)
+        for (node1, node2), (alice_key, _) in zip(hops, outcomes):
+            if not alice_key:
+                logger.warning("Failed to establish %s sifted key for link %s-%s. Aborting end-to-end key establishment.",
+                               label, node1.node_id, node2.node_id)
+                return None
+            logger.info("%s sifted key established for link %s and %s with length %d",
+                        label, node1.node_id, node2.node_id, len(alice_key))
 
-            if not alice_sifted_bb84:
-                print(f"Failed to establish BB84 sifted key for link {node1_id}-{node2_id}. Aborting.")
+        # The end-to-end key can only be as long as the smallest hop pool
+        pool_bits = [len(node1.key_pool(node2.node_id, protocol)) for node1, node2 in hops]
+        bottleneck = int(np.argmin(pool_bits))
+        key_length = pool_bits[bottleneck] if key_length is None else min(key_length, pool_bits[bottleneck])
+        sender, receiver = hops[0][0], hops[-1][1]
+        stream = sender.session_stream(f'{protocol}_relay', receiver_id)
+        end_to_end_key = PackedKey(stream.np.integers(0, 2, key_length, dtype=np.uint8))
+
+        ciphertext = end_to_end_key ^ sender.key_pool(path_nodes[1], protocol).consume(key_length)
+        for previous_id, relay_id, next_id in zip(path_nodes, path_nodes[1:], path_nodes[2:]):
+            ciphertext = self.nodes[relay_id].relay_key_classically(previous_id, next_id, ciphertext, protocol)
+            if ciphertext is None:
                 return None
-            print(f"BB84 sifted key established for link {node1_id} and {node2_id} with length {len(alice_sifted_bb84)}")
+        receiver_key = ciphertext ^ receiver.key_pool(path_nodes[-2], protocol).consume(key_length)
+
+        suffix = PROTOCOL_KEY_SUFFIXES[protocol]
+        sender.shared_keys[f"{receiver_id}_e2e{suffix}"] = end_to_end_key
+        receiver.shared_keys[f"{sender_id}_e2e{suffix}"] = receiver_key
+        for hop, (node1, node2) in zip(report['hops'], hops):
+            hop['pool_remaining_bits'] = len(node1.key_pool(node2.node_id, protocol))
+        report.update(
+            key_length=key_length,
+            bottleneck_link=report['hops'][bottleneck]['link'],
+            errors=(end_to_end_key ^ receiver_key).popcount(),
+            key_rate_bps=(min(key_length, report['session_key_bits']) / session_time_s
+                          if session_time_s > 0 else 0.0),
+        )
+        logger.info("End-to-end %s RAW key of %d bits forwarded from %s to %s (bottleneck link %s-%s, %d errors).",
+                    label, key_length, sender_id, receiver_id, *report['bottleneck_link'], report['errors'])
+        return end_to_end_key
+
+    def establish_multipath_key(self, sender_id, receiver_id, num_pulses, pulse_repetition_rate_ns, protocol='dps',
+                                k=2, metric='key_rate', demand_bits=None, workers=None, **session_params):
+        """
+        End-to-end raw key over up to k node-disjoint trusted relay paths (find_disjoint_routes).
+        - the paths share no link, so they all transmit during the same num_pulses window and
+          their keys add up: the aggregate rate is the sum of the paths' bottleneck rates
+        - with demand_bits, the demand is split over the paths in proportion to their expected
+          secure key rates (Routing.split_demand) and each path forwards at most its share;
+          otherwise every path forwards all its bottleneck allows
+        - each path is a relay chain (_establish_relay_chain, with workers and session_params);
+          paths run one after the other so the sender's relay streams keep a fixed order
+        - the report is appended to multipath_log
+        The concatenated keys replace the '_e2e' shared_keys entries of both ends.
+        Returns the sender's key, or None if no path delivered a key.
+        """
+        if protocol not in RELAY_SESSION_METHODS:
+            raise ValueError(f"Unknown protocol '{protocol}'. Expected one of {tuple(RELAY_SESSION_METHODS)}.")
+        paths = self.find_disjoint_routes(sender_id, receiver_id, k, metric, protocol)
+        if not paths:
+            logger.warning("No route from %s to %s. Aborting multipath key establishment.", sender_id, receiver_id)
+            return None
+        expected_rates = [self.route_value(path, 'key_rate', protocol) for path in paths]
+        shares = [None] * len(paths) if demand_bits is None else split_demand(demand_bits, expected_rates)
+        logger.info("--- Establishing %s multipath key from %s to %s over %d disjoint paths ---",
+                    protocol.upper(), sender_id, receiver_id, len(paths))
+
+        keys = []
+        path_reports = []
+        for path, share in zip(paths, shares):
+            key = self._establish_relay_chain(protocol, sender_id, receiver_id, path, num_pulses,
+                                              pulse_repetition_rate_ns, workers, share, **session_params)
+            path_reports.append(self.relay_log[-1])
+            if key is not None:
+                keys.append((key, self.nodes[receiver_id].shared_keys[f"{sender_id}_e2e{PROTOCOL_KEY_SUFFIXES[protocol]}"]))
+
+        session_time_s = num_pulses * pulse_repetition_rate_ns / 1e9 if num_pulses > 0 else 0.0
+        key_lengths = [report['key_length'] for report in path_reports]
+        report = {
+            'protocol': protocol,
+            'metric': metric,
+            'paths': paths,
+            'expected_rates': expected_rates,
+            'demand_bits': demand_bits,
+            'shares': shares,
+            'key_lengths': key_lengths,
+            'key_length': sum(key_lengths),
+            'demand_met': None if demand_bits is None else sum(key_lengths) >= demand_bits,
+            'errors': None,
+            'key_rate_bps': sum(key_lengths) / session_time_s if session_time_s > 0 else 0.0,
+            'best_path_rate_bps': key_lengths[0] / session_time_s if session_time_s > 0 else 0.0,
+        }
+        self.multipath_log.append(report)
+        if not keys:
+            logger.warning("No path from %s to %s delivered a key.", sender_id, receiver_id)
+            return None
 
-        print(f"End-to-end BB84 RAW sifted key established between {sender_id} and {receiver_id}.")
-        return current_end_to_end_key_segment_bb84
+        sender_key = PackedKey.concat([sender_key for sender_key, _ in keys])
+        receiver_key = PackedKey.concat([receiver_key for _, receiver_key in keys])
+        suffix = PROTOCOL_KEY_SUFFIXES[protocol]
+        self.nodes[sender_id].shared_keys[f"{receiver_id}_e2e{suffix}"] = sender_key
+        self.nodes[receiver_id].shared_keys[f"{sender_id}_e2e{suffix}"] = receiver_key
+        report['errors'] = (sender_key ^ receiver_key).popcount()
+        logger.info("Multipath %s key of %d bits from %s to %s over %d paths (%.2f bps, best single path %.2f bps).",
+                    protocol.upper(), report['key_length'], sender_id, receiver_id, len(paths),
+                    report['key_rate_bps'], report['best_path_rate_bps'])
+        return sender_key
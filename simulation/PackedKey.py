@@ -0,0 +1,144 @@
+import numpy as np
+
+# Set bits per byte value, for popcount on NumPy versions without np.bitwise_count
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_bytes(data):
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(data).sum(dtype=np.int64))
+    return int(_POPCOUNT_TABLE[data].sum(dtype=np.int64))
+
+
+class PackedKey:
+    """
+    A bit string (sifted or final key) packed 8 bits per byte with numpy.packbits.
+
+    Behaves like a read-only sequence of 0/1 ints (len, indexing, slicing, iteration,
+    truthiness, == against lists) while storing one bit per bit, so a 10^8-bit key
+    takes about 12 MB. XOR and popcount work on whole bytes:
+    (alice_key ^ bob_key).popcount() is the number of mismatching bits.
+    Bits are packed most significant bit first; the padding bits of the last byte are 0.
+    Keys are unhashable, as lists are; use tobytes() and len() for a hashable identity.
+    """
+    __slots__ = ('_data', '_length')
+
+    def __init__(self, bits=()):
+        bits = np.asarray(bits if not isinstance(bits, PackedKey) else bits.to_bits())
+        if bits.ndim != 1:
+            raise ValueError("A key must be a one-dimensional sequence of bits.")
+        self._data = np.packbits(bits.astype(bool))
+        self._length = bits.size
+
+    @classmethod
+    def of(cls, key):
+        """key itself if it is already a PackedKey, otherwise the packed copy of its bits."""
+        return key if isinstance(key, PackedKey) else cls(key)
+
+    @classmethod
+    def from_bytes(cls, data, length=None):
+        """Key of the first length bits of data (all of them if length is None)."""
+        data = np.frombuffer(bytes(data), dtype=np.uint8)
+        if length is None:
+            length = data.size * 8
+        if not 0 <= length <= data.size * 8:
+            raise ValueError(f"Key length {length} does not fit in {data.size} bytes.")
+        return cls._from_packed(data[:(length + 7) // 8].copy(), length)
+
+    @classmethod
+    def _from_packed(cls, data, length):
+        key = cls.__new__(cls)
+        key._data = data
+        key._length = length
+        key._clear_padding()
+        return key
+
+    @classmethod
+    def concat(cls, keys):
+        """Concatenation of several keys (e.g. the per-hop keys of a relay path or sifted blocks)."""
+        chunks = []
+        carry = np.zeros(0, dtype=np.uint8)  # Bits past the last whole byte so far
+        length = 0
+        for key in keys:
+            key = cls.of(key)
+            length += key._length
+            if carry.size == 0 and key._length % 8 == 0:
+                chunks.append(key._data)
+                continue
+            # Re-pack only this key's bits behind the carried ones
+            bits = np.concatenate((carry, key.to_bits()))
+            whole = bits.size - bits.size % 8
+            chunks.append(np.packbits(bits[:whole]))
+            carry = bits[whole:]
+        chunks.append(np.packbits(carry))
+        return cls._from_packed(np.concatenate(chunks), length)
+
+    def _clear_padding(self):
+        padding = self._data.size * 8 - self._length
+        if padding:
+            self._data[-1] &= (0xFF << padding) & 0xFF
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step == 1 and start % 8 == 0:
+                stop = max(start, stop)
+                return PackedKey._from_packed(self._data[start // 8:(stop + 7) // 8].copy(), stop - start)
+            return PackedKey(self.to_bits()[index])
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("key index out of range")
+        return int((self._data[index >> 3] >> (7 - (index & 7))) & 1)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __eq__(self, other):
+        if isinstance(other, PackedKey):
+            return self._length == other._length and np.array_equal(self._data, other._data)
+        if isinstance(other, (list, tuple, np.ndarray)):
+            return self._length == len(other) and np.array_equal(self.to_bits(), np.asarray(other))
+        return NotImplemented
+
+    # Unhashable on purpose, like a list: a key equals the tuples and lists of its bits, whose
+    # hashes it could not match, and keys are compared by value, never used as dict keys.
+    __hash__ = None
+
+    def __xor__(self, other):
+        other = PackedKey.of(other)
+        if self._length != other._length:
+            raise ValueError(f"Cannot XOR keys of different lengths ({self._length} and {other._length}).")
+        return PackedKey._from_packed(np.bitwise_xor(self._data, other._data), self._length)
+
+    def popcount(self):
+        """Number of 1 bits."""
+        return _popcount_bytes(self._data)
+
+    def to_bits(self):
+        """The bits as a uint8 NumPy array of 0s and 1s."""
+        return np.unpackbits(self._data, count=self._length)
+
+    def tolist(self):
+        return self.to_bits().tolist()
+
+    def tobytes(self):
+        """Packed bytes (MSB first, zero padding), as accepted by from_bytes."""
+        return self._data.tobytes()
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def __reduce__(self):
+        return PackedKey.from_bytes, (self.tobytes(), self._length)
+
+    def __repr__(self):
+        preview = ''.join(map(str, np.unpackbits(self._data[:4], count=min(self._length, 32))))
+        return f"PackedKey(len={self._length}, bits={preview}{'...' if self._length > 32 else ''})"
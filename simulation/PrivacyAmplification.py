@@ -0,0 +1,230 @@
+"""
+Privacy amplification of reconciled keys by Toeplitz hashing.
+
+Alice and Bob hash their (now identical) reconciled keys with the same random
+Toeplitz matrix, a 2-universal hash family, down to the length Eve provably knows
+nothing about. The m x n Toeplitz matrix T[i, j] = t[i - j + n - 1] is fixed by
+n + m - 1 public random bits t, so T·x (mod 2) is a slice of the convolution t * x,
+computed with real FFTs in O((n + m) log(n + m)) instead of O(n·m). Long convolutions
+run as four-step FFTs whose passes each fit in cache.
+"""
+import math
+import time
+
+import numpy as np
+
+from .PackedKey import PackedKey
+from .RandomStreams import RandomStream
+from .Reconciliation import binary_entropy
+
+# Failure probability of the leftover hash lemma; costs 2·log2(1/ε) bits of output
+DEFAULT_EPSILON_PA = 1e-10
+
+# Longest convolution done as one FFT; longer ones run as four-step FFTs with rows this long
+TOEPLITZ_FFT_SIZE = 1 << 14
+# Working set of the four-step FFT: columns per slab of its first pass, rows per chunk of its second
+_SLAB_COLUMNS = 64
+_CHUNK_ROWS = 8
+
+
+def _fft_size(n):
+    """Smallest 5-smooth integer >= n (sizes NumPy's FFT handles fastest)."""
+    best = 1 << max(0, (n - 1).bit_length())
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            size = power35
+            while size < n:
+                size *= 2
+            best = min(best, size)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def output_length(key_length, qber, leaked_bits, disclosed_bits=0, epsilon=DEFAULT_EPSILON_PA):
+    """
+    Secure output length of privacy amplification (asymptotic BB84-type bound):
+    key_length - disclosed_bits - n·h(QBER) - leaked_bits - 2·log2(1/ε), at least 0.
+
+    Args:
+        key_length (int): Reconciled key length.
+        qber (float): QBER estimate (bounds Eve's information per bit by h(QBER)).
+        leaked_bits (int): Bits disclosed by reconciliation.
+        disclosed_bits (int): Further bits disclosed, e.g. the parameter estimation sample.
+        epsilon (float): Privacy amplification failure probability.
+    """
+    remaining = key_length - disclosed_bits
+    length = remaining - remaining * binary_entropy(qber) - leaked_bits - 2 * math.log2(1 / epsilon)
+    return max(0, int(length))
+
+
+def _parity(values):
+    # Sums are exact integers up to FFT rounding (far below 0.5 for 10^8-bit keys)
+    return (np.rint(values).astype(np.int64) & 1).astype(np.uint8)
+
+
+class _FourStepPlan:
+    """
+    Real DFT of length size = rows·cols as the four-step algorithm on the rows x cols table
+    a[k·cols + j]: length-rows DFTs down the columns (a slab of columns at a time), twiddle
+    factors, then length-cols DFTs along the rows (a chunk of rows at a time), so every
+    pass works on a cache-sized piece instead of striding over the whole signal.
+    Only the rows // 2 + 1 non-negative column frequencies are kept (the input is real).
+    The spectrum is left in transposed order: a convolution multiplies two spectra in the
+    same order and undoes the steps backwards, so it never needs reordering.
+    """
+    def __init__(self, length, cols):
+        self.cols = cols
+        self.rows = _fft_size(-(-length // cols))
+        self.size = self.rows * cols
+        self.slab = min(_SLAB_COLUMNS, cols)
+        self._k = np.arange(self.rows // 2 + 1)
+        self._slab_twiddles = self._twiddles(self._k, np.arange(self.slab))
+
+    def _twiddles(self, k, j):
+        """exp(-2πi·k·j / size) for every k and j."""
+        return np.exp((-2j * np.pi / self.size) * (np.multiply.outer(k, j) % self.size))
+
+    def _row_twiddles(self, rows):
+        # exp(-2πi·k·(j + l) / size) = exp(-2πi·k·j / size) · exp(-2πi·k·l / size), j a slab start
+        k = self._k[rows]
+        return (self._twiddles(k, np.arange(0, self.cols, self.slab))[:, :, None] *
+                self._slab_twiddles[rows, None, :]).reshape(k.size, self.cols)
+
+    def _column_pass(self, bits):
+        table = np.zeros(self.size, dtype=np.uint8)
+        table[:len(bits)] = bits
+        table = table.reshape(self.rows, self.cols)
+        spectrum = np.empty((self._k.size, self.cols), dtype=np.complex128)
+        for j in range(0, self.cols, self.slab):
+            columns = np.fft.rfft(table[:, j:j + self.slab].astype(np.float64), axis=0)
+            columns *= self._twiddles(self._k, j)[:, None] * self._slab_twiddles
+            spectrum[:, j:j + self.slab] = columns
+        return spectrum
+
+    def spectrum(self, bits):
+        """Four-step DFT of bits zero-padded to size."""
+        spectrum = self._column_pass(bits)
+        for start in range(0, self._k.size, _CHUNK_ROWS):
+            rows = slice(start, start + _CHUNK_ROWS)
+            spectrum[rows] = np.fft.fft(spectrum[rows], axis=1)
+        return spectrum
+
+    def convolution_parity(self, bits, kernel_spectrum):
+        """Circular convolution (mod 2) of bits with the kernel whose spectrum() is given."""
+        spectrum = self._column_pass(bits)
+        for start in range(0, self._k.size, _CHUNK_ROWS):
+            rows = slice(start, start + _CHUNK_ROWS)
+            chunk = np.fft.fft(spectrum[rows], axis=1)
+            chunk *= kernel_spectrum[rows]
+            chunk = np.fft.ifft(chunk, axis=1)
+            chunk *= self._row_twiddles(rows).conj()
+            spectrum[rows] = chunk
+        parity = np.empty((self.rows, self.cols), dtype=np.uint8)
+        for j in range(0, self.cols, self.slab):
+            parity[:, j:j + self.slab] = _parity(np.fft.irfft(spectrum[:, j:j + self.slab], self.rows, axis=0))
+        return parity.reshape(-1)
+
+
+def toeplitz_hashes(keys, output_bits, seed_bits, fft_size=TOEPLITZ_FFT_SIZE):
+    """
+    T·key (mod 2) of each n-bit key for the one Toeplitz matrix T[i, j] = seed_bits[i - j + n - 1].
+    The product is a slice of the convolution of seed_bits with the key, whose seed spectrum
+    is computed once for all keys. Convolutions longer than fft_size points run as a
+    four-step FFT with rows of fft_size points (see _FourStepPlan), the same m x n product
+    at a fraction of the memory traffic of one long FFT.
+
+    Args:
+        keys (sequence): Keys (PackedKey or bit sequences) of n bits each.
+        output_bits (int): Output length m (0 <= m).
+        seed_bits (np.ndarray): n + m - 1 bits defining T.
+        fft_size (int): Longest convolution done as a single FFT, a power of two.
+
+    Returns:
+        list: The m-bit hash of every key, as PackedKeys.
+    """
+    keys = [PackedKey.of(key).to_bits() for key in keys]
+    n = keys[0].size if keys else 0
+    if any(x.size != n for x in keys):
+        raise ValueError("All keys hashed with one Toeplitz matrix must have the same length.")
+    if output_bits == 0 or n == 0:
+        return [PackedKey() for _ in keys]
+    length = n + output_bits - 1
+    if len(seed_bits) != length:
+        raise ValueError(f"A {output_bits}x{n} Toeplitz matrix needs {length} seed bits, got {len(seed_bits)}.")
+    # Circular convolution of length >= n + m - 1: the outputs n-1 .. n+m-2 never wrap around
+    size = _fft_size(length)
+    if size <= fft_size:
+        seed_spectrum = np.fft.rfft(np.asarray(seed_bits, dtype=np.float64), size)
+        return [PackedKey(_parity(np.fft.irfft(seed_spectrum * np.fft.rfft(x.astype(np.float64), size),
+                                               size)[n - 1:length]))
+                for x in keys]
+    plan = _FourStepPlan(length, fft_size)
+    seed_spectrum = plan.spectrum(seed_bits)
+    return [PackedKey(plan.convolution_parity(x, seed_spectrum)[n - 1:length]) for x in keys]
+
+
+def toeplitz_hash(key, output_bits, seed_bits, fft_size=TOEPLITZ_FFT_SIZE):
+    """
+    T·key (mod 2) for the Toeplitz matrix T[i, j] = seed_bits[i - j + n - 1].
+
+    Args:
+        key (PackedKey or sequence): n input bits.
+        output_bits (int): Output length m (0 <= m).
+        seed_bits (np.ndarray): n + m - 1 bits defining T.
+        fft_size (int): Longest convolution done as a single FFT (see toeplitz_hashes).
+
+    Returns:
+        PackedKey: The m-bit hash.
+    """
+    return toeplitz_hashes([key], output_bits, seed_bits, fft_size)[0]
+
+
+class ToeplitzPrivacyAmplifier:
+    """
+    Compresses a reconciled key to its secure length with a fresh public Toeplitz seed.
+    Both keys are hashed with the same m x n Toeplitz matrix over the whole key; long keys
+    are convolved with a four-step FFT of fft_size-point rows (see toeplitz_hashes).
+
+    Args:
+        epsilon (float): Privacy amplification failure probability.
+        fft_size (int): Longest convolution done as a single FFT, a power of two.
+        rng (RandomStream, optional): Source of the public Toeplitz seeds.
+    """
+    def __init__(self, epsilon=DEFAULT_EPSILON_PA, fft_size=TOEPLITZ_FFT_SIZE, rng=None):
+        if fft_size < 2 or fft_size & (fft_size - 1):
+            raise ValueError(f"fft_size must be a power of two of at least 2, got {fft_size}.")
+        self.epsilon = epsilon
+        self.fft_size = fft_size
+        self.rng = rng or RandomStream()
+
+    def amplify(self, alice_key, bob_key, qber_estimate, leaked_bits, disclosed_bits=0):
+        """
+        Hashes both parties' keys with the same Toeplitz matrix.
+        The keys are first verified (modeling the comparison of a hash of the reconciled keys):
+        if they differ, reconciliation left errors and both final keys are empty.
+        Returns (alice_final_key, bob_final_key, stats); stats reports 'input_bits',
+        'output_bits', 'qber_estimate', 'leaked_bits', 'disclosed_bits', 'epsilon',
+        'verified', 'keys_match', 'elapsed_s' and 'throughput_mbps'.
+        """
+        started = time.perf_counter()
+        n = len(alice_key)
+        verified = PackedKey.of(alice_key) == PackedKey.of(bob_key)
+        m = output_length(n, qber_estimate, leaked_bits, disclosed_bits, self.epsilon) if verified else 0
+        seed_bits = self.rng.np.integers(0, 2, n + m - 1, dtype=np.uint8) if m else np.zeros(0, dtype=np.uint8)
+        alice_final, bob_final = toeplitz_hashes((alice_key, bob_key), m, seed_bits, self.fft_size)
+        elapsed_s = time.perf_counter() - started
+        return alice_final, bob_final, {
+            'input_bits': n,
+            'output_bits': m,
+            'qber_estimate': qber_estimate,
+            'leaked_bits': int(leaked_bits),
+            'disclosed_bits': int(disclosed_bits),
+            'epsilon': self.epsilon,
+            'verified': bool(verified),
+            'keys_match': alice_final == bob_final,
+            'elapsed_s': elapsed_s,
+            'throughput_mbps': n / elapsed_s / 1e6 if elapsed_s > 0 else float('inf'),
+        }
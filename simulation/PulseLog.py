@@ -0,0 +1,221 @@
+from enum import IntEnum
+
+import numpy as np
+
+
+class PulseType(IntEnum):
+    """COW pulse types, stored as int8 codes; str() gives the legacy label ('data_first', ...)."""
+    DATA_FIRST = 0
+    DATA_SECOND = 1
+    MONITOR_FIRST = 2
+    MONITOR_SECOND = 3
+
+    def __str__(self):
+        return self.name.lower()
+
+
+class LabelCodec:
+    """Stores one of a fixed tuple of labels (e.g. BB84 bases 'R'/'D') as its int8 index."""
+    dtype = np.int8
+
+    def __init__(self, labels):
+        self.labels = tuple(labels)
+        self._codes = {label: code for code, label in enumerate(self.labels)}
+
+    def encode(self, value):
+        return self._codes[value]
+
+    def decode(self, code):
+        return self.labels[code]
+
+
+class OptionalBitCodec:
+    """Stores a bit that may be None (e.g. an inconclusive measurement) as int8, None -> -1."""
+    dtype = np.int8
+
+    @staticmethod
+    def encode(value):
+        return -1 if value is None else value
+
+    @staticmethod
+    def decode(code):
+        return None if code < 0 else int(code)
+
+
+class OptionalFloatCodec:
+    """Stores a float that may be None as float64, None -> NaN."""
+    dtype = np.float64
+
+    @staticmethod
+    def encode(value):
+        return np.nan if value is None else value
+
+    @staticmethod
+    def decode(value):
+        return None if np.isnan(value) else float(value)
+
+
+class PlainCodec:
+    """Stores a number or bool as is; decodes to the matching Python type."""
+    def __init__(self, dtype, python_type):
+        self.dtype = dtype
+        self._python_type = python_type
+
+    def encode(self, value):
+        return value
+
+    def decode(self, value):
+        return self._python_type(value)
+
+
+PULSE_TYPE = LabelCodec(str(pulse_type) for pulse_type in PulseType)
+TIME_SLOT = PlainCodec(np.float64, float)
+PHOTONS = PlainCodec(np.int32, int)
+PHASE = PlainCodec(np.float64, float)
+FLAG = PlainCodec(np.bool_, bool)
+BIT = PlainCodec(np.int8, int)
+OPTIONAL_BIT = OptionalBitCodec()
+OPTIONAL_FLOAT = OptionalFloatCodec()
+
+
+class PulseRecord:
+    """
+    Read-only view of one row of a PulseLog.
+    Supports the per-pulse dict access of the old lists (record['photon_count'],
+    record.get(...), keys()) as well as attribute access (record.photon_count).
+    """
+    __slots__ = ('_log', '_row')
+
+    def __init__(self, log, row):
+        self._log = log
+        self._row = row
+
+    def __getitem__(self, name):
+        codec = self._log.codecs[name]
+        return codec.decode(self._log.column(name)[self._row])
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def get(self, name, default=None):
+        return self[name] if name in self._log.codecs else default
+
+    def keys(self):
+        return self._log.codecs.keys()
+
+    def to_dict(self):
+        return {name: self[name] for name in self._log.codecs}
+
+    def __eq__(self, other):
+        if isinstance(other, PulseRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"PulseRecord({self.to_dict()})"
+
+
+class PulseLog:
+    """
+    Columnar per-pulse records backed by a NumPy structured array.
+
+    Replaces the lists of per-pulse dicts: every field is a fixed-width column and
+    labels (pulse types, bases, states) are enum codes, so a record takes a few
+    tens of bytes instead of a dict with repeated string keys. Rows are appended
+    like list entries and read back as PulseRecord views, so existing callers keep
+    working; hot paths use column(name) directly.
+
+    find(time_slot) is O(1): evenly spaced time slots are located by offset, and
+    from the first irregular or repeated slot on a time_slot -> row index is kept.
+
+    Args:
+        codecs (dict): Field name -> codec (dtype plus encode/decode), in column order.
+        capacity (int): Initial number of rows allocated; grows by doubling.
+    """
+    def __init__(self, codecs, capacity=1024):
+        self.codecs = dict(codecs)
+        self._dtype = np.dtype([(name, codec.dtype) for name, codec in self.codecs.items()])
+        self._rows = np.zeros(max(capacity, 1), dtype=self._dtype)
+        self._size = 0
+        # Time slot lookup: (first slot, step) while slots are evenly spaced,
+        # a time_slot -> row dict from the first irregular slot on
+        self._slot_start = None
+        self._slot_step = None
+        self._slot_index = None
+
+    def __len__(self):
+        return self._size
+
+    def append(self, record=None, **values):
+        """Adds one row from a dict and/or keyword values (every field is required)."""
+        if record is not None:
+            values = {**record, **values}
+        if self._size == len(self._rows):
+            self._rows = np.resize(self._rows, 2 * len(self._rows))
+        self._rows[self._size] = tuple(codec.encode(values[name]) for name, codec in self.codecs.items())
+        if 'time_slot' in values:
+            self._index_time_slot(float(self._rows['time_slot'][self._size]), self._size)
+        self._size += 1
+
+    def _index_time_slot(self, slot, row):
+        if self._slot_index is None:
+            if row == 0:
+                self._slot_start = slot
+                return
+            if row == 1 and slot != self._slot_start:
+                self._slot_step = slot - self._slot_start
+                return
+            if self._slot_step is not None and slot == self._slot_start + row * self._slot_step:
+                return
+            # First irregular (or repeated) slot: index every row so far
+            self._slot_index = {}
+            for previous_row, previous_slot in enumerate(self.column('time_slot')[:row].tolist()):
+                self._slot_index.setdefault(previous_slot, previous_row)
+        self._slot_index.setdefault(slot, row)  # First record of a slot wins
+
+    def column(self, name):
+        """The stored (encoded) values of a field as a NumPy array view."""
+        return self._rows[name][:self._size]
+
+    def values(self, name):
+        """A field's decoded values as a list (e.g. 'R'/'D' bases, None for missing bits)."""
+        decode = self.codecs[name].decode
+        return [decode(value) for value in self.column(name).tolist()]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [PulseRecord(self, i) for i in range(*row.indices(self._size))]
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError("pulse log index out of range")
+        return PulseRecord(self, row)
+
+    def __iter__(self):
+        return (PulseRecord(self, row) for row in range(self._size))
+
+    def find(self, time_slot):
+        """The record whose time_slot equals time_slot (first one if repeated), or None."""
+        if self._slot_index is not None:
+            row = self._slot_index.get(time_slot)
+        elif self._size == 0:
+            row = None
+        elif self._slot_step is None:
+            row = 0 if time_slot == self._slot_start else None
+        else:
+            row = int(round((time_slot - self._slot_start) / self._slot_step))
+            if not (0 <= row < self._size and self._slot_start + row * self._slot_step == time_slot):
+                row = None
+        return None if row is None else PulseRecord(self, row)
+
+    @property
+    def nbytes(self):
+        """Bytes used by the stored rows."""
+        return self._size * self._dtype.itemsize
+
+    def to_dicts(self):
+        """The rows as the legacy list of per-pulse dicts."""
+        return [record.to_dict() for record in self]
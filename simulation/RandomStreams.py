@@ -0,0 +1,48 @@
+import hashlib
+import random
+import numpy as np
+
+
+def _name_to_key(name):
+    """Stable 64-bit integer for a stream name (same value in every process)."""
+    return int.from_bytes(hashlib.sha256(str(name).encode('utf-8')).digest()[:8], 'little')
+
+
+class RandomStream:
+    """
+    An independent random stream owned by one simulation component.
+
+    Holds a numpy Generator (``np``) for the vectorized engines and a
+    ``random.Random`` (``py``) for the per-pulse loop path. Both are seeded from
+    one numpy SeedSequence. Child streams are derived by name, so a stream depends
+    only on the root seed and its path of names: the same root seed gives
+    bit-identical draws whatever the creation order, thread or process.
+    """
+    def __init__(self, seed=None, seed_sequence=None):
+        if seed_sequence is None:
+            seed_sequence = np.random.SeedSequence(seed)
+        self.seed_sequence = seed_sequence
+        self.np = np.random.default_rng(self._derive(0))
+        self.py = random.Random(int.from_bytes(self._derive(1).generate_state(4).tobytes(), 'little'))
+
+    @property
+    def root_seed(self):
+        """Entropy of the root seed this stream derives from."""
+        return self.seed_sequence.entropy
+
+    def _derive(self, *keys):
+        return np.random.SeedSequence(
+            self.seed_sequence.entropy,
+            spawn_key=self.seed_sequence.spawn_key + tuple(keys),
+        )
+
+    def child(self, *names):
+        """Returns the independent sub-stream identified by names (e.g. 'node', 'Alice')."""
+        return RandomStream(seed_sequence=self._derive(*(_name_to_key(name) for name in names)))
+
+    def seed_int(self):
+        """Draws a 32-bit integer seed for APIs that take a plain seed (e.g. calculate_qber)."""
+        return self.py.getrandbits(32)
+
+    def __repr__(self):
+        return f"RandomStream(root_seed={self.root_seed}, path={self.seed_sequence.spawn_key})"
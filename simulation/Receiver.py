@@ -1,17 +1,32 @@
+import logging
 import math
-import random
 from .Hardware import MachZehnderInterferometer, SinglePhotonDetector
+from .RandomStreams import RandomStream
+from .PulseLog import PulseLog, PULSE_TYPE, TIME_SLOT, PHOTONS, FLAG, OPTIONAL_BIT, OPTIONAL_FLOAT
+from .Sender import BB84_BASIS, BB84_STATE
+from .Diagnostics import get_logger
+
+logger = get_logger('receiver')
+
+# Columns of the receivers' pulse logs
+DPS_CLICK_FIELDS = {'time_slot': TIME_SLOT, 'click_dm1': FLAG, 'click_dm2': FLAG,
+                    'measured_phase_diff': OPTIONAL_FLOAT, 'bob_inferred_bit': OPTIONAL_BIT}
+COW_RECEIVED_PULSE_FIELDS = {'time_slot': TIME_SLOT, 'incident_photons': PHOTONS, 'click': FLAG,
+                             'bob_inferred_bit': OPTIONAL_BIT, 'is_monitoring_click': FLAG, 'pulse_type': PULSE_TYPE}
+BB84_MEASUREMENT_FIELDS = {'time_slot': TIME_SLOT, 'incident_photons': PHOTONS, 'encoded_state': BB84_STATE,
+                           'chosen_basis': BB84_BASIS, 'click_occurred': FLAG, 'measured_bit': OPTIONAL_BIT}
 
 class ReceiverDPS:
     """
     Models Bob's receiver for DPS-QKD, including a Mach-Zehnder Interferometer
     and two single-photon detectors.
     """
-    def __init__(self, detector_efficiency=0.9, dark_count_rate=1e-7):
+    def __init__(self, detector_efficiency=0.9, dark_count_rate=1e-7, rng=None):
+        self.rng = rng or RandomStream()
         self.mzi = MachZehnderInterferometer()
-        self.detector_dm1 = SinglePhotonDetector(detector_efficiency, dark_count_rate)
-        self.detector_dm2 = SinglePhotonDetector(detector_efficiency, dark_count_rate)
-        self.raw_clicks_info = [] # Stores (time_slot, click_dm1, click_dm2, measured_phase_diff)
+        self.detector_dm1 = SinglePhotonDetector(detector_efficiency, dark_count_rate, rng=self.rng.child('detector_dm1'))
+        self.detector_dm2 = SinglePhotonDetector(detector_efficiency, dark_count_rate, rng=self.rng.child('detector_dm2'))
+        self.raw_clicks_info = PulseLog(DPS_CLICK_FIELDS) # time_slot, clicks, measured_phase_diff, bit
 
     def receive_and_measure(self, time_slot, current_pulse_photons, current_pulse_phase, 
                             previous_pulse_photons, previous_pulse_phase):
@@ -37,7 +52,7 @@ class ReceiverDPS:
             # This is a simplification; a full simulation would involve tracking individual photons.
             
             # Use a single random draw to decide which detector *would* ideally get the photon
-            if random.random() < prob_dm1_output_ideal:
+            if self.rng.py.random() < prob_dm1_output_ideal:
                 # If it ideally goes to DM1, simulate detection at DM1
                 click_dm1 = self.detector_dm1.detect(1) # Pass 1 for a potential photon
             else:
@@ -65,13 +80,13 @@ class ReceiverDPS:
             bob_bit = None 
             # print(f"Debug: Inconclusive detection at time {time_slot}. DM1: {click_dm1}, DM2: {click_dm2}")
 
-        self.raw_clicks_info.append({
-            'time_slot': time_slot,
-            'click_dm1': click_dm1,
-            'click_dm2': click_dm2,
-            'measured_phase_diff': measured_phase_diff,
-            'bob_inferred_bit': bob_bit
-        })
+        self.raw_clicks_info.append(
+            time_slot=time_slot,
+            click_dm1=click_dm1,
+            click_dm2=click_dm2,
+            measured_phase_diff=measured_phase_diff,
+            bob_inferred_bit=bob_bit
+        )
         
         return click_dm1, click_dm2, measured_phase_diff, bob_bit 
 
@@ -79,10 +94,11 @@ class ReceiverCOW:
     """
     Models Bob's receiver for COW-QKD.
     """
-    def __init__(self, detector_efficiency=0.9, dark_count_rate=1e-7, detection_threshold_photons=0):
-        self.data_detector = SinglePhotonDetector(detector_efficiency, dark_count_rate)
+    def __init__(self, detector_efficiency=0.9, dark_count_rate=1e-7, detection_threshold_photons=0, rng=None):
+        self.rng = rng or RandomStream()
+        self.data_detector = SinglePhotonDetector(detector_efficiency, dark_count_rate, rng=self.rng.child('data_detector'))
         self.detection_threshold_photons = detection_threshold_photons 
-        self.received_pulses_info = []
+        self.received_pulses_info = PulseLog(COW_RECEIVED_PULSE_FIELDS)
 
     def measure_pulse(self, time_slot, incident_photons, pulse_type):
         click = self.data_detector.detect(incident_photons)
@@ -96,21 +112,18 @@ class ReceiverCOW:
         elif pulse_type == 'monitor_first' or pulse_type == 'monitor_second':
             if click:
                 is_monitoring_click = True
-        self.received_pulses_info.append({
-            'time_slot': time_slot,
-            'incident_photons': incident_photons,
-            'click': click,
-            'bob_inferred_bit': bob_inferred_bit,
-            'is_monitoring_click': is_monitoring_click,
-            'pulse_type': pulse_type
-        })
+        self.received_pulses_info.append(
+            time_slot=time_slot,
+            incident_photons=incident_photons,
+            click=click,
+            bob_inferred_bit=bob_inferred_bit,
+            is_monitoring_click=is_monitoring_click,
+            pulse_type=pulse_type
+        )
         return click, bob_inferred_bit, is_monitoring_click
 
     def get_received_pulse_info(self, time_slot):
-        for pulse_info in self.received_pulses_info:
-            if pulse_info['time_slot'] == time_slot:
-                return pulse_info
-        return None
+        return self.received_pulses_info.find(time_slot)
 
     def get_all_received_info(self):
         return self.received_pulses_info
@@ -122,64 +135,67 @@ class ReceiverBB84:
     - Measures received photons in chosen bases
     - Records measurement results and chosen bases for sifting
     """
-    def __init__(self, detector_efficiency=0.9, dark_count_rate=1e-7):
-        self.detector = SinglePhotonDetector(detector_efficiency, dark_count_rate)
-        self.raw_measurements = []
-        self.chosen_bases = []
-        self.received_pulses_info = []
+    def __init__(self, detector_efficiency=0.9, dark_count_rate=1e-7, rng=None):
+        self.rng = rng or RandomStream()
+        self.detector = SinglePhotonDetector(detector_efficiency, dark_count_rate, rng=self.rng.child('detector'))
+        # Probability of reading the wrong bit in the matching basis (optical misalignment)
+        self.misalignment_error = 0.02
+        self.received_pulses_info = PulseLog(BB84_MEASUREMENT_FIELDS)
     def receive_and_measure(self, time_slot, incident_photons, encoded_state):
-        chosen_basis = random.choice(['R', 'D'])
-        self.chosen_bases.append(chosen_basis)
+        chosen_basis = self.rng.py.choice(['R', 'D'])
         click_occurred = self.detector.detect(incident_photons)
         measured_bit = None
         if click_occurred:
             if chosen_basis == 'R':
                 if encoded_state == '|0⟩':
-                    if random.random() < 0.02:
+                    if self.rng.py.random() < self.misalignment_error:
                         measured_bit = 1
                     else:
                         measured_bit = 0
                 elif encoded_state == '|1⟩':
-                    if random.random() < 0.02:
+                    if self.rng.py.random() < self.misalignment_error:
                         measured_bit = 0
                     else:
                         measured_bit = 1
                 else:
-                    measured_bit = random.randint(0, 1)
+                    measured_bit = self.rng.py.randint(0, 1)
             else:
                 if encoded_state == '|+⟩':
-                    if random.random() < 0.02:
+                    if self.rng.py.random() < self.misalignment_error:
                         measured_bit = 1
                     else:
                         measured_bit = 0
                 elif encoded_state == '|-⟩':
-                    if random.random() < 0.02:
+                    if self.rng.py.random() < self.misalignment_error:
                         measured_bit = 0
                     else:
                         measured_bit = 1
                 else:
-                    measured_bit = random.randint(0, 1)
+                    measured_bit = self.rng.py.randint(0, 1)
         else:
             measured_bit = None
-        if len(self.raw_measurements) <= 3:
-            print(f"BB84 Debug: Time {time_slot}, State {encoded_state}, Basis {chosen_basis}, Click {click_occurred}, Bit {measured_bit}")
-        self.raw_measurements.append(measured_bit)
-        measurement_info = {
-            'time_slot': time_slot,
-            'incident_photons': incident_photons,
-            'encoded_state': encoded_state,
-            'chosen_basis': chosen_basis,
-            'click_occurred': click_occurred,
-            'measured_bit': measured_bit
-        }
-        self.received_pulses_info.append(measurement_info)
+        if len(self.received_pulses_info) <= 3 and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("BB84 Debug: Time %s, State %s, Basis %s, Click %s, Bit %s",
+                         time_slot, encoded_state, chosen_basis, click_occurred, measured_bit)
+        self.received_pulses_info.append(
+            time_slot=time_slot,
+            incident_photons=incident_photons,
+            encoded_state=encoded_state,
+            chosen_basis=chosen_basis,
+            click_occurred=click_occurred,
+            measured_bit=measured_bit
+        )
         return measured_bit, chosen_basis, click_occurred
     def get_measurement_info(self, time_slot):
-        for measurement_info in self.received_pulses_info:
-            if measurement_info['time_slot'] == time_slot:
-                return measurement_info
-        return None
+        return self.received_pulses_info.find(time_slot)
+    @property
+    def raw_measurements(self):
+        """Measured bit per pulse (None without a click)."""
+        return self.received_pulses_info.values('measured_bit')
+    @property
+    def chosen_bases(self):
+        return self.received_pulses_info.values('chosen_basis')
     def get_raw_measurements(self):
-        return self.raw_measurements.copy()
+        return self.raw_measurements
     def get_chosen_bases(self):
-        return self.chosen_bases.copy() 
\ No newline at end of file
+        return self.chosen_bases 
\ No newline at end of file
@@ -0,0 +1,379 @@
+"""
+Information reconciliation (error correction) of sifted keys.
+
+After sifting, Bob's key differs from Alice's in a fraction QBER of its bits.
+A reconciler corrects Bob's copy through public discussion and counts every bit
+of that discussion as leaked to Eve, so the real error-correction cost (instead
+of the 1.2·h(QBER) estimate of main.postprocessing) can be charged to the key.
+Parts of the key that cannot be corrected are dropped from both copies.
+
+Reconcilers share one interface:
+
+    reconciler.reconcile(alice_key, bob_key, qber_estimate) -> (alice_key, bob_corrected_key, stats)
+
+stats reports 'method', 'leaked_bits', 'residual_errors' (left after correction;
+known here because the simulator holds both keys), 'elapsed_s' and
+'throughput_mbps', plus method-specific figures (Cascade 'passes', LDPC
+'bp_iterations' and 'rounds').
+
+- CascadeReconciler: interactive Cascade with vectorized block parities and binary searches
+- LDPCReconciler: one-way syndrome decoding with a sum-product belief propagation
+  decoder over a sparse parity check matrix held as NumPy edge arrays
+"""
+import math
+import time
+
+import numpy as np
+
+from .PackedKey import PackedKey
+from .RandomStreams import RandomStream
+
+RECONCILIATION_METHODS = ('none', 'cascade', 'ldpc')
+
+
+def binary_entropy(x):
+    """
+    Binary Shannon entropy h(x) in bits, elementwise for arrays (h(0) = h(1) = 0).
+    Returns a float for a scalar x.
+    """
+    x = np.asarray(x, dtype=float)
+    # Clip away 0 and 1 so the logs stay finite; those points are zeroed below
+    p = np.clip(x, np.finfo(float).tiny, 1.0 - np.finfo(float).epsneg)
+    h = -p * np.log2(p) - (1 - p) * np.log2(1 - p)
+    h = np.where((x <= 0) | (x >= 1), 0.0, h)
+    return float(h) if h.ndim == 0 else h
+
+
+def estimate_qber(alice_key, bob_key, sample_size, seed=None):
+    """
+    Error rate on sample_size positions drawn without replacement (the bits disclosed
+    for parameter estimation), read from the packed XOR of the keys.
+    Returns (qber, num_errors).
+    """
+    key_length = len(alice_key)
+    if key_length == 0 or sample_size <= 0:
+        return 0.0, 0
+    sample_indices = np.random.default_rng(seed).choice(key_length, size=sample_size, replace=False)
+    # Mismatches are the 1 bits of the packed XOR of the two keys (MSB first)
+    mismatches = np.frombuffer((PackedKey.of(alice_key) ^ PackedKey.of(bob_key)).tobytes(), dtype=np.uint8)
+    sampled_bits = (mismatches[sample_indices >> 3] >> (7 - (sample_indices & 7)).astype(np.uint8)) & 1
+    num_errors = int(np.count_nonzero(sampled_bits))
+    return num_errors / sample_size, num_errors
+
+
+def make_reconciler(reconciliation, rng=None):
+    """
+    Reconciler for a session: None/'none' -> None, 'cascade'/'ldpc' -> a new reconciler
+    drawing its public randomness from rng; an object with reconcile() is used as is.
+    """
+    if reconciliation is None or reconciliation == 'none':
+        return None
+    if hasattr(reconciliation, 'reconcile'):
+        return reconciliation
+    if reconciliation == 'cascade':
+        return CascadeReconciler(rng=rng)
+    if reconciliation == 'ldpc':
+        return LDPCReconciler(rng=rng)
+    raise ValueError(f"Unknown reconciliation method '{reconciliation}'. Expected one of {RECONCILIATION_METHODS}.")
+
+
+def _finish_stats(method, alice_bits, bob_bits, leaked_bits, started, **extra):
+    elapsed_s = time.perf_counter() - started
+    return {
+        'method': method,
+        'leaked_bits': int(leaked_bits),
+        'residual_errors': int(np.count_nonzero(alice_bits != bob_bits)),
+        'elapsed_s': elapsed_s,
+        'throughput_mbps': alice_bits.size / elapsed_s / 1e6 if elapsed_s > 0 else float('inf'),
+        **extra
+    }
+
+
+class CascadeReconciler:
+    """
+    Cascade (Brassard & Salvail) with the usual block schedule: the first pass uses
+    blocks of about initial_block_factor / QBER bits, each later pass doubles the block
+    size over a fresh public random permutation.
+
+    Alice discloses every block parity (1 leaked bit per block); a block whose parities
+    differ is bisected (1 leaked bit per halving) down to one error, which Bob flips.
+    The flip changes the parity of the block holding that bit in every earlier pass,
+    so those blocks are bisected in turn (the cascade) until all passes so far agree.
+    Blocks of one pass are disjoint, so all of a pass's parities and bisections run as
+    array operations over prefix sums instead of one block at a time.
+
+    Args:
+        passes (int): Number of passes.
+        initial_block_factor (float): First pass block size times QBER.
+        rng (RandomStream, optional): Source of the public permutations.
+    """
+    def __init__(self, passes=4, initial_block_factor=0.73, rng=None):
+        if passes < 1:
+            raise ValueError(f"Cascade needs at least one pass, got {passes}.")
+        self.passes = passes
+        self.initial_block_factor = initial_block_factor
+        self.rng = rng or RandomStream()
+
+    def reconcile(self, alice_key, bob_key, qber_estimate):
+        started = time.perf_counter()
+        if len(alice_key) != len(bob_key):
+            raise ValueError("Keys must have the same length to be reconciled.")
+        alice = PackedKey.of(alice_key).to_bits()
+        bob = PackedKey.of(bob_key).to_bits().copy()
+        n = alice.size
+        if n == 0:
+            return PackedKey(alice), PackedKey(bob), _finish_stats('cascade', alice, bob, 0, started, passes=0,
+                                                                        block_sizes=[])
+
+        first_block = max(1, int(self.initial_block_factor / max(qber_estimate, 1e-6)))
+        # Per pass: permutation, its inverse, block size, Alice's and Bob's block parities
+        perms, inverse_perms, block_sizes, alice_parities, bob_parities = [], [], [], [], []
+        leaked_bits = 0
+        for pass_index in range(self.passes):
+            block_size = min(first_block << pass_index, n)
+            perm = np.arange(n) if pass_index == 0 else self.rng.np.permutation(n)
+            inverse = np.empty(n, dtype=np.int64)
+            inverse[perm] = np.arange(n)
+            block_starts = np.arange(0, n, block_size)
+            perms.append(perm)
+            inverse_perms.append(inverse)
+            block_sizes.append(block_size)
+            alice_parities.append(np.add.reduceat(alice[perm], block_starts, dtype=np.int64) & 1)
+            bob_parities.append(np.add.reduceat(bob[perm], block_starts, dtype=np.int64) & 1)
+            leaked_bits += block_starts.size
+
+            # Bisect odd blocks until every pass so far has matching parities
+            while True:
+                odd_passes = [(p, np.flatnonzero(alice_parities[p] != bob_parities[p]))
+                              for p in range(pass_index + 1)]
+                odd_passes = [(p, blocks) for p, blocks in odd_passes if blocks.size]
+                if not odd_passes:
+                    break
+                p, blocks = odd_passes[-1]  # Latest pass first, as in the original cascade order
+                error_positions, search_bits = self._bisect(alice, bob, perms[p], block_sizes[p], blocks)
+                leaked_bits += search_bits
+                bob[error_positions] ^= 1
+                for q in range(pass_index + 1):
+                    np.bitwise_xor.at(bob_parities[q], inverse_perms[q][error_positions] // block_sizes[q], 1)
+
+        bob_key_corrected = PackedKey(bob)
+        return PackedKey.of(alice_key), bob_key_corrected, _finish_stats('cascade', alice, bob, leaked_bits, started,
+                                                passes=self.passes, block_sizes=block_sizes)
+
+    @staticmethod
+    def _bisect(alice, bob, perm, block_size, blocks):
+        """
+        Binary searches all the given odd-parity blocks of one pass at once.
+        Returns the key positions of the errors found and the parity bits disclosed.
+        """
+        n = alice.size
+        alice_prefix = np.concatenate(([0], np.cumsum(alice[perm], dtype=np.int64)))
+        bob_prefix = np.concatenate(([0], np.cumsum(bob[perm], dtype=np.int64)))
+        low = blocks * block_size
+        high = np.minimum(low + block_size, n)  # Exclusive
+        disclosed = 0
+        while True:
+            active = high - low > 1
+            if not active.any():
+                break
+            disclosed += int(np.count_nonzero(active))
+            mid = (low + high) // 2
+            left_differs = ((alice_prefix[mid] - alice_prefix[low]) ^ (bob_prefix[mid] - bob_prefix[low])) & 1
+            go_left = active & (left_differs == 1)
+            go_right = active & (left_differs == 0)
+            high = np.where(go_left, mid, high)
+            low = np.where(go_right, mid, low)
+        return perm[low], disclosed
+
+
+class LDPCReconciler:
+    """
+    One-way LDPC syndrome reconciliation, with blind retries.
+
+    The key is cut into equal frames of at most frame_bits bits (the last one
+    padded with a few known zeros). Alice sends the syndrome H·x of every frame, which leaks its m bits;
+    Bob decodes his frame to the word nearest his bits with that syndrome using
+    sum-product belief propagation, all frames at once. The code rate adapts to the
+    QBER estimate: m = efficiency · h(QBER) · frame_bits, and at least
+    min_syndrome_fraction · frame_bits. Frames that do not decode
+    get reveal_fraction of their bits disclosed by Alice (in a public random order,
+    1 leaked bit each) and are decoded again, up to max_rounds times. Alice then sends
+    a verification_bits hash of every frame; frames whose hash Bob's decoded word does
+    not match (undecoded, or decoded to the wrong word) are dropped from both keys.
+    Retries stop revealing before a frame's leak reaches its length, and a key whose
+    frames are too short for the syndrome plus hash is dropped without sending either.
+    The hash is modeled by comparing the frames, which a 64-bit universal hash matches
+    up to a 2^-64 collision probability.
+
+    H is a random column-regular matrix (column_weight ones per column), stored
+    sparsely as its edge list (row, column) sorted by row; check and variable node
+    updates are segment sums over those edges (np.add.reduceat). Regular codes sit
+    further from the Shannon limit than optimized irregular ones, more so at low
+    QBER (high rate): their rows get so heavy there that belief propagation stalls,
+    hence the default efficiency of 1.6 and the floor of 0.2 on the syndrome fraction
+    (at most 15 ones per row with column_weight 3).
+
+    Args:
+        frame_bits (int): Bits per frame (code length).
+        efficiency (float): Syndrome length relative to the Shannon limit h(QBER).
+        column_weight (int): Ones per column of H.
+        max_iterations (int): Belief propagation iterations per decoding round.
+        max_rounds (int): Decoding rounds, the first one plus blind retries.
+        reveal_fraction (float): Fraction of a frame's bits disclosed per retry.
+        min_syndrome_fraction (float): Smallest syndrome length relative to frame_bits.
+        verification_bits (int): Leaked bits of the per-frame verification hash.
+        rng (RandomStream, optional): Source of the public parity check matrix and reveal order.
+    """
+    # LLR magnitude of a bit whose value is known (padding, disclosed bits)
+    KNOWN_BIT_LLR = 50.0
+
+    def __init__(self, frame_bits=4096, efficiency=1.6, column_weight=3, max_iterations=40, max_rounds=10,
+                 reveal_fraction=0.02, min_syndrome_fraction=0.2, verification_bits=64, rng=None):
+        if frame_bits < 2:
+            raise ValueError(f"frame_bits must be at least 2, got {frame_bits}.")
+        self.frame_bits = frame_bits
+        self.efficiency = efficiency
+        self.column_weight = column_weight
+        self.max_iterations = max_iterations
+        self.max_rounds = max_rounds
+        self.reveal_fraction = reveal_fraction
+        self.min_syndrome_fraction = min_syndrome_fraction
+        self.verification_bits = verification_bits
+        self.rng = rng or RandomStream()
+
+    def parity_check_edges(self, num_checks, n):
+        """Edges (rows, cols) of a random num_checks x n parity check matrix, sorted by row."""
+        sockets = np.repeat(np.arange(n), self.column_weight)
+        # Deal the column sockets round-robin over shuffled rows: row degrees differ by at most one
+        rows = self.rng.np.permutation(sockets.size) % num_checks
+        edges = np.unique(rows.astype(np.int64) * n + sockets)  # Drops repeated (row, col) pairs
+        return edges // n, edges % n
+
+    def reconcile(self, alice_key, bob_key, qber_estimate):
+        started = time.perf_counter()
+        if len(alice_key) != len(bob_key):
+            raise ValueError("Keys must have the same length to be reconciled.")
+        alice = PackedKey.of(alice_key).to_bits()
+        bob = PackedKey.of(bob_key).to_bits()
+        length = alice.size
+        if length < 2:
+            # Nothing to decode: disclose the bits outright
+            return PackedKey(alice), PackedKey(alice), _finish_stats('ldpc', alice, alice, length, started,
+                                                                     bp_iterations=0, rounds=0, frames=0,
+                                                                     frames_failed=0, discarded_bits=0,
+                                                                     revealed_bits=length)
+
+        num_frames = -(-length // self.frame_bits)
+        n = -(-length // num_frames)  # Frames of equal size, so padding stays below num_frames bits
+        qber = min(max(qber_estimate, 1e-4), 0.5 - 1e-4)
+        num_checks = min(n - 1, max(1, math.ceil(max(self.efficiency * binary_entropy(qber),
+                                                     self.min_syndrome_fraction) * n)))
+        # Bits a frame can have revealed before its leak (syndrome, reveals, hash) reaches its length
+        reveal_budget = n - num_checks - self.verification_bits - 1
+        if reveal_budget < 0:
+            # Frames too short for their syndrome and hash: no syndrome is sent, the key is dropped
+            empty = np.zeros(0, dtype=np.uint8)
+            return PackedKey(empty), PackedKey(empty), _finish_stats(
+                'ldpc', empty, empty, 0, started, bp_iterations=0, rounds=0, frames=num_frames,
+                frames_failed=num_frames, discarded_bits=length, syndrome_bits_per_frame=num_checks,
+                revealed_bits=0, code_rate=1 - num_checks / n)
+        code = self._code(num_checks, n)
+
+        padding = num_frames * n - length
+        alice_frames = np.concatenate((alice, np.zeros(padding, dtype=np.uint8))).reshape(num_frames, n)
+        bob_frames = np.concatenate((bob, np.zeros(padding, dtype=np.uint8))).reshape(num_frames, n)
+        alice_syndromes = self._syndromes(code, alice_frames)  # Sent to Bob: the leaked bits
+
+        # Channel LLRs of Bob's bits; padding bits are known zeros
+        channel_llr = np.where(bob_frames == 0, 1.0, -1.0) * math.log((1 - qber) / qber)
+        if padding:
+            channel_llr[-1, n - padding:] = self.KNOWN_BIT_LLR
+
+        reveal_order = self.rng.np.permutation(n)[:reveal_budget]
+        reveal_step = max(1, int(self.reveal_fraction * n))
+        decoded = bob_frames.copy()
+        pending = np.flatnonzero(np.any(self._syndromes(code, bob_frames) != alice_syndromes, axis=1))
+        leaked_bits = num_frames * num_checks
+        revealed_bits = 0
+        iterations = 0
+        rounds = 0
+        for round_index in range(self.max_rounds):
+            if round_index:
+                # Blind retry: Alice discloses the next reveal_step bits of each failed frame
+                revealed = reveal_order[(round_index - 1) * reveal_step:round_index * reveal_step]
+                if revealed.size == 0:
+                    break
+                known = alice_frames[np.ix_(pending, revealed)]
+                channel_llr[np.ix_(pending, revealed)] = np.where(known == 0, 1.0, -1.0) * self.KNOWN_BIT_LLR
+                revealed_bits += pending.size * revealed.size
+            solved, frames, round_iterations = self._decode(code, channel_llr[pending], alice_syndromes[pending])
+            iterations += round_iterations
+            rounds += 1
+            decoded[pending[solved]] = frames[solved]
+            pending = pending[~solved]
+            if not pending.size:
+                break
+        leaked_bits += revealed_bits + num_frames * self.verification_bits
+
+        # Verification: only frames decoded to Alice's word are kept, in both keys
+        verified = np.all(decoded == alice_frames, axis=1)
+        keep = np.repeat(verified, n)[:length]
+        alice_kept, bob_kept = alice[keep], decoded.reshape(-1)[:length][keep]
+        return PackedKey(alice_kept), PackedKey(bob_kept), _finish_stats(
+            'ldpc', alice_kept, bob_kept, leaked_bits, started, bp_iterations=iterations, rounds=rounds,
+            frames=num_frames, frames_failed=int(num_frames - verified.sum()), discarded_bits=int(length - keep.sum()),
+            syndrome_bits_per_frame=num_checks, revealed_bits=revealed_bits, code_rate=1 - num_checks / n)
+
+    def _code(self, num_checks, n):
+        rows, cols = self.parity_check_edges(num_checks, n)
+        col_order = np.argsort(cols, kind='stable')
+        col_starts = np.flatnonzero(np.diff(cols[col_order], prepend=-1))
+        return {
+            'n': n,
+            'rows': rows,
+            'cols': cols,
+            'row_starts': np.flatnonzero(np.diff(rows, prepend=-1)),
+            'col_order': col_order,
+            'col_starts': col_starts,
+            'col_ids': cols[col_order][col_starts],
+        }
+
+    @staticmethod
+    def _syndromes(code, frames):
+        return np.add.reduceat(frames[:, code['cols']], code['row_starts'], axis=1) & 1
+
+    def _decode(self, code, channel_llr, syndromes):
+        """
+        Sum-product decoding of a batch of frames towards the given syndromes.
+        Returns (solved mask, hard decisions, iterations run).
+        """
+        rows, cols, row_starts = code['rows'], code['cols'], code['row_starts']
+        frames = (channel_llr < 0).astype(np.uint8)
+        solved = np.all(self._syndromes(code, frames) == syndromes, axis=1)
+        check_sign = (1.0 - 2.0 * syndromes)[:, rows]  # A check with syndrome 1 flips its messages' sign
+        active = np.flatnonzero(~solved)
+        variable_to_check = channel_llr[active][:, cols]
+        iterations = 0
+        while active.size and iterations < self.max_iterations:
+            iterations += 1
+            # Check node update: tanh rule in log-magnitude/sign form over each row's edges
+            t = np.tanh(np.clip(variable_to_check, -40.0, 40.0) / 2)
+            log_magnitude = np.log(np.maximum(np.abs(t), 1e-300))
+            negative = (t < 0).astype(np.int64)
+            row_log = np.add.reduceat(log_magnitude, row_starts, axis=1)
+            row_negative = np.add.reduceat(negative, row_starts, axis=1)
+            extrinsic = np.exp(row_log[:, rows] - log_magnitude)
+            extrinsic *= (1.0 - 2.0 * ((row_negative[:, rows] - negative) & 1)) * check_sign[active]
+            check_to_variable = 2 * np.arctanh(np.clip(extrinsic, -1 + 1e-12, 1 - 1e-12))
+
+            # Variable node update and tentative decision
+            posterior = channel_llr[active]
+            posterior[:, code['col_ids']] += np.add.reduceat(check_to_variable[:, code['col_order']],
+                                                             code['col_starts'], axis=1)
+            hard = (posterior < 0).astype(np.uint8)
+            frames[active] = hard
+            done = np.all(self._syndromes(code, hard) == syndromes[active], axis=1)
+            solved[active[done]] = True
+            active = active[~done]
+            variable_to_check = posterior[~done][:, cols] - check_to_variable[~done]
+        return solved, frames, iterations
@@ -0,0 +1,162 @@
+"""
+Route search over a Network's links.
+
+Two link metrics:
+- 'loss': the channel loss in dB; a path costs the sum over its links (lower is better)
+- 'key_rate': the expected secure key bits per pulse of the link (AnalyticModel, with
+  the sending node as Alice); a trusted relay path delivers its slowest link's rate,
+  so a path is worth the minimum over its links (higher is better, a widest path)
+Both are searched with Dijkstra over an adjacency dict {node: {neighbor: weight}}.
+Multiple routes are node-disjoint (relays are the trusted points of a path): each
+next path is the best one avoiding the relays of the paths found before.
+"""
+import heapq
+import math
+
+import numpy as np
+
+from .AnalyticModel import analytic_model
+from .Reconciliation import binary_entropy
+
+ROUTING_METRICS = ('loss', 'key_rate')
+
+# Error correction cost over the Shannon limit assumed for expected link key rates
+ROUTING_EC_EFFICIENCY = 1.2
+
+
+def validate_metric(metric):
+    if metric not in ROUTING_METRICS:
+        raise ValueError(f"Unknown routing metric '{metric}'. Expected one of {ROUTING_METRICS}.")
+    return metric
+
+
+def expected_link_key_rate(sender, receiver, channel, protocol='dps'):
+    """
+    Expected secure key bits per pulse of a link, sender acting as Alice:
+    sifted probability · (1 - (1 + f)·h(QBER)), the bound PrivacyAmplification.output_length
+    applies with an error correction leak of f·h(QBER) (f = ROUTING_EC_EFFICIENCY).
+    """
+    params = {
+        'distance_km': channel.distance_km,
+        'attenuation_db_per_km': channel.attenuation_db_per_km,
+        'mu': sender.avg_photon_number,
+        'detector_efficiency': receiver.detector_efficiency,
+        'dark_count_rate': receiver.dark_count_rate,
+    }
+    if protocol == 'cow':
+        params.update(monitor_pulse_ratio=sender.cow_monitor_pulse_ratio,
+                      extinction_ratio_db=sender.cow_extinction_ratio_db)
+    model = analytic_model(protocol, **params)
+    secure_fraction = 1 - (1 + ROUTING_EC_EFFICIENCY) * binary_entropy(model['qber'])
+    return float(max(0.0, model['sifted_probability'] * secure_fraction))
+
+
+def link_weight(sender, receiver, channel, metric, protocol='dps'):
+    """Weight of the link sender -> receiver under metric."""
+    if metric == 'loss':
+        return channel.distance_km * channel.attenuation_db_per_km
+    return expected_link_key_rate(sender, receiver, channel, protocol)
+
+
+# Per metric: value of the empty path, extending a path value by a link, and whether value a beats b
+_START = {'loss': 0.0, 'key_rate': math.inf}
+_EXTEND = {'loss': lambda value, weight: value + weight, 'key_rate': min}
+_BETTER = {'loss': lambda a, b: a < b, 'key_rate': lambda a, b: a > b}
+
+
+def extend(metric, value, weight):
+    return _EXTEND[metric](value, weight)
+
+
+def better(metric, a, b):
+    """True if path value a beats path value b (b may be None: no path)."""
+    return b is None or _BETTER[metric](a, b)
+
+
+def shortest_path_tree(adjacency, source, metric, excluded_nodes=()):
+    """
+    Dijkstra from source. Returns (values, previous): the best path value of every reachable
+    node and its predecessor on that path. Among equally good paths the one with fewer hops wins.
+    Links of weight 0 under 'key_rate' carry no key and are never used.
+    """
+    validate_metric(metric)
+    values = {source: _START[metric]}
+    hops = {source: 0}
+    previous = {source: None}
+    sign = 1 if metric == 'loss' else -1
+    heap = [(sign * values[source], 0, str(source), source)]
+    done = set()
+    while heap:
+        _, _, _, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        for neighbor, weight in adjacency.get(node, {}).items():
+            if neighbor in done or neighbor in excluded_nodes:
+                continue
+            if metric == 'key_rate' and weight <= 0:
+                continue
+            value = extend(metric, values[node], weight)
+            current = values.get(neighbor)
+            if better(metric, value, current) or (value == current and hops[node] + 1 < hops[neighbor]):
+                values[neighbor] = value
+                hops[neighbor] = hops[node] + 1
+                previous[neighbor] = node
+                heapq.heappush(heap, (sign * value, hops[neighbor], str(neighbor), neighbor))
+    return values, previous
+
+
+def path_from_tree(previous, target):
+    """Path from the tree's source to target, or None if target is unreachable."""
+    if target not in previous:
+        return None
+    path = [target]
+    while previous[path[-1]] is not None:
+        path.append(previous[path[-1]])
+    return path[::-1]
+
+
+def path_value(adjacency, path, metric):
+    value = _START[metric]
+    for node1, node2 in zip(path, path[1:]):
+        value = extend(metric, value, adjacency[node1][node2])
+    return value
+
+
+def disjoint_paths(adjacency, source, target, k, metric):
+    """
+    Up to k node-disjoint paths from source to target, best first. Greedy: each path is
+    the best one avoiding the intermediate nodes of the earlier ones; the direct link
+    source-target (if any) is used at most once.
+    """
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}.")
+    paths = []
+    excluded = set()
+    adjacency = {node: dict(neighbors) for node, neighbors in adjacency.items()}
+    while len(paths) < k:
+        _, previous = shortest_path_tree(adjacency, source, metric, excluded_nodes=excluded)
+        path = path_from_tree(previous, target)
+        if path is None or len(path) < 2:
+            break
+        paths.append(path)
+        excluded.update(path[1:-1])
+        if len(path) == 2:
+            adjacency[source].pop(target, None)
+    return paths
+
+
+def split_demand(demand_bits, path_rates):
+    """
+    Splits demand_bits over paths in proportion to their expected rates (largest remainder,
+    so the shares add up to demand_bits). Paths without rate get nothing.
+    """
+    rates = np.asarray(path_rates, dtype=float)
+    total = rates.sum()
+    if demand_bits <= 0 or total <= 0:
+        return [0] * len(rates)
+    exact = demand_bits * rates / total
+    shares = np.floor(exact).astype(np.int64)
+    for index in np.argsort(shares - exact)[:demand_bits - int(shares.sum())]:
+        shares[index] += 1
+    return shares.tolist()
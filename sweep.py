@@ -0,0 +1,333 @@
+"""
+Parameter sweeps over distance / mu / detector grids.
+
+A sweep is a protocol, a grid (parameter name -> list of values) and a trial count.
+Every grid point is one task: its two-node network is built once and all of its
+trials run on it, so the link constants (channel survival probability, detector
+dark count probabilities) are computed once per point. Tasks run on a local process
+pool and rows are written as points complete, to CSV or Parquet.
+
+mode='analytic' evaluates the whole grid at once with main.run_analytic_model instead.
+
+CLI:
+    python sweep.py dps --grid distance_km=15:50:5 --grid mu=0.1,0.2 --trials 20 \\
+        --workers 4 --seed 1 --out dps_sweep.csv
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from main import postprocessing_batch, run_analytic_model
+from simulation.Network import Network
+from simulation.RandomStreams import RandomStream
+
+SWEEP_PROTOCOLS = ('dps', 'cow', 'bb84')
+SWEEP_MODES = ('monte_carlo', 'analytic')
+SWEEP_FORMATS = ('csv', 'parquet')
+
+# Sweepable parameters and their defaults (the two-node setup of test_dps.py / test_cow.py)
+SWEEP_DEFAULTS = {
+    'distance_km': 20.0,
+    'attenuation_db_per_km': 0.2,
+    'mu': 0.2,
+    'detector_efficiency': 0.9,
+    'dark_count_rate': 1e-7,
+    'phase_flip_prob': 0.0,
+    'num_pulses': 10000,
+    'pulse_repetition_rate_ns': 1,
+    # COW only
+    'bit_flip_error_prob': 0.0,
+    'monitor_pulse_ratio': 0.1,
+    'extinction_ratio_db': 20.0,
+}
+COW_PARAMETERS = ('bit_flip_error_prob', 'monitor_pulse_ratio', 'extinction_ratio_db')
+
+RESULT_COLUMNS = ('trials', 'sifted_key_length_mean', 'sifted_key_length_std', 'qber_mean', 'qber_std',
+                  'final_key_length_mean', 'secure_key_rate_bps_mean', 'elapsed_s')
+ANALYTIC_COLUMNS = ('sifted_probability', 'qber', 'sifted_rate_bps', 'secure_key_rate_bps')
+
+
+def validate_grid(protocol, grid):
+    """Checks a sweep grid and returns it as {name: list of values} in SWEEP_DEFAULTS order."""
+    if protocol not in SWEEP_PROTOCOLS:
+        raise ValueError(f"Unknown protocol '{protocol}'. Expected one of {SWEEP_PROTOCOLS}.")
+    unknown = set(grid) - set(SWEEP_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}. Expected some of {list(SWEEP_DEFAULTS)}.")
+    if protocol != 'cow' and set(grid) & set(COW_PARAMETERS):
+        raise ValueError(f"Parameters {sorted(set(grid) & set(COW_PARAMETERS))} only apply to COW sweeps.")
+    grid = {name: list(np.atleast_1d(grid[name]).tolist()) for name in SWEEP_DEFAULTS if name in grid}
+    for name, values in grid.items():
+        if not values:
+            raise ValueError(f"Sweep parameter '{name}' has no values.")
+    return grid
+
+
+def expand_grid(grid):
+    """Grid points as full parameter dicts (defaults filled in), in C order over the grid's axes."""
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield {**SWEEP_DEFAULTS, **dict(zip(names, values))}
+
+
+def parse_grid_values(spec):
+    """
+    Values of a CLI grid axis: 'a,b,c' for a list, 'start:stop:step' for an inclusive range.
+    """
+    if ':' in spec:
+        start, stop, step = (float(part) for part in spec.split(':'))
+        if step <= 0:
+            raise ValueError(f"Range step must be positive, got {step}.")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return (start + step * np.arange(max(count, 0))).tolist()
+    return [float(part) for part in spec.split(',') if part.strip()]
+
+
+def run_sweep_point(task):
+    """
+    Monte Carlo trials of one grid point on one two-node network.
+
+    Args:
+        task (dict): 'protocol', 'index', 'params' (a full parameter dict), 'trials',
+            'seed' (the point's seed, or None) and 'engine'.
+
+    Returns:
+        dict: The point's index, parameters and RESULT_COLUMNS.
+    """
+    started = time.perf_counter()
+    protocol, params, trials = task['protocol'], task['params'], task['trials']
+    net = Network(engine=task['engine'], seed=task['seed'])
+    alice = net.add_node('Alice', avg_photon_number=params['mu'],
+                         cow_monitor_pulse_ratio=params['monitor_pulse_ratio'],
+                         cow_extinction_ratio_db=params['extinction_ratio_db'])
+    bob = net.add_node('Bob', detector_efficiency=params['detector_efficiency'],
+                       dark_count_rate=params['dark_count_rate'])
+    net.connect_nodes('Alice', 'Bob', distance_km=params['distance_km'],
+                      attenuation_db_per_km=params['attenuation_db_per_km'])
+
+    num_pulses = int(params['num_pulses'])
+    sifted_lengths = np.zeros(trials, dtype=np.int64)
+    errors = np.zeros(trials, dtype=np.int64)
+    for trial in range(trials):
+        # Every session draws from a fresh per-session stream of the same nodes
+        if protocol == 'dps':
+            alice_key, bob_key = alice.generate_and_share_key(
+                bob, num_pulses, params['pulse_repetition_rate_ns'], phase_flip_prob=params['phase_flip_prob'])
+        elif protocol == 'cow':
+            alice_key, bob_key = alice.generate_and_share_key_cow(
+                bob, num_pulses, params['pulse_repetition_rate_ns'],
+                monitor_pulse_ratio=params['monitor_pulse_ratio'], phase_flip_prob=params['phase_flip_prob'],
+                bit_flip_error_prob=params['bit_flip_error_prob'])
+        else:
+            alice_key, bob_key = alice.generate_and_share_key_bb84(
+                bob, num_pulses, params['pulse_repetition_rate_ns'], phase_flip_prob=params['phase_flip_prob'])
+        sifted_lengths[trial] = len(alice_key)
+        errors[trial] = (alice_key ^ bob_key).popcount()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        qbers = np.where(sifted_lengths > 0, errors / sifted_lengths, 0.0)
+    final_lengths = postprocessing_batch(sifted_lengths, qbers)['final_key_length']
+    session_time_s = num_pulses * params['pulse_repetition_rate_ns'] / 1e9
+    return {
+        'index': task['index'],
+        **params,
+        'trials': trials,
+        'sifted_key_length_mean': float(sifted_lengths.mean()),
+        'sifted_key_length_std': float(sifted_lengths.std()),
+        'qber_mean': float(qbers.mean()),
+        'qber_std': float(qbers.std()),
+        'final_key_length_mean': float(final_lengths.mean()),
+        'secure_key_rate_bps_mean': float(final_lengths.mean() / session_time_s) if session_time_s > 0 else 0.0,
+        'elapsed_s': time.perf_counter() - started,
+    }
+
+
+def sweep_tasks(protocol, grid, trials=1, seed=None, engine='vectorized'):
+    """One run_sweep_point task per grid point; with a seed each point gets its own derived seed."""
+    if trials < 1:
+        raise ValueError(f"trials must be at least 1, got {trials}.")
+    grid = validate_grid(protocol, grid)
+    root = RandomStream(seed) if seed is not None else None
+    return [{
+        'protocol': protocol,
+        'index': index,
+        'params': params,
+        'trials': trials,
+        'seed': root.child('sweep_point', index).seed_int() if root is not None else None,
+        'engine': engine,
+    } for index, params in enumerate(expand_grid(grid))]
+
+
+def iter_sweep(protocol, grid, trials=1, seed=None, workers=1, engine='vectorized', mode='monte_carlo'):
+    """
+    Yields one row per grid point: the point's 'index', its parameters and results.
+    Monte Carlo rows come in completion order (sort by 'index' for grid order); with a
+    fixed seed every row is the same whatever the number of workers.
+    """
+    if mode not in SWEEP_MODES:
+        raise ValueError(f"Unknown sweep mode '{mode}'. Expected one of {SWEEP_MODES}.")
+    if mode == 'analytic':
+        yield from _iter_analytic_sweep(protocol, grid)
+        return
+    tasks = sweep_tasks(protocol, grid, trials, seed, engine)
+    if not workers or workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield run_sweep_point(task)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(run_sweep_point, task) for task in tasks]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _iter_analytic_sweep(protocol, grid):
+    grid = validate_grid(protocol, grid)
+    points = list(expand_grid(grid))
+    columns = {name: np.array([point[name] for point in points], dtype=float) for name in SWEEP_DEFAULTS}
+    model_params = {name: values for name, values in columns.items() if name != 'num_pulses'}
+    if protocol != 'cow':
+        model_params = {name: values for name, values in model_params.items() if name not in COW_PARAMETERS}
+    result = run_analytic_model(protocol, **model_params)
+    shape = (len(points),)
+    for index, point in enumerate(points):
+        yield {
+            'index': index,
+            **point,
+            **{name: float(np.broadcast_to(result[name], shape)[index]) for name in ANALYTIC_COLUMNS},
+        }
+
+
+def sweep_columns(mode='monte_carlo'):
+    """Column order of the sweep's rows."""
+    return ('index', *SWEEP_DEFAULTS, *(ANALYTIC_COLUMNS if mode == 'analytic' else RESULT_COLUMNS))
+
+
+class CSVSweepWriter:
+    """Writes sweep rows to a text stream as CSV, one line per row as it arrives."""
+    def __init__(self, stream, columns):
+        self.stream = stream
+        self._writer = csv.DictWriter(stream, fieldnames=columns)
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class ParquetSweepWriter:
+    """Writes sweep rows to a Parquet file (needs pyarrow), one row group per row_group_size rows."""
+    def __init__(self, path_or_stream, columns, row_group_size=256):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow); use CSV otherwise.") from e
+        self._pa = pa
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self._schema = pa.schema([(name, pa.int64() if name in ('index', 'trials') else pa.float64())
+                                  for name in columns])
+        self._writer = pq.ParquetWriter(path_or_stream, self._schema)
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            table = self._pa.Table.from_pydict({name: [row[name] for row in self._rows] for name in self.columns},
+                                               schema=self._schema)
+            self._writer.write_table(table)
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def make_writer(fmt, target, columns):
+    """Sweep writer of format 'csv' (target: text stream) or 'parquet' (target: path or binary stream)."""
+    if fmt == 'csv':
+        return CSVSweepWriter(target, columns)
+    if fmt == 'parquet':
+        return ParquetSweepWriter(target, columns)
+    raise ValueError(f"Unknown sweep output format '{fmt}'. Expected one of {SWEEP_FORMATS}.")
+
+
+def run_sweep(protocol, grid, writer, trials=1, seed=None, workers=1, engine='vectorized', mode='monte_carlo'):
+    """Runs a sweep, writing every row to writer as it completes; returns the number of rows."""
+    rows = 0
+    try:
+        for row in iter_sweep(protocol, grid, trials, seed, workers, engine, mode):
+            writer.write(row)
+            rows += 1
+    finally:
+        writer.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a QKD parameter sweep and stream its rows to CSV or Parquet.")
+    parser.add_argument('protocol', choices=SWEEP_PROTOCOLS)
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=VALUES',
+                        help="Grid axis, e.g. distance_km=15:50:5 (inclusive range) or mu=0.1,0.2; repeatable")
+    parser.add_argument('--trials', type=int, default=1, help="Monte Carlo trials per grid point")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes")
+    parser.add_argument('--seed', type=int, default=None, help="Root seed (reproducible sweeps)")
+    parser.add_argument('--engine', choices=('auto', 'loop', 'vectorized'), default='vectorized')
+    parser.add_argument('--mode', choices=SWEEP_MODES, default='monte_carlo')
+    parser.add_argument('--format', choices=SWEEP_FORMATS, default=None,
+                        help="Output format (default: from the --out extension, else CSV)")
+    parser.add_argument('--out', default='-', help="Output file ('-' for stdout, CSV only)")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    for axis in args.grid:
+        name, sep, values = axis.partition('=')
+        if not sep:
+            parser.error(f"--grid expects NAME=VALUES, got '{axis}'")
+        grid[name.strip()] = parse_grid_values(values)
+    fmt = args.format or ('parquet' if args.out.endswith('.parquet') else 'csv')
+    if fmt == 'parquet' and args.out == '-':
+        parser.error("Parquet output needs --out FILE")
+
+    columns = sweep_columns(args.mode)
+    stream = None
+    try:
+        if fmt == 'csv':
+            stream = sys.stdout if args.out == '-' else open(args.out, 'w', newline='')
+            writer = make_writer(fmt, stream, columns)
+        else:
+            writer = make_writer(fmt, args.out, columns)
+    except ImportError as e:
+        parser.error(str(e))
+    try:
+        rows = run_sweep(args.protocol, grid, writer, trials=args.trials, seed=args.seed, workers=args.workers,
+                         engine=args.engine, mode=args.mode)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if stream is not None and stream is not sys.stdout:
+            stream.close()
+    print(json.dumps({'rows': rows, 'out': args.out, 'format': fmt}), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import matplotlib.pyplot as plt
 from simulation.Network import Network
 from main import calculate_qber
+from sweep import iter_sweep
 import numpy as np
 
 def run_two_node_dps_simulation(link_distance_km=20, num_pulses_per_link=10000, mu=0.2,
@@ -23,21 +24,13 @@ def run_two_node_dps_simulation(link_distance_km=20, num_pulses_per_link=10000,
     qber, num_errors = calculate_qber(alice_key_trunc, bob_key_trunc)
     return min_len, qber
 
-def test_two_node_dps_qber_vs_distance(num_trials=20):
+def test_two_node_dps_qber_vs_distance(num_trials=20, workers=1):
     distances = [15, 20, 25, 30, 35, 40, 45, 50]
-    avg_qbers = []
-    avg_key_lengths = []
-    for d in distances:
-        qbers = []
-        key_lengths = []
-        for _ in range(num_trials):
-            key_len, qber = run_two_node_dps_simulation(link_distance_km=d)
-            qbers.append(qber)
-            key_lengths.append(key_len)
-        avg_qber = np.mean(qbers)
-        avg_key_len = np.mean(key_lengths)
-        avg_qbers.append(avg_qber)
-        avg_key_lengths.append(avg_key_len)
+    rows = sorted(iter_sweep('dps', {'distance_km': distances}, trials=num_trials, workers=workers),
+                  key=lambda row: row['index'])
+    avg_qbers = [row['qber_mean'] for row in rows]
+    avg_key_lengths = [row['sifted_key_length_mean'] for row in rows]
+    for d, avg_qber, avg_key_len in zip(distances, avg_qbers, avg_key_lengths):
         print(f"Distance: {d} km, Avg QBER: {avg_qber:.4f}, Avg Key length: {avg_key_len:.2f}")
     plt.figure()
     plt.plot(distances, avg_qbers, marker='o')
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from simulation.AnalyticModel import analytic_model, bb84_model, cow_model, dps_model
+from simulation.Network import Network
+
+PULSES = 1_000_000
+SESSIONS = {
+    'dps': ('generate_and_share_key', {'phase_flip_prob': 0.02}),
+    'cow': ('generate_and_share_key_cow', {'phase_flip_prob': 0.05, 'bit_flip_error_prob': 0.03}),
+    'bb84': ('generate_and_share_key_bb84', {'phase_flip_prob': 0.02}),
+}
+
+
+def z_score(observed, expected, trials):
+    return (observed - expected) / np.sqrt(expected * (1 - expected) / trials)
+
+
+@pytest.mark.parametrize('protocol', ['dps', 'cow', 'bb84'])
+@pytest.mark.parametrize('distance_km', [5, 40])
+def test_closed_forms_match_vectorized_sessions(protocol, distance_km):
+    network = Network(seed=distance_km)
+    network.add_node('A', avg_photon_number=0.5)
+    network.add_node('B')
+    network.connect_nodes('A', 'B', distance_km)
+    method, params = SESSIONS[protocol]
+    alice_key, bob_key = getattr(network.nodes['A'], method)(network.nodes['B'], PULSES, 1, engine='vectorized',
+                                                            **params)
+    model = analytic_model(protocol, distance_km=distance_km, mu=0.5, **params)
+    # Within 5 standard deviations of the binomial counts the model predicts
+    assert abs(z_score(len(alice_key) / PULSES, float(model['sifted_probability']), PULSES)) < 5
+    qber = (alice_key ^ bob_key).popcount() / len(alice_key)
+    assert abs(z_score(qber, float(model['qber']), len(alice_key))) < 5
+    if protocol == 'cow':
+        log = network.nodes['A'].traffic_log[-1]
+        success_rate = log['successful_monitor_pairs'] / log['attempted_monitor_pairs']
+        assert abs(z_score(success_rate, float(model['monitor_success_rate']), log['attempted_monitor_pairs'])) < 5
+
+
+@pytest.mark.parametrize('model', [dps_model, cow_model, bb84_model])
+def test_models_broadcast_over_parameter_grids(model):
+    distances = np.linspace(0, 100, 11)[:, None]
+    mus = np.array([0.1, 0.3, 0.5])[None, :]
+    result = model(distances, mu=mus)
+    for name in ('transmittance', 'click_probability'):
+        assert np.broadcast_shapes(np.shape(result[name]), (11, 3)) == (11, 3)
+    assert result['sifted_probability'].shape == (11, 3)
+    assert result['qber'].shape == (11, 3)
+    # Sifted key falls with distance at every mu
+    assert np.all(np.diff(result['sifted_probability'], axis=0) < 0)
+    single = model(30.0, mu=0.3)
+    assert float(single['sifted_probability']) == pytest.approx(result['sifted_probability'][3, 1])
@@ -0,0 +1,119 @@
+import pytest
+
+from simulation.Engine import VECTORIZED_PULSE_THRESHOLD, resolve_engine
+from simulation.Network import Network
+from simulation.PackedKey import PackedKey
+
+# Loop sessions cost about 14 µs per pulse; 100k pulses sift some 10k bits per protocol
+PULSES = 100_000
+
+
+def link(seed, distance_km=5, avg_photon_number=0.5):
+    network = Network(seed=seed)
+    network.add_node('A', avg_photon_number=avg_photon_number)
+    network.add_node('B')
+    network.connect_nodes('A', 'B', distance_km)
+    return network.nodes['A'], network.nodes['B']
+
+
+def sifted_stats(alice_key, bob_key):
+    return len(alice_key), (alice_key ^ bob_key).popcount() / len(alice_key)
+
+
+def assert_engines_agree(loop_keys, vectorized_keys):
+    # Sifted lengths are binomial (about 1% standard deviation at 10k bits), QBERs within 5 sigma
+    loop_length, loop_qber = sifted_stats(*loop_keys)
+    vectorized_length, vectorized_qber = sifted_stats(*vectorized_keys)
+    assert vectorized_length == pytest.approx(loop_length, rel=0.05)
+    assert vectorized_qber == pytest.approx(loop_qber, abs=0.01)
+
+
+def streamed(blocks):
+    alice_blocks, bob_blocks = zip(*((alice_bits, bob_bits) for alice_bits, bob_bits, *_ in blocks))
+    return PackedKey.concat(alice_blocks), PackedKey.concat(bob_blocks)
+
+
+def test_dps_vectorized_engine_matches_loop_engine():
+    keys = {}
+    for seed, engine in ((1, 'loop'), (2, 'vectorized')):
+        alice, bob = link(seed)
+        keys[engine] = alice.generate_and_share_key(bob, PULSES, 1, phase_flip_prob=0.02, engine=engine)
+    assert_engines_agree(keys['loop'], keys['vectorized'])
+    # A flipped phase spoils the two interferences of its pulse: QBER about 2·p
+    assert sifted_stats(*keys['vectorized'])[1] == pytest.approx(0.04, abs=0.01)
+
+
+@pytest.mark.parametrize('engine', ['loop', 'vectorized'])
+def test_dps_first_pulse_carries_no_bit(engine):
+    alice, bob = link(3, distance_km=0, avg_photon_number=0.9)
+    for _ in range(50):
+        alice_key, bob_key = alice.generate_and_share_key(bob, 1, 1, engine=engine)
+        assert len(alice_key) == len(bob_key) == 0
+    alice_key, _ = alice.generate_and_share_key(bob, 2, 1, engine=engine)
+    assert len(alice_key) <= 1
+
+
+def test_dps_pairs_straddling_block_boundaries_still_interfere():
+    # One pulse per block: every interference straddles a boundary
+    lengths = {}
+    for block_pulses in (1, 7, PULSES):
+        alice, bob = link(4)
+        alice_key, bob_key = streamed(alice.stream_and_share_key(bob, 20_000, 0.02, block_pulses=block_pulses))
+        lengths[block_pulses] = len(alice_key)
+        assert sifted_stats(alice_key, bob_key)[1] == pytest.approx(0.04, abs=0.015)
+    assert lengths[1] == pytest.approx(lengths[PULSES], rel=0.1)
+    assert lengths[7] == pytest.approx(lengths[PULSES], rel=0.1)
+
+
+def test_cow_vectorized_engine_matches_loop_engine():
+    keys, logs = {}, {}
+    for seed, engine in ((5, 'loop'), (6, 'vectorized')):
+        alice, bob = link(seed)
+        keys[engine] = alice.generate_and_share_key_cow(bob, PULSES, 1, phase_flip_prob=0.1,
+                                                        bit_flip_error_prob=0.03, engine=engine)
+        logs[engine] = alice.traffic_log[-1]
+    assert_engines_agree(keys['loop'], keys['vectorized'])
+    assert sifted_stats(*keys['vectorized'])[1] == pytest.approx(0.03, abs=0.01)
+    # Monitor pairs: about monitor_pulse_ratio of all pairs, failing as often in both engines
+    for log in logs.values():
+        assert log['attempted_monitor_pairs'] == pytest.approx(0.1 * PULSES / 2, rel=0.1)
+    loop_ratio, vectorized_ratio = (log['successful_monitor_pairs'] / log['attempted_monitor_pairs']
+                                    for log in (logs['loop'], logs['vectorized']))
+    assert vectorized_ratio == pytest.approx(loop_ratio, abs=0.05)
+
+
+def test_cow_blocks_of_whole_pairs_sift_like_one_block():
+    lengths = {}
+    for block_pulses in (2, 10, PULSES):
+        alice, bob = link(7)
+        alice_key, _ = streamed(alice.stream_and_share_key_cow(bob, 20_000, block_pulses=block_pulses))
+        lengths[block_pulses] = len(alice_key)
+    assert lengths[2] == pytest.approx(lengths[PULSES], rel=0.1)
+    assert lengths[10] == pytest.approx(lengths[PULSES], rel=0.1)
+
+
+def test_bb84_vectorized_engine_matches_loop_engine():
+    keys = {}
+    for seed, engine in ((8, 'loop'), (9, 'vectorized')):
+        alice, bob = link(seed)
+        keys[engine] = alice.generate_and_share_key_bb84(bob, PULSES, 1, phase_flip_prob=0.03, engine=engine)
+    assert_engines_agree(keys['loop'], keys['vectorized'])
+
+
+def test_bb84_blocks_sift_like_one_block():
+    lengths = {}
+    for block_pulses in (1, 1000, PULSES):
+        alice, bob = link(10)
+        alice_key, _ = streamed(alice.stream_and_share_key_bb84(bob, 20_000, block_pulses=block_pulses))
+        lengths[block_pulses] = len(alice_key)
+    assert lengths[1] == pytest.approx(lengths[PULSES], rel=0.1)
+    assert lengths[1000] == pytest.approx(lengths[PULSES], rel=0.1)
+
+
+def test_resolve_engine():
+    assert resolve_engine('auto', VECTORIZED_PULSE_THRESHOLD - 1) == 'loop'
+    assert resolve_engine('auto', VECTORIZED_PULSE_THRESHOLD) == 'vectorized'
+    assert resolve_engine('loop', 10**9) == 'loop'
+    assert resolve_engine('vectorized', 1) == 'vectorized'
+    with pytest.raises(ValueError):
+        resolve_engine('gpu', 1)
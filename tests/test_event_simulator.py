@@ -0,0 +1,70 @@
+import pytest
+
+from simulation.EventSimulator import FIBER_DELAY_S_PER_KM, NetworkEventSimulator
+from simulation.Network import Network
+
+
+def chain_network(seed=1):
+    network = Network(seed=seed)
+    for node_id in 'ABC':
+        network.add_node(node_id)
+    network.connect_nodes('A', 'B', 10)
+    network.connect_nodes('B', 'C', 30)
+    return network
+
+
+def test_latency_is_fiber_delay_plus_relay_processing():
+    sim = NetworkEventSimulator(chain_network(), block_s=0.01, relay_processing_s=0.002)
+    # Requested once the buffers hold plenty of key, so the request is served on arrival
+    request = sim.add_request(1.0, 'A', 'C', 1_000)
+    sim.run(2.0)
+    assert request['route'] == ['A', 'B', 'C']
+    assert request['served_s'] == request['arrival_s']
+    assert request['latency_s'] == pytest.approx(40 * FIBER_DELAY_S_PER_KM + 0.002)
+
+
+def test_buffer_accounting():
+    sim = NetworkEventSimulator(chain_network(), block_s=0.01, buffer_capacity_bits=200_000)
+    sim.add_poisson_requests('A', 'C', rate_hz=20, num_bits=50_000)
+    report = sim.run(5.0)
+    delivered_bits = report['requests']['delivered_bits'] + 50_000 * report['requests']['in_flight']
+    for link in (('A', 'B'), ('B', 'C')):
+        stats = report['links'][link]
+        assert stats['generated_bits'] == stats['level_bits'] + stats['consumed_bits'] + stats['overflow_bits']
+        assert stats['consumed_bits'] == delivered_bits
+        assert stats['max_level_bits'] <= 200_000
+    assert report['links'][('A', 'B')]['overflow_bits'] > 0
+
+
+def test_requests_beyond_buffer_capacity_are_rejected():
+    sim = NetworkEventSimulator(chain_network(), buffer_capacity_bits=1_000)
+    with pytest.raises(ValueError):
+        sim.add_request(0.0, 'A', 'C', 1_001)
+    with pytest.raises(ValueError):
+        sim.add_poisson_requests('A', 'C', rate_hz=1, num_bits=1_001)
+
+
+def test_unknown_metric_is_rejected():
+    with pytest.raises(ValueError):
+        NetworkEventSimulator(chain_network(), metric='hops')
+
+
+def test_poisson_arrivals_stay_within_start_and_stop():
+    sim = NetworkEventSimulator(chain_network(), block_s=0.5)
+    sim.add_poisson_requests('A', 'C', rate_hz=50, num_bits=10, start_s=2.0, stop_s=3.0)
+    # The first arrival of this source falls past stop_s but within the run
+    sim.add_poisson_requests('B', 'C', rate_hz=0.5, num_bits=10, start_s=0.0, stop_s=0.01)
+    sim.run(20.0)
+    arrivals = [request['arrival_s'] for request in sim.requests]
+    assert 20 < len(arrivals) < 80
+    assert all(2.0 < arrival <= 3.0 for arrival in arrivals)
+    assert not any(request['sender'] == 'B' for request in sim.requests)
+
+
+def test_poisson_sources_of_one_pair_draw_distinct_streams():
+    sim = NetworkEventSimulator(chain_network(), block_s=0.5)
+    sim.add_poisson_requests('A', 'C', rate_hz=10, num_bits=10, stop_s=5.0)
+    sim.add_poisson_requests('A', 'C', rate_hz=10, num_bits=10, stop_s=5.0)
+    sim.run(5.0)
+    arrivals = sorted(request['arrival_s'] for request in sim.requests)
+    assert len(set(arrivals)) == len(arrivals)
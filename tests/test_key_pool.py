@@ -0,0 +1,142 @@
+import time
+
+import numpy as np
+import pytest
+
+from simulation.KeyPool import KeyPool, KeyPoolStore, MappedKeyPool
+from simulation.Network import Network
+from simulation.PackedKey import PackedKey
+
+
+def random_key(length, seed):
+    return PackedKey(np.random.default_rng(seed).integers(0, 2, length, dtype=np.uint8))
+
+
+def test_consume_returns_bits_in_deposit_order():
+    keys = [random_key(length, seed) for seed, length in enumerate((13, 64, 7, 100))]
+    pool = KeyPool()
+    for key in keys:
+        pool.deposit(key)
+    everything = PackedKey.concat(keys)
+    assert pool.consume(5) == everything[:5]
+    assert pool.consume(80) == everything[5:85]
+    assert pool.consume(0) == PackedKey()
+    assert pool.consume(len(pool)) == everything[85:]
+    with pytest.raises(ValueError):
+        pool.consume(1)
+    assert pool.stats() == {'available_bits': 0, 'deposited_bits': 184, 'consumed_bits': 184, 'overflow_bits': 0}
+
+
+def test_many_small_deposits_do_not_copy_the_pool():
+    key = random_key(1_000, seed=1)
+    pool = KeyPool()
+    started = time.perf_counter()
+    for _ in range(20_000):
+        pool.deposit(key)
+    # Re-concatenating the pool on every deposit would copy about 25 GB here
+    assert time.perf_counter() - started < 5
+    assert len(pool) == 20_000_000
+    assert pool.consume(2_500) == PackedKey.concat((key, key, key[:500]))
+
+
+def test_capacity_drops_the_overflow():
+    pool = KeyPool(capacity_bits=100)
+    pool.deposit(random_key(60, seed=2))
+    pool.deposit(random_key(60, seed=3))
+    assert len(pool) == 100 and pool.overflow_bits == 20
+    pool.consume(30)
+    pool.deposit(random_key(60, seed=4))
+    assert pool.stats() == {'available_bits': 100, 'deposited_bits': 130, 'consumed_bits': 30, 'overflow_bits': 50}
+
+
+def test_session_pools_stay_within_capacity_and_aligned():
+    network = Network(seed=5, key_pool_capacity_bits=2_000)
+    network.add_node('A')
+    network.add_node('B')
+    network.connect_nodes('A', 'B', 10)
+    for _ in range(3):
+        network.nodes['A'].generate_and_share_key_bb84(network.nodes['B'], 200_000, 1)
+    alice_pool = network.nodes['A'].key_pool('B', 'bb84')
+    bob_pool = network.nodes['B'].key_pool('A', 'bb84')
+    assert len(alice_pool) == len(bob_pool) == 2_000
+    assert alice_pool.overflow_bits == bob_pool.overflow_bits > 0
+
+
+def test_mapped_pool_resumes_after_reopening(tmp_path):
+    path = tmp_path / 'pool.pool'
+    keys = [random_key(length, seed) for seed, length in enumerate((13, 800, 27))]
+    pool = MappedKeyPool(path)
+    for key in keys:
+        pool.deposit(key)
+    first = pool.consume(100)
+    pool.close()
+    everything = PackedKey.concat(keys)
+    assert first == everything[:100]
+    pool = MappedKeyPool(path)
+    assert (pool.deposited_bits, pool.consumed_bits, len(pool)) == (840, 100, 740)
+    assert pool.consume(40) == everything[100:140]
+    pool.close()
+
+
+def test_mapped_pool_reads_by_lifetime_offset_and_compacts(tmp_path):
+    key = random_key(10_000, seed=9)
+    pool = MappedKeyPool(tmp_path / 'pool.pool')
+    pool.deposit(key)
+    pool.consume(4_003)
+    # Consumed bits stay readable by their offset until compaction drops them
+    assert pool.read(0, 50) == key[:50]
+    assert pool.read(4_000, 1_000) == key[4_000:5_000]
+    pool.compact()
+    assert pool.base_bits == 4_000
+    assert pool.read(4_000, 6_000) == key[4_000:]
+    with pytest.raises(ValueError):
+        pool.read(0, 50)
+    with pytest.raises(ValueError):
+        pool.read(9_000, 1_001)
+    pool.deposit(key[:5])
+    assert pool.consume(len(pool)) == PackedKey.concat((key[4_003:], key[:5]))
+    pool.close()
+
+
+def test_mapped_pool_rejects_foreign_and_corrupt_files(tmp_path):
+    foreign = tmp_path / 'foreign.pool'
+    foreign.write_bytes(b'not a pool at all')
+    with pytest.raises(ValueError):
+        MappedKeyPool(foreign)
+    path = tmp_path / 'pool.pool'
+    pool = MappedKeyPool(path)
+    pool.deposit(random_key(100, seed=10))
+    pool.close()
+    data = bytearray(path.read_bytes())
+    # consumed_bits (the second header field) beyond deposited_bits
+    data[16:24] = (1_000).to_bytes(8, 'little')
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        MappedKeyPool(path)
+
+
+def test_store_hands_out_one_pool_per_node_partner_and_protocol(tmp_path):
+    store = KeyPoolStore(tmp_path)
+    pool = store.pool('A', 'B', 'dps')
+    assert store.pool('A', 'B', 'dps') is pool
+    assert store.pool('B', 'A', 'dps') is not pool
+    assert store.pool('A', 'B', 'bb84').path != pool.path
+    pool.deposit(random_key(64, seed=11))
+    store.close()
+    assert len(KeyPoolStore(tmp_path).pool('A', 'B', 'dps')) == 64
+
+
+def test_restarted_network_does_not_replay_session_keys(tmp_path):
+    pools = []
+    for _ in range(2):
+        network = Network(seed=7, key_store_dir=tmp_path)
+        network.add_node('A')
+        network.add_node('B')
+        network.connect_nodes('A', 'B', 10)
+        network.nodes['A'].generate_and_share_key_bb84(network.nodes['B'], 20_000, 1)
+        pool = network.nodes['A'].key_pool('B', 'bb84')
+        pools.append(pool.deposited_bits)
+        network.key_store.close()
+    pool = KeyPoolStore(tmp_path).pool('A', 'B', 'bb84')
+    first, second = pools[0], pools[1] - pools[0]
+    assert pool.read(0, min(first, second)) != pool.read(first, min(first, second))
@@ -0,0 +1,64 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from simulation.PackedKey import PackedKey
+
+
+def random_bits(length, seed):
+    return np.random.default_rng(seed).integers(0, 2, length, dtype=np.uint8)
+
+
+@pytest.mark.parametrize('length', [0, 1, 7, 8, 9, 1_000, 1_003])
+def test_packing_round_trip(length):
+    bits = random_bits(length, seed=length)
+    key = PackedKey(bits)
+    assert len(key) == length
+    assert np.array_equal(key.to_bits(), bits)
+    assert key.tolist() == bits.tolist()
+    assert key == bits and key == bits.tolist()
+    assert PackedKey.from_bytes(key.tobytes(), length) == key
+    # Padding bits of the last byte are zero
+    assert key.tobytes() == np.packbits(bits).tobytes()
+
+
+def test_indexing_and_slicing():
+    bits = random_bits(100, seed=1)
+    key = PackedKey(bits)
+    assert [key[i] for i in (0, 37, -1)] == [bits[0], bits[37], bits[-1]]
+    for index in (slice(8, 40), slice(3, 61), slice(90, 200), slice(None, None, 3), slice(50, 10)):
+        assert key[index] == bits[index]
+    with pytest.raises(IndexError):
+        key[100]
+
+
+def test_xor_and_popcount():
+    alice, bob = random_bits(1_001, seed=2), random_bits(1_001, seed=3)
+    difference = PackedKey(alice) ^ PackedKey(bob)
+    assert difference == alice ^ bob
+    assert difference.popcount() == int((alice ^ bob).sum())
+    assert (PackedKey(alice) ^ alice.tolist()).popcount() == 0
+    with pytest.raises(ValueError):
+        PackedKey(alice) ^ PackedKey(bob[:-1])
+
+
+def test_concat_of_unaligned_lengths():
+    pieces = [random_bits(length, seed) for seed, length in enumerate((3, 8, 0, 13, 1, 16, 5))]
+    key = PackedKey.concat(PackedKey(piece) for piece in pieces)
+    assert key == np.concatenate(pieces)
+    assert len(key) == 46
+    assert key.tobytes() == np.packbits(np.concatenate(pieces)).tobytes()
+    assert PackedKey.concat([]) == PackedKey()
+
+
+@pytest.mark.parametrize('length', [0, 5, 8, 1_003])
+def test_pickling_keeps_bits_and_length(length):
+    key = PackedKey(random_bits(length, seed=4))
+    restored = pickle.loads(pickle.dumps(key))
+    assert restored == key and len(restored) == length
+
+
+def test_keys_are_unhashable():
+    with pytest.raises(TypeError):
+        hash(PackedKey([0, 1]))
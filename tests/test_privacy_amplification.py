@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from simulation.PackedKey import PackedKey
+from simulation.PrivacyAmplification import ToeplitzPrivacyAmplifier, output_length, toeplitz_hash, toeplitz_hashes
+from simulation.RandomStreams import RandomStream
+
+
+def random_key(length, seed):
+    return PackedKey(np.random.default_rng(seed).integers(0, 2, length, dtype=np.uint8))
+
+
+def toeplitz_matrix(seed_bits, n, m):
+    return np.array([[seed_bits[i - j + n - 1] for j in range(n)] for i in range(m)])
+
+
+@pytest.mark.parametrize('fft_size', [1 << 14, 16, 64])
+def test_toeplitz_hash_matches_matrix_product(fft_size):
+    # Small fft_size forces the four-step FFT, including slabs narrower than the default
+    rng = np.random.default_rng(0)
+    key = rng.integers(0, 2, 300, dtype=np.uint8)
+    seed_bits = rng.integers(0, 2, 300 + 170 - 1, dtype=np.uint8)
+    expected = toeplitz_matrix(seed_bits, 300, 170) @ key % 2
+    assert np.array_equal(toeplitz_hash(key, 170, seed_bits, fft_size).to_bits(), expected)
+
+
+def test_four_step_hash_of_a_long_key_matches_one_fft():
+    rng = np.random.default_rng(1)
+    n, m = 200_003, 150_001
+    key = rng.integers(0, 2, n, dtype=np.uint8)
+    seed_bits = rng.integers(0, 2, n + m - 1, dtype=np.uint8)
+    assert toeplitz_hash(key, m, seed_bits, fft_size=1 << 12) == toeplitz_hash(key, m, seed_bits, fft_size=1 << 20)
+
+
+def test_keys_are_hashed_separately_with_one_matrix():
+    alice_key, bob_key = random_key(5_000, seed=2), random_key(5_000, seed=3)
+    seed_bits = np.random.default_rng(4).integers(0, 2, 5_000 + 3_000 - 1, dtype=np.uint8)
+    alice_hash, bob_hash = toeplitz_hashes((alice_key, bob_key), 3_000, seed_bits, fft_size=1 << 10)
+    assert alice_hash == toeplitz_hash(alice_key, 3_000, seed_bits)
+    assert bob_hash == toeplitz_hash(bob_key, 3_000, seed_bits)
+    assert alice_hash != bob_hash
+
+
+def test_amplify_hashes_the_whole_key_with_one_seed():
+    key = random_key(50_000, seed=5)
+    amplifier = ToeplitzPrivacyAmplifier(fft_size=1 << 12, rng=RandomStream(6))
+    alice_final, bob_final, stats = amplifier.amplify(key, key, 0.02, 10_000, disclosed_bits=1_000)
+    m = output_length(50_000, 0.02, 10_000, 1_000)
+    assert stats['output_bits'] == m
+    seed_bits = RandomStream(6).np.integers(0, 2, 50_000 + m - 1, dtype=np.uint8)
+    assert alice_final == bob_final == toeplitz_hash(key, m, seed_bits)
+    assert stats['verified'] and stats['keys_match']
+
+
+def test_mismatched_keys_are_discarded():
+    alice_key = random_key(20_000, seed=7)
+    bob_bits = alice_key.to_bits().copy()
+    bob_bits[123] ^= 1
+    alice_final, bob_final, stats = ToeplitzPrivacyAmplifier(rng=RandomStream(8)).amplify(
+        alice_key, PackedKey(bob_bits), 0.01, 2_000)
+    assert not stats['verified']
+    assert stats['output_bits'] == 0
+    assert len(alice_final) == len(bob_final) == 0
+
+
+def test_fft_size_must_be_a_power_of_two():
+    with pytest.raises(ValueError):
+        ToeplitzPrivacyAmplifier(fft_size=1000)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from simulation.PackedKey import PackedKey
+from simulation.RandomStreams import RandomStream
+from simulation.Reconciliation import CascadeReconciler, LDPCReconciler
+
+
+def noisy_keys(length, qber, seed):
+    rng = np.random.default_rng(seed)
+    alice = rng.integers(0, 2, length, dtype=np.uint8)
+    bob = alice ^ (rng.random(length) < qber).astype(np.uint8)
+    return PackedKey(alice), PackedKey(bob)
+
+
+@pytest.mark.parametrize('qber', [0.005, 0.01, 0.03, 0.06])
+def test_ldpc_leaves_no_residual_errors(qber):
+    alice_key, bob_key = noisy_keys(100_000, qber, seed=1)
+    alice_out, bob_out, stats = LDPCReconciler(rng=RandomStream(3)).reconcile(alice_key, bob_key, qber)
+    assert stats['residual_errors'] == 0
+    assert alice_out == bob_out
+    assert len(alice_out) == 100_000 - stats['discarded_bits']
+    # Dropping frames is the exception, not the rule
+    assert stats['frames_failed'] <= 1
+
+
+def test_ldpc_drops_undecodable_frames_from_both_keys():
+    # A syndrome sized for 1% cannot correct 15% errors: every frame is dropped
+    alice_key, bob_key = noisy_keys(20_000, 0.15, seed=2)
+    alice_out, bob_out, stats = LDPCReconciler(max_rounds=1, rng=RandomStream(4)).reconcile(alice_key, bob_key, 0.01)
+    assert alice_out == bob_out
+    assert stats['residual_errors'] == 0
+    assert stats['discarded_bits'] == 20_000 - len(alice_out) > 0
+
+
+@pytest.mark.parametrize('qber', [0.01, 0.05])
+def test_cascade_corrects_bob_and_keeps_alice(qber):
+    alice_key, bob_key = noisy_keys(50_000, qber, seed=5)
+    alice_out, bob_out, stats = CascadeReconciler(rng=RandomStream(6)).reconcile(alice_key, bob_key, qber)
+    assert alice_out == alice_key
+    assert stats['residual_errors'] == 0
+    assert alice_out == bob_out
+
+
+@pytest.mark.parametrize('length, qber', [(50, 0.03), (200, 0.03), (300, 0.3), (5_000, 0.3)])
+def test_ldpc_leaks_less_than_the_key(length, qber):
+    alice_key, bob_key = noisy_keys(length, qber, seed=7)
+    alice_out, bob_out, stats = LDPCReconciler(rng=RandomStream(8)).reconcile(alice_key, bob_key, qber)
+    assert alice_out == bob_out
+    assert stats['leaked_bits'] < length
+
+
+def test_ldpc_skips_frames_shorter_than_their_syndrome_and_hash():
+    alice_key, bob_key = noisy_keys(50, 0.03, seed=9)
+    alice_out, bob_out, stats = LDPCReconciler(rng=RandomStream(10)).reconcile(alice_key, bob_key, 0.03)
+    assert len(alice_out) == len(bob_out) == 0
+    assert stats['leaked_bits'] == 0
+    assert stats['discarded_bits'] == 50
+
+
+def test_reconcilers_report_their_own_iteration_counts():
+    alice_key, bob_key = noisy_keys(10_000, 0.03, seed=11)
+    _, _, ldpc_stats = LDPCReconciler(rng=RandomStream(12)).reconcile(alice_key, bob_key, 0.03)
+    _, _, cascade_stats = CascadeReconciler(rng=RandomStream(13)).reconcile(alice_key, bob_key, 0.03)
+    assert 'passes' not in ldpc_stats
+    assert ldpc_stats['rounds'] >= 1 and ldpc_stats['bp_iterations'] >= ldpc_stats['rounds']
+    assert cascade_stats['passes'] == 4
@@ -0,0 +1,33 @@
+from simulation.Network import Network
+
+
+def chain_network(num_nodes, seed=3):
+    network = Network(seed=seed)
+    node_ids = [f'N{i}' for i in range(num_nodes)]
+    for node_id in node_ids:
+        network.add_node(node_id)
+    for node1_id, node2_id in zip(node_ids, node_ids[1:]):
+        network.connect_nodes(node1_id, node2_id, 10)
+    return network, node_ids
+
+
+def test_relay_keys_do_not_depend_on_workers():
+    keys = []
+    for workers in (1, 4):
+        network, node_ids = chain_network(5)
+        keys.append(network.establish_end_to_end_raw_key(node_ids[0], node_ids[-1], node_ids, 20_000, 1,
+                                                         workers=workers))
+    assert keys[0] is not None and keys[0] == keys[1]
+
+
+def test_key_rate_counts_only_the_session_key():
+    network, node_ids = chain_network(4)
+    for _ in range(2):
+        network.establish_end_to_end_raw_key(node_ids[0], node_ids[-1], node_ids, 20_000, 1)
+        report = network.relay_log[-1]
+        session_key_bits = min(hop['sifted_length'] for hop in report['hops'])
+        assert report['session_key_bits'] == session_key_bits
+        assert report['key_rate_bps'] == min(report['key_length'], session_key_bits) / report['simulated_wall_time_s']
+        assert report['compute_total_s'] == sum(hop['compute_s'] for hop in report['hops'])
+    # Key left in the pools by the first chain lengthens the second, not its rate
+    assert report['key_length'] > session_key_bits
@@ -0,0 +1,63 @@
+import pytest
+
+import result_cache
+from result_cache import ResultCache, task_key
+
+
+def task(seed=1, **params):
+    return dict({"protocol": "dps", "distance_km": 10, "num_pulses": 1000, "seed": seed}, **params)
+
+
+def test_task_key_is_canonical():
+    assert task_key({"a": 1, "b": {"x": 1, "y": 2}}) == task_key({"b": {"y": 2, "x": 1}, "a": 1})
+    assert task_key(task(seed=1)) != task_key(task(seed=2))
+    # COW globals only matter to COW sessions
+    assert task_key(task(cow_params={"monitor": 0.1})) == task_key(task(cow_params={"monitor": 0.2}))
+    assert task_key(task(protocol="cow", cow_params={"monitor": 0.1})) != \
+        task_key(task(protocol="cow", cow_params={"monitor": 0.2}))
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.put(task(1), "one")
+    cache.put(task(2), "two")
+    assert cache.get(task(1)) == "one"  # Task 2 is now the least recently used
+    cache.put(task(3), "three")
+    assert cache.get(task(2)) is None
+    assert cache.get(task(1)) == "one" and cache.get(task(3)) == "three"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl_s=10)
+    cache.put(task(), "result")
+    now[0] += 9
+    assert cache.get(task()) == "result"
+    now[0] += 2
+    assert cache.get(task()) is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_unseeded_tasks_bypass_the_cache():
+    cache = ResultCache()
+    cache.put(task(seed=None), "random run")
+    assert cache.get(task(seed=None)) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["misses"] == 0
+
+
+def test_clear_resets_the_counters():
+    cache = ResultCache(max_entries=1)
+    cache.put(task(1), "one")
+    cache.put(task(2), "two")
+    cache.get(task(2))
+    cache.get(task(1))
+    cache.clear()
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["evictions"]) == (0, 0, 0, 0)
+    assert stats["hit_rate"] == 0.0
+    cache.put(task(1), "one")
+    assert cache.get(task(1)) == "one"
+    assert cache.stats()["hit_rate"] == pytest.approx(1.0)
@@ -0,0 +1,28 @@
+import pytest
+
+from simulation.Network import Network
+
+
+def network_with_links(links):
+    network = Network(seed=1)
+    for node1_id, node2_id, _ in links:
+        for node_id in (node1_id, node2_id):
+            if node_id not in network.nodes:
+                network.add_node(node_id)
+    for node1_id, node2_id, distance_km in links:
+        network.connect_nodes(node1_id, node2_id, distance_km)
+    return network
+
+
+@pytest.mark.parametrize('metric', ['loss', 'key_rate'])
+def test_cached_routes_match_a_fresh_network_after_new_links(metric):
+    # A-C is exactly as lossy as A-B-C but has fewer hops, so it must win the tie
+    links = [('A', 'B', 10), ('B', 'C', 10), ('C', 'D', 5)]
+    network = network_with_links(links)
+    assert network.find_route('A', 'C', metric) == ['A', 'B', 'C']
+    assert network.find_route('A', 'D', metric) == ['A', 'B', 'C', 'D']
+    network.connect_nodes('A', 'C', 20 if metric == 'loss' else 10)
+    fresh = network_with_links(links + [('A', 'C', 20 if metric == 'loss' else 10)])
+    for target in 'BCD':
+        assert network.find_route('A', target, metric) == fresh.find_route('A', target, metric)
+    assert network.find_route('A', 'D', metric) == ['A', 'C', 'D']